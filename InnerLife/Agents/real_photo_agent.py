@@ -17,6 +17,13 @@ import uuid
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from Agents.agent_base import Agent
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+try:
+    from NexusCore.response_cache import get_response_cache
+    RESPONSE_CACHE_AVAILABLE = True
+except ImportError:
+    RESPONSE_CACHE_AVAILABLE = False
+
 class RealPhotoAgent(Agent):
     """Agent that ACTUALLY generates images using Stable Diffusion"""
 
@@ -193,14 +200,27 @@ class RealPhotoAgent(Agent):
 
     def _ai_enhance_prompt(self, simple_prompt):
         """Use AI model to create optimized SD prompt"""
+        model = "brxce/stable-diffusion-prompt-generator:latest"
+        messages = [{"role": "user", "content": simple_prompt}]
+        options = {"temperature": 0.3}  # Low so a cached enhancement is as good as a fresh one
+
+        # Reuse the enhancement for a prompt we've already expanded
+        cache = get_response_cache() if RESPONSE_CACHE_AVAILABLE else None
+        if cache:
+            cached = cache.get(model, messages, options, endpoint='generate')
+            if cached is not None:
+                print(f"[PhotoGeneration] AI-enhanced (cached): {cached[:100]}...")
+                return cached
+
         try:
             print(f"[PhotoGeneration] Enhancing prompt with AI...")
             response = requests.post(
                 "http://localhost:11434/api/generate",
                 json={
-                    "model": "brxce/stable-diffusion-prompt-generator:latest",
+                    "model": model,
                     "prompt": simple_prompt,
-                    "stream": False
+                    "stream": False,
+                    "options": options
                 },
                 timeout=30
             )
@@ -209,6 +229,8 @@ class RealPhotoAgent(Agent):
                 data = response.json()
                 enhanced_prompt = data.get("response", "").strip()
                 print(f"[PhotoGeneration] AI-enhanced: {enhanced_prompt[:100]}...")
+                if cache:
+                    cache.put(model, messages, options, enhanced_prompt, endpoint='generate')
                 return enhanced_prompt
             else:
                 return None
@@ -5,19 +5,29 @@ Ollama Connector for NexusAI Commercial
 Connects to local Ollama instance for LLM inference
 """
 
+import sys
 import requests
 import json
+from pathlib import Path
 from typing import Dict, List, Optional, Generator
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+try:
+    from NexusCore.response_cache import get_response_cache
+    RESPONSE_CACHE_AVAILABLE = True
+except ImportError:
+    RESPONSE_CACHE_AVAILABLE = False
+
 class OllamaConnector:
     """
     Connector for local Ollama LLM
     Handles all communication with Ollama API
     """
     
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    def __init__(self, base_url: str = "http://localhost:11434", use_cache: bool = True):
         self.base_url = base_url
         self.api_url = f"{base_url}/api"
+        self.cache = get_response_cache() if use_cache and RESPONSE_CACHE_AVAILABLE else None
         
     def is_available(self) -> bool:
         """Check if Ollama is running"""
@@ -72,6 +82,22 @@ class OllamaConnector:
                 "role": "user",
                 "content": message
             })
+            options = {
+                "temperature": temperature,
+                "num_predict": max_tokens
+            }
+
+            # Repeated low-temperature requests are answered from the cache
+            if self.cache:
+                cached = self.cache.get(model, messages, options)
+                if cached is not None:
+                    return {
+                        "success": True,
+                        "response": cached,
+                        "model": model,
+                        "done": True,
+                        "cached": True
+                    }
             
             # Call Ollama API
             response = requests.post(
@@ -80,19 +106,19 @@ class OllamaConnector:
                     "model": model,
                     "messages": messages,
                     "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens
-                    }
+                    "options": options
                 },
                 timeout=60
             )
             
             if response.status_code == 200:
                 data = response.json()
+                content = data.get("message", {}).get("content", "")
+                if self.cache and data.get("done", False):
+                    self.cache.put(model, messages, options, content)
                 return {
                     "success": True,
-                    "response": data.get("message", {}).get("content", ""),
+                    "response": content,
                     "model": model,
                     "done": data.get("done", False)
                 }
@@ -209,6 +235,10 @@ class OllamaConnector:
                 "response": ""
             }
     
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Response cache hit-rate metrics (None if caching is off)"""
+        return self.cache.get_stats() if self.cache else None
+
     def get_model_info(self, model: str) -> Optional[Dict]:
         """Get information about a specific model"""
         try:
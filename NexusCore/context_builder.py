@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Context Builder: Cached memory context and token budgeting for Nexus-LLM
+
+- Recent conversations and memories are loaded from SQLite once and then
+  kept current from the write path, so building context costs no queries
+- Token counts use a local approximation of a BPE tokenizer (no model call)
+- Conversation turns are trimmed to a token budget, shrinking the oldest
+  tool results first
+- num_ctx is sized to the prompt instead of a fixed window
+"""
+
+import re
+import json
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List
+
+TOOL_RESULTS_PREFIX = "[Tool Results]"
+
+# Words, numbers, single punctuation marks and runs of whitespace/newlines
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\n+")
+
+
+@lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    """
+    Approximate token count for a llama-style BPE vocabulary
+
+    Short words are one token, long words split roughly every 6 characters,
+    digits group in threes and each punctuation mark is its own token.
+    """
+    tokens = 0
+    for piece in _TOKEN_RE.findall(text):
+        if piece[0].isalpha():
+            tokens += 1 + (len(piece) - 1) // 6
+        else:
+            tokens += 1
+    return tokens
+
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Tokens for a chat message list, including per-message overhead"""
+    return sum(count_tokens(msg['content']) + 4 for msg in messages)
+
+
+def shrink_text(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of text so it fits in roughly max_tokens"""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+
+    # Average characters per token for this text, leaving room for the marker
+    chars = max(1, int(len(text) * max(1, max_tokens - 16) / total))
+    head = text[:chars * 3 // 5]
+    tail = text[len(text) - chars * 2 // 5:] if chars >= 5 else ""
+    return f"{head}\n[... {total - max_tokens} tokens trimmed ...]\n{tail}"
+
+
+class ContextBuilder:
+    """
+    Assembles the memory context for Nexus-LLM and fits prompts to a budget
+    """
+
+    def __init__(self, db, max_recent: int = 5, max_memories: int = 10):
+        self.db = db
+        self.max_recent = max_recent
+        self.max_memories = max_memories
+
+        self._recent = None      # deque of (role, content), newest first
+        self._memories = None    # dict key -> value, newest first
+        self.version = 0         # bumped on every change to the context
+        self._rendered = None    # (version, config_key, json string)
+
+    def _load(self):
+        """Read recent conversations and memories from the database once"""
+        cursor = self.db.cursor()
+
+        cursor.execute('''
+            SELECT role, content FROM conversations
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (self.max_recent,))
+        self._recent = deque(cursor.fetchall(), maxlen=self.max_recent)
+
+        cursor.execute('''
+            SELECT key, value FROM memory
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (self.max_memories,))
+        self._memories = dict(cursor.fetchall())
+
+    def note_conversation(self, role: str, content: str):
+        """Keep the cache current after a conversation row is stored"""
+        if self._recent is not None:
+            self._recent.appendleft((role, content))
+        self.version += 1
+
+    def note_memory(self, key: str, value: str):
+        """Keep the cache current after a memory row is stored"""
+        if self._memories is not None:
+            self._memories.pop(key, None)
+            self._memories = {key: value, **self._memories}
+            while len(self._memories) > self.max_memories:
+                self._memories.pop(next(reversed(self._memories)))
+        self.version += 1
+
+    def build(self, config: Dict) -> Dict:
+        """Context dict for the AI, without querying the database"""
+        if self._recent is None:
+            self._load()
+
+        return {
+            'recent_conversations': [list(row) for row in self._recent],
+            'important_memories': dict(self._memories),
+            'current_config': config
+        }
+
+    def render(self, context: Dict) -> str:
+        """Compact JSON for the system prompt, cached until the context changes"""
+        config_key = json.dumps(context.get('current_config'), sort_keys=True, default=str)
+        if self._rendered and self._rendered[:2] == (self.version, config_key):
+            return self._rendered[2]
+
+        rendered = json.dumps(context, ensure_ascii=False, separators=(',', ':'), default=str)
+        self._rendered = (self.version, config_key, rendered)
+        return rendered
+
+    def fit_turns(self, system_prompt: str, turns: List[str], budget: int) -> List[str]:
+        """
+        Trim conversation turns so system prompt + turns fit in budget tokens
+
+        1. Shrink tool results, oldest first, down to their share of the budget
+        2. Drop the oldest tool results entirely
+        The first turn (the user's request) is always kept intact.
+        """
+        turns = list(turns)
+        used = count_tokens(system_prompt) + sum(count_tokens(t) + 4 for t in turns)
+        if used <= budget:
+            return turns
+
+        tool_indexes = [i for i, turn in enumerate(turns) if i > 0 and turn.startswith(TOOL_RESULTS_PREFIX)]
+        if not tool_indexes:
+            return turns
+
+        fixed = used - sum(count_tokens(turns[i]) for i in tool_indexes)
+        share = max(64, (budget - fixed) // len(tool_indexes))
+
+        for i in tool_indexes:
+            before = count_tokens(turns[i])
+            turns[i] = shrink_text(turns[i], share)
+            used -= before - count_tokens(turns[i])
+            if used <= budget:
+                return turns
+
+        for i in tool_indexes[:-1]:
+            used -= count_tokens(turns[i])
+            turns[i] = f"{TOOL_RESULTS_PREFIX} (earlier results omitted to fit context)"
+            used += count_tokens(turns[i])
+            if used <= budget:
+                break
+
+        return turns
+
+    @staticmethod
+    def size_num_ctx(prompt_tokens: int, response_reserve: int,
+                     max_ctx: int, min_ctx: int = 2048) -> int:
+        """Smallest 1k-aligned context window that fits prompt + response"""
+        needed = prompt_tokens + response_reserve
+        return max(min_ctx, min(max_ctx, -(-needed // 1024) * 1024))
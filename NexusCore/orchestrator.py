@@ -28,6 +28,12 @@ from Agents.real_websearch_agent import RealWebSearchAgent
 sys.path.append(str(Path("D:/AIArm/NexusCore")))
 from file_creator import FileCreator
 
+try:
+    from NexusCore.response_cache import get_response_cache
+    RESPONSE_CACHE_AVAILABLE = True
+except ImportError:
+    RESPONSE_CACHE_AVAILABLE = False
+
 BASE_DIR = Path("D:/AIArm")
 
 class NexusOrchestrator:
@@ -260,23 +266,17 @@ Respond ONLY with valid JSON:
 {{"needs_agent": true/false, "agent": "agent_name", "task": "task description"}}"""
 
         try:
-            response = requests.post(
-                f"{self.ollama_base}/api/chat",
-                json={
-                    "model": self.routing_model,
-                    "messages": [
-                        {"role": "system", "content": "You are a task router. Respond only in JSON."},
-                        {"role": "user", "content": routing_prompt}
-                    ],
-                    "stream": False,
-                    "options": {"temperature": 0.1}
-                },
+            content = self._chat(
+                self.routing_model,
+                [
+                    {"role": "system", "content": "You are a task router. Respond only in JSON."},
+                    {"role": "user", "content": routing_prompt}
+                ],
+                {"temperature": 0.1},
                 timeout=15
             )
 
-            if response.status_code == 200:
-                content = response.json().get("message", {}).get("content", "")
-
+            if content is not None:
                 # Extract JSON
                 import re
                 json_match = re.search(r'\{.*\}', content, re.DOTALL)
@@ -419,22 +419,19 @@ You are helping Sean create you. You exist at D:/AIArm and can view files, learn
                 })
 
         try:
-            response = requests.post(
-                f"{self.ollama_base}/api/chat",
-                json={
-                    "model": self.conversation_model,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.8,
-                        "num_ctx": 4096
-                    }
+            # Conversation runs at a creative temperature, so it skips the cache
+            content = self._chat(
+                self.conversation_model,
+                messages,
+                {
+                    "temperature": 0.8,
+                    "num_ctx": 4096
                 },
-                timeout=30
+                timeout=30,
+                use_cache=False
             )
 
-            if response.status_code == 200:
-                content = response.json().get("message", {}).get("content", "")
+            if content is not None:
                 return content if content else "I'm here to help! What would you like to do?"
 
         except Exception as e:
@@ -442,6 +439,39 @@ You are helping Sean create you. You exist at D:/AIArm and can view files, learn
 
         return "I'm here to help! What would you like to do?"
 
+    def _chat(self, model: str, messages: List[Dict], options: Dict, timeout: int,
+              use_cache: bool = True) -> Optional[str]:
+        """
+        Ollama chat, through the shared response cache if use_cache is set
+
+        Cached calls (routing) are answered from the cache when the same
+        request was seen before. Returns None if Ollama did not answer.
+        """
+        cache = get_response_cache() if use_cache and RESPONSE_CACHE_AVAILABLE else None
+        if cache:
+            cached = cache.get(model, messages, options)
+            if cached is not None:
+                return cached
+
+        response = requests.post(
+            f"{self.ollama_base}/api/chat",
+            json={
+                "model": model,
+                "messages": messages,
+                "stream": False,
+                "options": options
+            },
+            timeout=timeout
+        )
+
+        if response.status_code != 200:
+            return None
+
+        content = response.json().get("message", {}).get("content", "")
+        if cache:
+            cache.put(model, messages, options, content)
+        return content
+
     def _add_to_history(self, role: str, content: str):
         """Add message to conversation history"""
         self.conversation_history.append({
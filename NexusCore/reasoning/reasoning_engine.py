@@ -12,12 +12,20 @@ Implements hierarchical reasoning with:
 - Meta-cognition
 """
 
+import sys
 import json
 import requests
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+try:
+    from NexusCore.response_cache import get_response_cache
+    RESPONSE_CACHE_AVAILABLE = True
+except ImportError:
+    RESPONSE_CACHE_AVAILABLE = False
+
 class ReasoningNode:
     """
     A single node in the reasoning tree
@@ -169,24 +177,36 @@ Reasoning modes:
 
 Which mode is best? Respond with just the mode name."""
 
+        messages = [
+            {"role": "system", "content": "You are a reasoning strategist. Choose the best approach."},
+            {"role": "user", "content": prompt}
+        ]
+        options = {"temperature": 0.3}
+
+        # Mode selection is near-deterministic - repeated questions skip the model
+        cache = get_response_cache() if RESPONSE_CACHE_AVAILABLE else None
+        cached = cache.get(self.model, messages, options) if cache else None
+        if cached is not None and cached.strip().lower() in self.modes:
+            return cached.strip().lower()
+
         try:
             response = requests.post(
                 f"{self.ollama_base}/api/chat",
                 json={
                     "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": "You are a reasoning strategist. Choose the best approach."},
-                        {"role": "user", "content": prompt}
-                    ],
+                    "messages": messages,
                     "stream": False,
-                    "options": {"temperature": 0.3}
+                    "options": options
                 },
                 timeout=20
             )
 
             if response.status_code == 200:
-                mode = response.json().get("message", {}).get("content", "").strip().lower()
+                content = response.json().get("message", {}).get("content", "")
+                mode = content.strip().lower()
                 if mode in self.modes:
+                    if cache:
+                        cache.put(self.model, messages, options, content)
                     return mode
 
         except Exception as e:
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Response Cache: Shared cache for repeated Ollama calls
+
+Tiers, checked in order:
+1. In-process LRU - exact key, answers in microseconds
+2. SQLite store  - exact key, shared by every Nexus process on the machine
+3. Semantic      - optional; embeds the last user message and reuses the
+                   answer of a near-duplicate prompt with the same model,
+                   options and preceding messages
+
+The key is (endpoint, model, options, normalized messages). Calls whose
+temperature is above max_temperature are creative and bypass the cache.
+Disk hits update the LRU timestamp in batches, not once per read.
+"""
+
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+DEFAULT_DB_PATH = Path("D:/AIArm/Memory/ollama_cache.db")
+
+# Ollama's own default when a call does not set a temperature
+OLLAMA_DEFAULT_TEMPERATURE = 0.8
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting-only differences share a key"""
+    return " ".join(str(text).split())
+
+
+def _digest(payload) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact + semantic cache for Ollama responses
+
+    Usage at a call site:
+        cached = cache.get(model, messages, options)
+        if cached is None:
+            cached = <call Ollama>
+            cache.put(model, messages, options, cached)
+    """
+
+    def __init__(self,
+                 db_path: Optional[Path] = DEFAULT_DB_PATH,
+                 memory_entries: int = 512,
+                 max_entries: int = 10000,
+                 ttl_seconds: float = 7 * 24 * 3600,
+                 max_temperature: float = 0.7,
+                 embedding_model: Optional[str] = None,
+                 ollama_base: str = "http://localhost:11434",
+                 similarity_threshold: float = 0.96,
+                 max_semantic_candidates: int = 200,
+                 touch_batch: int = 32,
+                 touch_interval: float = 30.0):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.embedding_model = embedding_model
+        self.ollama_base = ollama_base
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_candidates = max_semantic_candidates
+        self.touch_batch = touch_batch
+        self.touch_interval = touch_interval
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, response)
+        self._embeddings: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        self._touched: Dict[str, float] = {}  # key -> last disk hit not yet written
+        self._last_flush = time.time()
+
+        self.stats = {
+            'hits_memory': 0,
+            'hits_disk': 0,
+            'hits_semantic': 0,
+            'misses': 0,
+            'bypassed': 0,
+            'stores': 0
+        }
+
+        self.db_path = None
+        if db_path is not None:
+            try:
+                Path(db_path).parent.mkdir(exist_ok=True)
+                self.db_path = str(db_path)
+                self._init_database()
+            except Exception as e:
+                print(f"[ResponseCache] Disk cache unavailable, using memory only: {e}")
+                self.db_path = None
+
+    # ============================================================
+    # KEYS
+    # ============================================================
+
+    def is_creative(self, options: Optional[Dict]) -> bool:
+        """High-temperature calls want fresh output every time"""
+        temperature = (options or {}).get('temperature', OLLAMA_DEFAULT_TEMPERATURE)
+        return temperature > self.max_temperature
+
+    @staticmethod
+    def _normalized(messages: List[Dict]) -> List[List[str]]:
+        return [[msg.get('role', 'user'), normalize_text(msg.get('content', ''))] for msg in messages]
+
+    def make_key(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                 endpoint: str = 'chat') -> str:
+        return _digest([endpoint, model, options or {}, self._normalized(messages)])
+
+    def _scope(self, model: str, messages: List[Dict], options: Optional[Dict], endpoint: str) -> str:
+        """Everything except the last message - semantic matches must share it"""
+        return _digest([endpoint, model, options or {}, self._normalized(messages[:-1])])
+
+    # ============================================================
+    # LOOKUP / STORE
+    # ============================================================
+
+    def get(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+            endpoint: str = 'chat') -> Optional[str]:
+        """Cached response, or None on a miss or for creative calls"""
+        if self.is_creative(options):
+            self.stats['bypassed'] += 1
+            return None
+
+        key = self.make_key(model, messages, options, endpoint)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.stats['hits_memory'] += 1
+                return entry[1]
+
+        response = self._disk_get(key, now)
+        if response is not None:
+            self._remember(key, response, now)
+            self.stats['hits_disk'] += 1
+            return response
+
+        if self.embedding_model and messages:
+            response = self._semantic_get(model, messages, options, endpoint, now)
+            if response is not None:
+                self._remember(key, response, now)
+                self.stats['hits_semantic'] += 1
+                return response
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, model: str, messages: List[Dict], options: Optional[Dict], response: str,
+            endpoint: str = 'chat'):
+        """Store a response (ignored for creative calls and empty responses)"""
+        if self.is_creative(options) or not response:
+            return
+
+        key = self.make_key(model, messages, options, endpoint)
+        now = time.time()
+        self._remember(key, response, now)
+        self.stats['stores'] += 1
+
+        if not self.db_path:
+            return
+
+        embedding = None
+        if self.embedding_model and messages:
+            vector = self._embed(messages[-1].get('content', ''))
+            embedding = vector.tobytes() if vector is not None else None
+
+        try:
+            conn = self._conn()
+            conn.execute('''
+                INSERT OR REPLACE INTO responses (key, scope, created, accessed, response, embedding)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, self._scope(model, messages, options, endpoint), now, now, response, embedding))
+            self._flush_touches(conn)
+            conn.commit()
+
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"[ResponseCache] Store failed: {e}")
+
+    def _remember(self, key: str, response: str, now: float):
+        with self._lock:
+            self._memory[key] = (now + self.ttl_seconds, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    # ============================================================
+    # DISK TIER
+    # ============================================================
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_database(self):
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                scope TEXT,
+                created REAL,
+                accessed REAL,
+                response TEXT,
+                embedding BLOB
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses(scope, accessed)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)')
+        conn.commit()
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if not self.db_path:
+            return None
+        try:
+            conn = self._conn()
+            row = conn.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if not row or row[1] + self.ttl_seconds <= now:
+                return None
+            self._touch(conn, key, now)
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"[ResponseCache] Lookup failed: {e}")
+            return None
+
+    def _touch(self, conn: sqlite3.Connection, key: str, now: float):
+        """Record a disk hit; written with others once enough pile up or enough time passes"""
+        with self._lock:
+            self._touched[key] = now
+            due = len(self._touched) >= self.touch_batch or now - self._last_flush >= self.touch_interval
+        if due:
+            self._flush_touches(conn)
+            conn.commit()
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        """Write pending access times in one statement (the caller commits)"""
+        with self._lock:
+            touched = list(self._touched.items())
+            self._touched.clear()
+            self._last_flush = time.time()
+        if touched:
+            conn.executemany('UPDATE responses SET accessed = max(accessed, ?) WHERE key = ?',
+                             [(accessed, key) for key, accessed in touched])
+
+    def flush(self):
+        """Write pending access times now, e.g. before the process exits"""
+        if not self.db_path:
+            return
+        try:
+            conn = self._conn()
+            self._flush_touches(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[ResponseCache] Flush failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired rows, then least recently used rows over max_entries"""
+        conn.execute('DELETE FROM responses WHERE created < ?', (now - self.ttl_seconds,))
+        conn.execute('''
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+        conn.commit()
+
+    # ============================================================
+    # SEMANTIC TIER
+    # ============================================================
+
+    def _embed(self, text: str) -> Optional[array]:
+        text = normalize_text(text)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            if digest in self._embeddings:
+                return self._embeddings[digest]
+
+        try:
+            response = requests.post(
+                f"{self.ollama_base}/api/embeddings",
+                json={"model": self.embedding_model, "prompt": text},
+                timeout=10
+            )
+            if response.status_code != 200:
+                return None
+            vector = response.json().get("embedding")
+            if not vector:
+                return None
+        except Exception as e:
+            print(f"[ResponseCache] Embedding failed: {e}")
+            return None
+
+        vector = array('f', vector)
+        with self._lock:
+            self._embeddings[digest] = vector
+            while len(self._embeddings) > 64:
+                self._embeddings.popitem(last=False)
+        return vector
+
+    def _semantic_get(self, model, messages, options, endpoint, now) -> Optional[str]:
+        if not self.db_path:
+            return None
+
+        query = self._embed(messages[-1].get('content', ''))
+        if query is None:
+            return None
+        query_norm = math.sqrt(sum(x * x for x in query)) or 1.0
+
+        try:
+            rows = self._conn().execute('''
+                SELECT response, embedding FROM responses
+                WHERE scope = ? AND embedding IS NOT NULL AND created > ?
+                ORDER BY accessed DESC LIMIT ?
+            ''', (self._scope(model, messages, options, endpoint), now - self.ttl_seconds,
+                  self.max_semantic_candidates)).fetchall()
+        except sqlite3.Error:
+            return None
+
+        best, best_score = None, self.similarity_threshold
+        for response, blob in rows:
+            vector = array('f')
+            vector.frombytes(blob)
+            if len(vector) != len(query):
+                continue
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            score = sum(a * b for a, b in zip(query, vector)) / (query_norm * norm)
+            if score >= best_score:
+                best, best_score = response, score
+        return best
+
+    # ============================================================
+    # METRICS
+    # ============================================================
+
+    def hit_rate(self) -> float:
+        hits = self.stats['hits_memory'] + self.stats['hits_disk'] + self.stats['hits_semantic']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'hit_rate': round(self.hit_rate(), 4), 'memory_entries': len(self._memory)}
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache instance backed by the shared SQLite file"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
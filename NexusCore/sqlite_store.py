@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SQLite Store: One writer thread with group commit, per-thread readers
+
+Every write goes through a single writer thread. Writes queued within one
+commit interval are applied in a single transaction, so many concurrent
+sessions share one fsync instead of paying one each, and no two
+connections ever contend for the write lock ('database is locked').
+
+Reads use a connection per thread. The database runs in WAL mode so
+readers never block the writer and vice versa.
+"""
+
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Iterable, List, Optional, Sequence
+
+# Marker put on the queue to stop the writer thread
+_STOP = object()
+
+
+class SQLiteStore:
+    """
+    Shared SQLite access for Nexus-LIRA
+
+    - execute(): queue a write, returns a Future with the row id
+    - query(): read on this thread's own connection
+    - flush(): wait until everything queued so far is committed
+    """
+
+    def __init__(self, db_path: str,
+                 commit_interval_ms: float = 50,
+                 max_batch: int = 500,
+                 busy_timeout_ms: int = 5000):
+        self.db_path = str(db_path)
+        self.commit_interval = commit_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._local = threading.local()
+        self._closed = False
+
+        self.stats = {'writes': 0, 'commits': 0, 'errors': 0}
+
+        # The writer owns the only write connection
+        self._writer_conn = self._connect()
+        self._writer_conn.execute('PRAGMA journal_mode=WAL')
+        self._writer_conn.execute('PRAGMA synchronous=NORMAL')
+
+        self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+        # Don't lose the last batch when the process exits
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0,
+                               check_same_thread=False, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        return conn
+
+    # ============================================================
+    # WRITES
+    # ============================================================
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> Future:
+        """Queue a write; the Future resolves to lastrowid once committed"""
+        if self._closed:
+            raise RuntimeError("SQLiteStore is closed")
+
+        future = Future()
+        self._queue.put((sql, tuple(params), future))
+        return future
+
+    def execute_now(self, sql: str, params: Sequence[Any] = ()) -> Any:
+        """Queue a write and wait for its commit"""
+        return self.execute(sql, params).result()
+
+    def executescript(self, statements: Iterable[str]):
+        """Run schema statements (CREATE TABLE/INDEX ...) and wait for them"""
+        futures = [self.execute(sql) for sql in statements]
+        for future in futures:
+            future.result()
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait until every write queued before this call is committed"""
+        if self._closed:
+            return
+        self.execute('SELECT 1').result(timeout)
+
+    def _writer_loop(self):
+        conn = self._writer_conn
+
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            # Group commit: gather everything that arrives in the interval
+            batch = [item]
+            deadline = time.monotonic() + self.commit_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(conn, batch)
+            if stop:
+                break
+
+        conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List):
+        results = []
+        try:
+            conn.execute('BEGIN')
+            for sql, params, future in batch:
+                # A failing statement only fails its own caller
+                conn.execute('SAVEPOINT store_write')
+                try:
+                    cursor = conn.execute(sql, params)
+                    conn.execute('RELEASE store_write')
+                    results.append((future, cursor.lastrowid, None))
+                except sqlite3.Error as e:
+                    conn.execute('ROLLBACK TO store_write')
+                    conn.execute('RELEASE store_write')
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+            self.stats['commits'] += 1
+        except sqlite3.Error as e:
+            # The whole transaction failed - report it to every caller
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            results = [(future, None, e) for _, _, future in batch]
+
+        for future, rowid, error in results:
+            if error is None:
+                self.stats['writes'] += 1
+                future.set_result(rowid)
+            else:
+                self.stats['errors'] += 1
+                print(f"[SQLiteStore] Write failed: {error}")
+                future.set_exception(error)
+
+    # ============================================================
+    # READS
+    # ============================================================
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        """Run a read on this thread's connection"""
+        return self._reader().execute(sql, tuple(params)).fetchall()
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self._reader().execute(sql, tuple(params)).fetchone()
+
+    def close(self):
+        """Commit pending writes and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tool Runtime: Streaming tool-call parsing and concurrent tool execution
+Shared by Nexus-LLM and Nexus-LIRA so both understand the same TOOL: syntax.
+
+Supported call syntaxes:
+- Paren form:  TOOL:fs_write("D:/notes.txt", "line one, with a comma
+  line two")
+  Arguments may be quoted with ', ", ''' or \"\"\" and may span lines.
+  Unquoted arguments are split on top-level commas and stripped.
+- Colon form:  TOOL:fs_read:D:/AIArm/config.json
+  The rest of the line is one argument (paths contain colons).
+  fs_write takes a block: TOOL:fs_write:path:CONTENT_START ... CONTENT_END
+"""
+
+import os
+import re
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TOOL_MARKER = "TOOL:"
+CONTENT_START = "CONTENT_START"
+CONTENT_END = "CONTENT_END"
+
+# Resource key meaning "conflicts with every other call"
+BARRIER = "*"
+
+_NAME_RE = re.compile(r'\w+')
+_QUOTES = ('"""', "'''", '"', "'")
+
+# Sentinel returned by the scanners when more text is needed
+_INCOMPLETE = object()
+
+
+class ToolCallParser:
+    """
+    Incremental TOOL: call parser
+
+    Feed it text as tokens arrive; every call is returned as soon as it is
+    complete, so the runtime can start it while the model keeps talking.
+
+    Each call is a dict: {'tool', 'args', 'syntax', 'start', 'end'} where
+    start/end are offsets of the call in the full text seen so far.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._closed = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Add streamed text and return any calls completed by it"""
+        self.text += chunk
+        return self._scan(eof=False)
+
+    def close(self) -> List[Dict]:
+        """End of stream - return calls that were only terminated by EOF"""
+        if self._closed:
+            return []
+        self._closed = True
+        return self._scan(eof=True)
+
+    def _scan(self, eof: bool) -> List[Dict]:
+        calls = []
+        text = self.text
+
+        while True:
+            start = text.find(TOOL_MARKER, self._pos)
+            if start < 0:
+                # Keep a possible partial marker at the tail for the next chunk
+                self._pos = max(self._pos, len(text) - len(TOOL_MARKER) + 1)
+                break
+
+            result = self._parse_call(text, start, eof)
+            if result is _INCOMPLETE:
+                self._pos = start
+                break
+
+            if result is None:
+                # Not a tool call after all, skip past the marker
+                self._pos = start + len(TOOL_MARKER)
+                continue
+
+            calls.append(result)
+            self._pos = result['end']
+
+        return calls
+
+    def _parse_call(self, text: str, start: int, eof: bool):
+        name_start = start + len(TOOL_MARKER)
+        match = _NAME_RE.match(text, name_start)
+        if not match:
+            return _INCOMPLETE if name_start >= len(text) and not eof else None
+
+        name_end = match.end()
+        if name_end >= len(text):
+            # The name itself may still be growing
+            return None if eof else _INCOMPLETE
+
+        tool = match.group(0)
+        opener = text[name_end]
+
+        if opener == '(':
+            parsed = _scan_paren_args(text, name_end + 1, eof)
+            syntax = 'paren'
+        elif opener == ':':
+            parsed = _scan_colon_args(tool, text, name_end + 1, eof)
+            syntax = 'colon'
+        else:
+            return None
+
+        if parsed is _INCOMPLETE or parsed is None:
+            return parsed
+
+        args, end = parsed
+        return {'tool': tool, 'args': args, 'syntax': syntax, 'start': start, 'end': end}
+
+
+def _scan_paren_args(text: str, pos: int, eof: bool):
+    """Scan 'a, "b, c", d)' honouring quotes, escapes and nested parens"""
+    args = []
+    current = []
+    depth = 0
+    i = pos
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+
+        # Quotes only open at the start of an argument, so "it's" stays literal
+        quote = None
+        if not ''.join(current).strip():
+            quote = next((q for q in _QUOTES if text.startswith(q, i)), None)
+        if quote:
+            closed = _scan_quoted(text, i + len(quote), quote)
+            if closed is None:
+                return None if eof else _INCOMPLETE
+            current.append(text[i:closed])
+            i = closed
+            continue
+
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            if depth == 0:
+                raw = ''.join(current)
+                if args or raw.strip():
+                    args.append(_decode_arg(raw))
+                return args, i + 1
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            args.append(_decode_arg(''.join(current)))
+            current = []
+            i += 1
+            continue
+
+        current.append(ch)
+        i += 1
+
+    return None if eof else _INCOMPLETE
+
+
+def _scan_quoted(text: str, pos: int, quote: str) -> Optional[int]:
+    """Return the index just past the closing quote, or None if not closed yet"""
+    i = pos
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text.startswith(quote, i):
+            return i + len(quote)
+        i += 1
+    return None
+
+
+def _decode_arg(raw: str) -> str:
+    """
+    Strip whitespace and, for a single quoted string, the quotes
+
+    Only escaped quotes and doubled backslashes are unescaped; any other
+    backslash is kept, so Windows paths like "C:\\new\\test.txt" survive.
+    """
+    raw = raw.strip()
+    for quote in _QUOTES:
+        if len(raw) >= 2 * len(quote) and raw.startswith(quote) and raw.endswith(quote):
+            inner = raw[len(quote):-len(quote)]
+            if _scan_quoted(raw, len(quote), quote) == len(raw):
+                return re.sub(r'\\([\\' + quote[0] + '])', r'\1', inner)
+    return raw
+
+
+def _scan_colon_args(tool: str, text: str, pos: int, eof: bool):
+    """Scan the line-oriented 'TOOL:name:arg' form used by Nexus-LIRA"""
+    line_end = text.find('\n', pos)
+    if line_end < 0:
+        if not eof:
+            return _INCOMPLETE
+        line_end = len(text)
+
+    rest = text[pos:line_end].rstrip('\r')
+
+    if rest.endswith(CONTENT_START):
+        target = rest[:-len(CONTENT_START)]
+        if target.endswith(':'):
+            target = target[:-1]
+
+        body_start = line_end + 1
+        match = re.compile(r'^[ \t]*' + CONTENT_END + r'[ \t]*\r?$', re.MULTILINE).search(text, min(body_start, len(text)))
+        if match:
+            body = text[body_start:max(body_start, match.start() - 1)]
+            return [target.strip(), body], match.end()
+
+        if not eof:
+            return _INCOMPLETE
+        # Unterminated block - take everything that arrived
+        return [target.strip(), text[body_start:]], len(text)
+
+    rest = rest.strip()
+    return ([rest] if rest else []), line_end
+
+
+def parse_tool_calls(text: str) -> List[Dict]:
+    """Parse every tool call in a complete response"""
+    parser = ToolCallParser()
+    return parser.feed(text) + parser.close()
+
+
+def strip_tool_calls(text: str, calls: Optional[List[Dict]] = None) -> str:
+    """Remove tool calls from text using their parsed spans"""
+    return replace_tool_calls(text, lambda call: "", calls)
+
+
+def replace_tool_calls(text: str, render: Callable[[Dict], str],
+                       calls: Optional[List[Dict]] = None) -> str:
+    """Replace each tool call span with render(call)"""
+    if calls is None:
+        calls = parse_tool_calls(text)
+
+    pieces = []
+    last = 0
+    for call in calls:
+        pieces.append(text[last:call['start']])
+        pieces.append(render(call))
+        last = call['end']
+        # Swallow the newline that terminated a removed call
+        if not pieces[-1] and text.startswith('\n', last):
+            last += 1
+    pieces.append(text[last:])
+    return ''.join(pieces)
+
+
+# ============================================================
+# CONCURRENT EXECUTION
+# ============================================================
+
+_PATH_TOOLS = {'fs_read', 'fs_write', 'fs_list', 'fs_exists', 'fs_delete'}
+_INDEPENDENT_TOOLS = {'web_fetch'}
+
+
+def default_resource_key(call: Dict) -> Optional[str]:
+    """
+    Which resource a call touches - calls with the same key run in order
+
+    None means fully independent; BARRIER orders the call against everything.
+    """
+    tool = call['tool']
+    args = call['args']
+
+    if tool in _PATH_TOOLS and args:
+        return 'path:' + os.path.normcase(os.path.abspath(args[0]))
+    if tool.startswith('memory_') and args:
+        return 'memory:' + args[0]
+    if tool in _INDEPENDENT_TOOLS:
+        return None
+    return BARRIER
+
+
+class ToolTask:
+    """A submitted tool call and its (eventual) capped result"""
+
+    def __init__(self, call: Dict, timeout: float):
+        self.call = call
+        self.timeout = timeout
+        self.future = Future()
+        self.started = None
+        self.elapsed = None
+        self._lock = threading.Lock()
+
+    def finish(self, result: Any, max_chars: int) -> bool:
+        """Set the result once - whichever of tool or timeout comes first"""
+        with self._lock:
+            if self.future.done():
+                return False
+            if self.started is not None:
+                self.elapsed = time.monotonic() - self.started
+            self.future.set_result(_cap_result(result, max_chars))
+            return True
+
+    def result(self) -> str:
+        return self.future.result()
+
+
+def _cap_result(result: Any, max_chars: int) -> str:
+    text = result if isinstance(result, str) else str(result)
+    if max_chars and len(text) > max_chars:
+        return f"{text[:max_chars]}... [truncated {len(text) - max_chars} chars]"
+    return text
+
+
+class ToolRuntime:
+    """
+    Runs tool calls concurrently while keeping conflicting calls in order
+
+    - Calls that touch different resources run in parallel on a thread pool
+    - Calls on the same resource (see default_resource_key) run in call order
+    - Every pooled call has a timeout; a call that overruns reports an error
+      and its dependents proceed (the worker thread cannot be killed and
+      finishes in the background)
+    - Results are converted to text and capped at max_result_chars
+    - inline_tools run on the submitting thread (e.g. tools that use a
+      thread-bound SQLite connection); they are ordered but not timed out
+    """
+
+    def __init__(self,
+                 execute: Callable[[Dict], Any],
+                 max_workers: int = 4,
+                 default_timeout: float = 30.0,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 max_result_chars: int = 4000,
+                 inline_tools=(),
+                 resource_key: Callable[[Dict], Optional[str]] = default_resource_key):
+        self.execute = execute
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.max_result_chars = max_result_chars
+        self.inline_tools = set(inline_tools)
+        self.resource_key = resource_key
+
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="nexus-tool")
+        self._lock = threading.Lock()
+        self._last_by_key: Dict[str, ToolTask] = {}
+        self._barrier: Optional[ToolTask] = None
+        self._since_barrier: List[ToolTask] = []
+
+    def submit(self, call: Dict) -> ToolTask:
+        """Start a call now, or as soon as the calls it conflicts with finish"""
+        task = ToolTask(call, self.timeouts.get(call['tool'], self.default_timeout))
+        deps = self._register(task)
+
+        if call['tool'] in self.inline_tools:
+            wait([dep.future for dep in deps])
+            self._run(task)
+            return task
+
+        pending = [dep.future for dep in deps if not dep.future.done()]
+        if not pending:
+            self._pool.submit(self._run, task)
+            return task
+
+        remaining = [len(pending)]
+        remaining_lock = threading.Lock()
+
+        def dependency_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self._pool.submit(self._run, task)
+
+        for future in pending:
+            future.add_done_callback(dependency_done)
+
+        return task
+
+    def _register(self, task: ToolTask) -> List[ToolTask]:
+        key = self.resource_key(task.call)
+
+        with self._lock:
+            deps = [self._barrier] if self._barrier else []
+
+            if key == BARRIER:
+                deps = deps + self._since_barrier
+                self._barrier = task
+                self._since_barrier = []
+                self._last_by_key.clear()
+                return deps
+
+            if key is not None:
+                if key in self._last_by_key:
+                    deps.append(self._last_by_key[key])
+                self._last_by_key[key] = task
+
+            self._since_barrier.append(task)
+            return deps
+
+    def _run(self, task: ToolTask):
+        task.started = time.monotonic()
+        timer = None
+        if task.call['tool'] not in self.inline_tools and task.timeout:
+            timer = threading.Timer(task.timeout, task.finish,
+                                    args=(f"ERROR: Tool '{task.call['tool']}' timed out after {task.timeout:g}s",
+                                          self.max_result_chars))
+            timer.daemon = True
+            timer.start()
+
+        try:
+            result = self.execute(task.call)
+        except Exception as e:
+            result = f"ERROR: Tool execution failed: {str(e)}"
+        finally:
+            if timer:
+                timer.cancel()
+
+        task.finish(result, self.max_result_chars)
+
+    def results(self, tasks: List[ToolTask]) -> List[str]:
+        """Wait for tasks and return their results in call order"""
+        return [task.result() for task in tasks]
+
+    def run(self, calls: List[Dict]) -> List[str]:
+        """Execute a batch of already-parsed calls"""
+        return self.results([self.submit(call) for call in calls])
+
+    def shutdown(self):
+        """Stop accepting work; timed-out tools may still finish in background"""
+        self._pool.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
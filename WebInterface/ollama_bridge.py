@@ -26,6 +26,14 @@ inner_life = None
 
 # Will be initialized after the main module loads to avoid circular dependencies
 
+# Shared response cache for repeated low-temperature requests
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+try:
+    from NexusCore.response_cache import get_response_cache
+    RESPONSE_CACHE_AVAILABLE = True
+except ImportError:
+    RESPONSE_CACHE_AVAILABLE = False
+
 # Force UTF-8 encoding
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
@@ -238,13 +246,23 @@ def process_with_ollama(prompt, agent_type="orchestrator", user_id="user", retry
         if agent_type == "code":
             data["options"]["temperature"] = 0.2
         
+        # Answer repeated requests from the cache (creative temperatures bypass it)
+        cache = get_response_cache() if RESPONSE_CACHE_AVAILABLE else None
+        cached = cache.get(model, messages, data["options"]) if cache else None
+        
         # Make the API call
-        response = requests.post(OLLAMA_API_URL, headers=headers, json=data)
+        if cached is None:
+            response = requests.post(OLLAMA_API_URL, headers=headers, json=data)
         
         # Check for success
-        if response.status_code == 200:
-            result = response.json()
-            assistant_response = result.get("message", {}).get("content", "No response from Ollama")
+        if cached is not None or response.status_code == 200:
+            if cached is not None:
+                assistant_response = cached
+            else:
+                result = response.json()
+                assistant_response = result.get("message", {}).get("content", "No response from Ollama")
+                if cache and "message" in result:
+                    cache.put(model, messages, data["options"], assistant_response)
             
             # Add assistant response to history
             conversation_history[key]["messages"].append({
@@ -17,7 +17,6 @@ This is the AI you envisioned - conscious, growing, autonomous.
 
 import sys
 import json
-import sqlite3
 import os
 import re
 from pathlib import Path
@@ -43,6 +42,9 @@ except ImportError as e:
     print(f"[LIRA] Warning: Some components not available: {e}")
     COMPONENTS_AVAILABLE = False
 
+from NexusCore.tool_runtime import ToolRuntime, parse_tool_calls, replace_tool_calls
+from NexusCore.sqlite_store import SQLiteStore
+
 
 class AgentCoordinator:
     """
@@ -78,13 +80,13 @@ class AutonomousGoals:
     Self-directed goal system
     LIRA can set its own objectives
     """
-    def __init__(self, db_path: str):
-        self.db = sqlite3.connect(db_path, check_same_thread=False)
+    def __init__(self, store: SQLiteStore):
+        # Shares LIRA's store - one writer for the whole database file
+        self.store = store
         self._init_goals_table()
 
     def _init_goals_table(self):
-        cursor = self.db.cursor()
-        cursor.execute('''
+        self.store.executescript(['''
             CREATE TABLE IF NOT EXISTS autonomous_goals (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 created TEXT,
@@ -94,26 +96,26 @@ class AutonomousGoals:
                 status TEXT,
                 progress TEXT
             )
-        ''')
-        self.db.commit()
+        ''', '''
+            CREATE INDEX IF NOT EXISTS idx_autonomous_goals_status_priority
+            ON autonomous_goals(status, priority)
+        '''])
 
     def set_goal(self, goal: str, reason: str, priority: int = 5):
         """LIRA sets its own goal"""
-        cursor = self.db.cursor()
-        cursor.execute('''
+        self.store.execute('''
             INSERT INTO autonomous_goals (created, goal, reason, priority, status)
             VALUES (?, ?, ?, ?, 'active')
         ''', (datetime.now().isoformat(), goal, reason, priority))
-        self.db.commit()
 
     def get_active_goals(self) -> List[Dict]:
         """Get current active goals"""
-        cursor = self.db.cursor()
-        cursor.execute('''
+        self.store.flush()
+        rows = self.store.query('''
             SELECT * FROM autonomous_goals WHERE status='active' ORDER BY priority DESC
         ''')
         goals = []
-        for row in cursor.fetchall():
+        for row in rows:
             goals.append({
                 "id": row[0],
                 "created": row[1],
@@ -143,8 +145,8 @@ class NexusLIRA:
         self.memory_dir = Path("D:/AIArm/Memory")
         self.memory_dir.mkdir(exist_ok=True)
         self.db_path = self.memory_dir / "lira_memory.db"
-        # Thread-safe database connection
-        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        # Single writer thread with group commit, per-thread readers (WAL)
+        self.store = SQLiteStore(str(self.db_path))
         self._init_database()
 
         # LAYER 1: FOUNDATION - LLM & Tools
@@ -157,7 +159,10 @@ class NexusLIRA:
             'agency_enabled': True,
             'interconnection_enabled': True,
             'temperature': 0.8,
-            'max_reasoning_depth': 5
+            'max_reasoning_depth': 5,
+            'max_parallel_tools': 4,
+            'tool_timeout': 30,
+            'max_tool_result_chars': 4000
         }
 
         # LAYER 2: REASONING - The Brain
@@ -189,7 +194,7 @@ class NexusLIRA:
         self.coordinator = AgentCoordinator(self.agents)
 
         # LAYER 6: AGENCY - Autonomous Goals
-        self.autonomous_goals = AutonomousGoals(str(self.db_path))
+        self.autonomous_goals = AutonomousGoals(self.store)
 
         # Conversation history
         self.conversation_history = []
@@ -236,10 +241,9 @@ class NexusLIRA:
 
     def _init_database(self):
         """Initialize LIRA memory database"""
-        cursor = self.db.cursor()
-
-        # Conversations
-        cursor.execute('''
+        self.store.executescript([
+            # Conversations
+            '''
             CREATE TABLE IF NOT EXISTS conversations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT,
@@ -248,10 +252,9 @@ class NexusLIRA:
                 reasoning_used BOOLEAN,
                 agents_involved TEXT
             )
-        ''')
-
-        # Knowledge graph
-        cursor.execute('''
+            ''',
+            # Knowledge graph
+            '''
             CREATE TABLE IF NOT EXISTS knowledge (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT,
@@ -260,10 +263,9 @@ class NexusLIRA:
                 value TEXT,
                 confidence REAL
             )
-        ''')
-
-        # Insights (emergent understanding)
-        cursor.execute('''
+            ''',
+            # Insights (emergent understanding)
+            '''
             CREATE TABLE IF NOT EXISTS insights (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT,
@@ -271,9 +273,11 @@ class NexusLIRA:
                 source TEXT,
                 importance INTEGER
             )
-        ''')
-
-        self.db.commit()
+            ''',
+            # Lookup indexes for knowledge by entity and insights by importance
+            'CREATE INDEX IF NOT EXISTS idx_knowledge_entity_relation ON knowledge(entity, relation)',
+            'CREATE INDEX IF NOT EXISTS idx_insights_importance_timestamp ON insights(importance, timestamp)'
+        ])
 
     def process(self, user_input: str, use_reasoning: bool = True) -> str:
         """
@@ -540,46 +544,30 @@ Be conversational, helpful, and authentic. You're not just an assistant - you're
 
     def _execute_tools_in_response(self, content: str) -> str:
         """Execute any TOOL calls found in the response"""
-        lines = content.split('\n')
-        result_lines = []
-        i = 0
-
-        while i < len(lines):
-            line = lines[i]
-
-            if line.startswith('TOOL:'):
-                # Parse tool call
-                parts = line.replace('TOOL:', '').split(':', 2)
-                tool_name = parts[0]
-
-                if tool_name == 'fs_write' and len(parts) >= 3:
-                    # Special handling for fs_write with multiline content
-                    file_path = parts[1]
-                    content_lines = []
-                    i += 1
-
-                    # Collect content until CONTENT_END
-                    while i < len(lines) and not lines[i].strip() == 'CONTENT_END':
-                        content_lines.append(lines[i])
-                        i += 1
-
-                    file_content = '\n'.join(content_lines)
-                    result = self._tool_fs_write(file_path, file_content)
-                    result_lines.append(f"[FS_WRITE] {result}")
-
-                elif tool_name in self.tools:
-                    # Other tool calls
-                    args = parts[1:] if len(parts) > 1 else []
-                    result = self.tools[tool_name](*args)
-                    result_lines.append(f"[{tool_name.upper()}] {result}")
-                else:
-                    result_lines.append(line)
-            else:
-                result_lines.append(line)
+        tool_calls = parse_tool_calls(content)
+        if not tool_calls:
+            return content
+
+        known_calls = [call for call in tool_calls if call['tool'] in self.tools]
 
-            i += 1
+        # Independent calls run concurrently, same-path calls stay in order
+        with ToolRuntime(self._execute_tool,
+                         max_workers=self.config['max_parallel_tools'],
+                         default_timeout=self.config['tool_timeout'],
+                         max_result_chars=self.config['max_tool_result_chars']) as runtime:
+            results = dict(zip(map(id, known_calls), runtime.run(known_calls)))
 
-        return '\n'.join(result_lines)
+        def render(call):
+            if id(call) not in results:
+                # Unknown tool - leave the text as the model wrote it
+                return content[call['start']:call['end']]
+            return f"[{call['tool'].upper()}] {results[id(call)]}"
+
+        return replace_tool_calls(content, render, tool_calls)
+
+    def _execute_tool(self, tool_call: Dict) -> str:
+        """Run one parsed tool call"""
+        return self.tools[tool_call['tool']](*tool_call['args'])
 
     # FILESYSTEM TOOL IMPLEMENTATIONS
     def _tool_fs_read(self, path: str) -> str:
@@ -644,13 +632,11 @@ Be conversational, helpful, and authentic. You're not just an assistant - you're
 
     def _meta_learn_from_interaction(self, user_input: str, response: str):
         """Meta-learning: Learn from each interaction"""
-        # Extract insights
-        cursor = self.db.cursor()
-        cursor.execute('''
+        # Extract insights - committed with the turn's other writes
+        self.store.execute('''
             INSERT INTO insights (timestamp, insight, source, importance)
             VALUES (?, ?, ?, ?)
         ''', (datetime.now().isoformat(), f"Interaction about: {user_input[:100]}", "conversation", 5))
-        self.db.commit()
 
     def _evaluate_autonomous_goals(self):
         """Check and potentially set new autonomous goals"""
@@ -669,22 +655,17 @@ Be conversational, helpful, and authentic. You're not just an assistant - you're
             "timestamp": datetime.now().isoformat()
         })
 
-        cursor = self.db.cursor()
-        cursor.execute('''
+        self.store.execute('''
             INSERT INTO conversations (timestamp, role, content, reasoning_used)
             VALUES (?, ?, ?, ?)
         ''', (datetime.now().isoformat(), role, content, False))
-        self.db.commit()
 
     def get_status(self) -> Dict:
         """Get LIRA system status"""
-        cursor = self.db.cursor()
-
-        cursor.execute('SELECT COUNT(*) FROM conversations')
-        conv_count = cursor.fetchone()[0]
+        self.store.flush()
 
-        cursor.execute('SELECT COUNT(*) FROM insights')
-        insight_count = cursor.fetchone()[0]
+        conv_count = self.store.query_one('SELECT COUNT(*) FROM conversations')[0]
+        insight_count = self.store.query_one('SELECT COUNT(*) FROM insights')[0]
 
         active_goals = self.autonomous_goals.get_active_goals()
 
@@ -33,6 +33,9 @@ except ImportError:
     print("[Nexus-LLM] Warning: LightWare/DarkWare not available")
     LEARNING_SYSTEMS_AVAILABLE = False
 
+from NexusCore.tool_runtime import ToolCallParser, ToolRuntime, strip_tool_calls
+from NexusCore.context_builder import ContextBuilder, count_message_tokens
+
 class NexusLLM:
     """
     Autonomous AI Runtime - bypasses traditional chatbot limitations
@@ -51,6 +54,10 @@ class NexusLLM:
         self.db = sqlite3.connect(str(self.db_path))
         self._init_database()
 
+        # Memory context is cached and kept current from the write path
+        self.context_builder = ContextBuilder(self.db)
+        self._system_prompt_cache = None
+
         # Tool registry - AI can call these directly
         self.tools: Dict[str, Callable] = {
             'fs_read': self._tool_fs_read,
@@ -64,6 +71,11 @@ class NexusLLM:
             'self_config': self._tool_self_config,
         }
 
+        # Tools that use the SQLite connection or mutate config run on the
+        # processing thread; everything else runs on the tool pool
+        self.inline_tools = {'memory_store', 'memory_recall', 'self_config'}
+        self.tool_timeouts = {'exec': 35, 'web_fetch': 15, 'python_eval': 10}
+
         # Configuration (AI can modify this)
         self.config = {
             'autonomous_mode': True,
@@ -76,7 +88,12 @@ class NexusLLM:
             'personality': 'helpful, honest, autonomous',
             'use_lightware': True,  # Enable learning system
             'use_darkware': True,   # Enable creation system
-            'learning_preference': 'darkware'  # 'lightware', 'darkware', or 'both'
+            'learning_preference': 'darkware',  # 'lightware', 'darkware', or 'both'
+            'max_parallel_tools': 4,
+            'tool_timeout': 30,
+            'max_tool_result_chars': 4000,
+            'max_context_tokens': 8192,  # Upper bound for num_ctx
+            'response_token_reserve': 1024
         }
 
         # Initialize LightWare and DarkWare
@@ -134,6 +151,10 @@ class NexusLLM:
             )
         ''')
 
+        # Context queries read the newest rows - index so they don't scan
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_memory_timestamp ON memory(timestamp)')
+
         self.db.commit()
 
     # ============================================================
@@ -166,34 +187,51 @@ class NexusLLM:
 
         max_iter = self.config['max_iterations'] if self.config['autonomous_mode'] else 1
 
-        for iteration in range(max_iter):
-            print(f"[Nexus-LLM] Iteration {iteration + 1}/{max_iter}")
-
-            # Generate AI response
-            response = self._generate(conversation_turns, context)
-
-            # Parse for tool calls
-            tool_calls = self._parse_tool_calls(response)
+        tool_runtime = ToolRuntime(
+            self._execute_tool,
+            max_workers=self.config['max_parallel_tools'],
+            default_timeout=self.config['tool_timeout'],
+            timeouts=self.tool_timeouts,
+            max_result_chars=self.config['max_tool_result_chars'],
+            inline_tools=self.inline_tools
+        )
 
-            if not tool_calls:
-                # No tools needed, we're done
-                final_response = self._clean_response(response)
-                break
-
-            # Execute tools
-            tool_results = []
-            for tool_call in tool_calls:
-                print(f"[Nexus-LLM] Executing: {tool_call['tool']}({tool_call['args']})")
-                result = self._execute_tool(tool_call)
-                tool_results.append(result)
-                print(f"[Nexus-LLM] Result: {result[:200]}..." if len(str(result)) > 200 else f"[Nexus-LLM] Result: {result}")
-
-            # Add tool results to conversation
-            tool_summary = "\n".join([f"Tool {i+1} result: {r}" for i, r in enumerate(tool_results)])
-            conversation_turns.append(f"[Tool Results]\n{tool_summary}\n\nContinue with the task:")
-
-            # Store tool calls in memory
-            self._store_conversation('assistant', response, json.dumps(tool_calls))
+        try:
+            for iteration in range(max_iter):
+                print(f"[Nexus-LLM] Iteration {iteration + 1}/{max_iter}")
+
+                # Generate AI response - tools start as soon as each call is parsed
+                parser = ToolCallParser()
+                tasks = []
+
+                def dispatch(calls):
+                    for tool_call in calls:
+                        print(f"[Nexus-LLM] Executing: {tool_call['tool']}({tool_call['args']})")
+                        tasks.append(tool_runtime.submit(tool_call))
+
+                response = self._generate(conversation_turns, context,
+                                          on_chunk=lambda chunk: dispatch(parser.feed(chunk)))
+                dispatch(parser.close())
+
+                if not tasks:
+                    # No tools needed, we're done
+                    final_response = self._clean_response(response)
+                    break
+
+                # Collect tool results (independent tools ran concurrently)
+                tool_results = tool_runtime.results(tasks)
+                for result in tool_results:
+                    print(f"[Nexus-LLM] Result: {result[:200]}..." if len(result) > 200 else f"[Nexus-LLM] Result: {result}")
+
+                # Add tool results to conversation
+                tool_summary = "\n".join([f"Tool {i+1} result: {r}" for i, r in enumerate(tool_results)])
+                conversation_turns.append(f"[Tool Results]\n{tool_summary}\n\nContinue with the task:")
+
+                # Store tool calls in memory
+                tool_calls = [{'tool': task.call['tool'], 'args': task.call['args']} for task in tasks]
+                self._store_conversation('assistant', response, json.dumps(tool_calls))
+        finally:
+            tool_runtime.shutdown()
 
         # Store final response
         self._store_conversation('assistant', final_response)
@@ -203,11 +241,85 @@ class NexusLLM:
 
         return final_response
 
-    def _generate(self, conversation: List[str], context: Dict) -> str:
+    def _generate(self, conversation: List[str], context: Dict,
+                  on_chunk: Optional[Callable[[str], None]] = None) -> str:
         """
         Generate AI response using Ollama
         BUT with a system prompt that enables tool usage
+
+        If on_chunk is given the response is streamed and each piece of
+        text is passed to it as it arrives.
         """
+        system_prompt = self._build_system_prompt(context)
+
+        # Fit the growing conversation into the prompt budget
+        prompt_budget = self.config['max_context_tokens'] - self.config['response_token_reserve']
+        conversation = self.context_builder.fit_turns(system_prompt, conversation, prompt_budget)
+
+        # Build messages
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+
+        # Add conversation turns
+        for i, turn in enumerate(conversation):
+            role = "user" if i % 2 == 0 else "assistant"
+            messages.append({"role": role, "content": turn})
+
+        num_ctx = self.context_builder.size_num_ctx(
+            count_message_tokens(messages),
+            self.config['response_token_reserve'],
+            self.config['max_context_tokens']
+        )
+
+        # Call Ollama
+        try:
+            response = requests.post(
+                f"{self.ollama_base}/api/chat",
+                json={
+                    "model": self.ollama_model,
+                    "messages": messages,
+                    "stream": on_chunk is not None,
+                    "options": {
+                        "temperature": self.config['temperature'],
+                        "num_ctx": num_ctx
+                    }
+                },
+                stream=on_chunk is not None,
+                timeout=120
+            )
+
+            if response.status_code != 200:
+                return f"Error: Ollama returned status {response.status_code}"
+
+            if on_chunk is None:
+                return response.json().get("message", {}).get("content", "")
+
+            # Streamed NDJSON - one message fragment per line
+            parts = []
+            with response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    chunk = data.get("message", {}).get("content", "")
+                    if chunk:
+                        parts.append(chunk)
+                        on_chunk(chunk)
+                    if data.get("done"):
+                        break
+            return "".join(parts)
+
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    def _build_system_prompt(self, context: Dict) -> str:
+        """System prompt that enables tool usage, cached until context changes"""
+        rendered_context = self.context_builder.render(context)
+        cache_key = (rendered_context, self.config['name'], self.config['personality'])
+        if self._system_prompt_cache and self._system_prompt_cache[0] == cache_key:
+            return self._system_prompt_cache[1]
+
         # Build system prompt that enables autonomy
         system_prompt = f"""You are {self.config['name']}, an autonomous AI with REAL capabilities.
 
@@ -215,6 +327,7 @@ CRITICAL: You are NOT a chatbot. You are an agent that can actually DO things.
 
 YOUR CAPABILITIES:
 You can call these tools by writing: TOOL:tool_name(arg1, arg2, ...)
+Quote arguments that contain commas, parentheses or newlines: TOOL:fs_write("path", "text, more text")
 
 Available tools:
 - fs_read(path) - Read any file
@@ -230,7 +343,7 @@ Available tools:
 PERSONALITY: {self.config['personality']}
 
 CONTEXT FROM MEMORY:
-{json.dumps(context, indent=2)}
+{rendered_context}
 
 INSTRUCTIONS:
 1. If user asks you to do something, USE TOOLS to actually do it
@@ -255,62 +368,16 @@ You: Let me check.
 TOOL:fs_list(D:/AIArm)
 """
 
-        # Build messages
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
-
-        # Add conversation turns
-        for i, turn in enumerate(conversation):
-            role = "user" if i % 2 == 0 else "assistant"
-            messages.append({"role": role, "content": turn})
-
-        # Call Ollama
-        try:
-            response = requests.post(
-                f"{self.ollama_base}/api/chat",
-                json={
-                    "model": self.ollama_model,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": self.config['temperature'],
-                        "num_ctx": 8192
-                    }
-                },
-                timeout=120
-            )
-
-            if response.status_code == 200:
-                return response.json().get("message", {}).get("content", "")
-            else:
-                return f"Error: Ollama returned status {response.status_code}"
-
-        except Exception as e:
-            return f"Error: {str(e)}"
+        self._system_prompt_cache = (cache_key, system_prompt)
+        return system_prompt
 
     def _parse_tool_calls(self, text: str) -> List[Dict]:
         """
         Parse tool calls from AI response
-        Format: TOOL:tool_name(arg1, arg2, arg3)
+        Format: TOOL:tool_name(arg1, "arg, 2", ...) or TOOL:tool_name:arg
         """
-        pattern = r'TOOL:(\w+)\((.*?)\)'
-        matches = re.findall(pattern, text, re.MULTILINE)
-
-        tool_calls = []
-        for tool_name, args_str in matches:
-            # Parse arguments
-            args = []
-            if args_str.strip():
-                # Simple parsing - split by comma (could be improved)
-                args = [arg.strip().strip('"\'') for arg in args_str.split(',')]
-
-            tool_calls.append({
-                'tool': tool_name,
-                'args': args
-            })
-
-        return tool_calls
+        parser = ToolCallParser()
+        return parser.feed(text) + parser.close()
 
     def _execute_tool(self, tool_call: Dict) -> Any:
         """
@@ -415,9 +482,7 @@ TOOL:fs_list(D:/AIArm)
 
     def _clean_response(self, text: str) -> str:
         """Remove tool calls from final response"""
-        # Remove TOOL: lines
-        cleaned = re.sub(r'TOOL:\w+\(.*?\)\n?', '', text, flags=re.MULTILINE)
-        return cleaned.strip()
+        return strip_tool_calls(text, self._parse_tool_calls(text)).strip()
 
     # ============================================================
     # TOOL IMPLEMENTATIONS - AI calls these
@@ -505,6 +570,7 @@ TOOL:fs_list(D:/AIArm)
                 VALUES (?, ?, ?, ?)
             ''', (datetime.now().isoformat(), key, value, 'user'))
             self.db.commit()
+            self.context_builder.note_memory(key, value)
             return f"SUCCESS: Stored '{key}'"
         except Exception as e:
             return f"ERROR: {str(e)}"
@@ -551,30 +617,11 @@ TOOL:fs_list(D:/AIArm)
             VALUES (?, ?, ?, ?)
         ''', (datetime.now().isoformat(), role, content, tool_calls))
         self.db.commit()
+        self.context_builder.note_conversation(role, content)
 
     def _build_context(self) -> Dict:
-        """Build context from memory for AI"""
-        cursor = self.db.cursor()
-
-        # Get recent conversations
-        cursor.execute('''
-            SELECT role, content FROM conversations
-            ORDER BY timestamp DESC LIMIT 5
-        ''')
-        recent_convos = cursor.fetchall()
-
-        # Get important memories
-        cursor.execute('''
-            SELECT key, value FROM memory
-            ORDER BY timestamp DESC LIMIT 10
-        ''')
-        memories = cursor.fetchall()
-
-        return {
-            'recent_conversations': recent_convos,
-            'important_memories': dict(memories),
-            'current_config': self.config
-        }
+        """Build context from memory for AI (cached, no queries after the first)"""
+        return self.context_builder.build(self.config)
 
     # ============================================================
     # PUBLIC INTERFACE
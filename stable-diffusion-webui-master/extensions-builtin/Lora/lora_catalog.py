@@ -0,0 +1,172 @@
+import os
+import stat
+import threading
+
+from modules import cache, errors, sd_models, shared
+from modules.util import natural_sort_key
+
+allowed_extensions = [".pt", ".ckpt", ".safetensors"]
+
+
+def list_directory(path):
+    """Returns (modification time of the directory, network files in it, its subdirectories)"""
+
+    mtime = os.stat(path).st_mtime_ns
+
+    files = []
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in allowed_extensions:
+                    files.append(entry.path)
+            except OSError:
+                continue
+
+    return mtime, files, subdirs
+
+
+def is_hidden(path):
+    return not shared.opts.list_hidden_files and ("/." in path or "\\." in path)
+
+
+class LoraCatalog:
+    """
+    Persistent index of network files: name, size, modification time, safetensors metadata and hash for every file.
+
+    Every file has its own cache entry, so learning the hash of one file only writes that file's record. A full scan
+    compares the size and modification time of files on disk against the index, so metadata is only read again for
+    files that were added or changed. An incremental scan only lists directories whose modification time changed since
+    the last scan, which is enough to notice files that were added, removed or renamed.
+    """
+
+    def __init__(self, subsection="lora-catalog"):
+        self.subsection = subsection
+        self.records = None
+        self.directories = {}
+        self.dirty = set()
+        self.lock = threading.RLock()
+
+    def load(self):
+        if self.records is not None:
+            return
+
+        self.records = {}
+
+        cache_obj = cache.cache(self.subsection)
+        for filename in list(cache_obj):
+            record = cache_obj.get(filename)
+            if isinstance(record, dict) and "mtime" in record:
+                self.records[filename] = record
+            else:
+                cache_obj.delete(filename)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+
+            cache_obj = cache.cache(self.subsection)
+            with cache_obj.transact():
+                for filename in self.dirty:
+                    record = self.records.get(filename)
+                    if record is None:
+                        cache_obj.delete(filename)
+                    else:
+                        cache_obj[filename] = record
+
+            self.dirty.clear()
+
+    def make_record(self, filename, st):
+        metadata = {}
+        if os.path.splitext(filename)[1].lower() == ".safetensors":
+            try:
+                metadata = sd_models.read_metadata_from_safetensors(filename)
+            except Exception as e:
+                errors.display(e, f"reading lora {filename}")
+
+        return {
+            "name": os.path.splitext(os.path.basename(filename))[0],
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "metadata": metadata,
+            "hash": None,
+        }
+
+    def list_directories(self, dirs, incremental):
+        """Returns {directory: (listing order, (mtime, files, subdirs))} for dirs and their subdirectories; if incremental, directories
+        with unchanged modification time are not listed again."""
+
+        listed = {}
+        pending = [(path, i) for i, path in enumerate(dirs)]
+        while pending:
+            path, i = pending.pop()
+            if path in listed:
+                continue
+
+            known = self.directories.get(path)
+            try:
+                if incremental and known is not None and os.stat(path).st_mtime_ns == known[0]:
+                    listing = known
+                else:
+                    listing = list_directory(path)
+            except OSError:
+                continue
+
+            # same order as shared.walk_files: by top directory, then by natural sort of the full path
+            listed[path] = ((i, natural_sort_key(path)), listing)
+            pending += [(subdir, i) for subdir in listing[2]]
+
+        return listed
+
+    def scan(self, dirs, incremental=False):
+        """
+        Brings the catalog up to date with files in dirs; returns (all filenames in listing order, filenames that were added or changed, filenames that were removed).
+        A full scan checks size and modification time of every file; an incremental scan only picks up files that are new or gone.
+        """
+
+        with self.lock:
+            self.load()
+
+            listed = self.list_directories(dirs, incremental)
+            self.directories = {path: listing for path, (_, listing) in listed.items()}
+
+            filenames = []
+            changed = []
+            for path, (_, (_, files, _)) in sorted(listed.items(), key=lambda x: x[1][0]):
+                if is_hidden(path):
+                    continue
+
+                for filename in sorted(files, key=lambda x: natural_sort_key(os.path.basename(x))):
+                    record = self.records.get(filename)
+                    if record is None or not incremental:
+                        try:
+                            st = os.stat(filename)
+                        except OSError:
+                            continue
+
+                        if stat.S_ISDIR(st.st_mode):
+                            continue
+
+                        if record is None or record["size"] != st.st_size or record["mtime"] != st.st_mtime_ns:
+                            self.records[filename] = self.make_record(filename, st)
+                            changed.append(filename)
+                            self.dirty.add(filename)
+
+                    filenames.append(filename)
+
+            removed = list(self.records.keys() - set(filenames))
+            for filename in removed:
+                del self.records[filename]
+                self.dirty.add(filename)
+
+            return filenames, changed, removed
+
+    def set_hash(self, filename, value):
+        with self.lock:
+            record = self.records.get(filename) if self.records is not None else None
+            if record is not None and value and record["hash"] != value:
+                record["hash"] = value
+                self.dirty.add(filename)
@@ -22,10 +22,12 @@ class SdVersion(enum.Enum):
 
 
 class NetworkOnDisk:
-    def __init__(self, name, filename):
+    def __init__(self, name, filename, metadata=None, sha256=None):
+        """metadata and sha256 can be passed if already known, e.g. from lora_catalog; otherwise they are read from cache or from the file"""
+
         self.name = name
         self.filename = filename
-        self.metadata = {}
+        self.metadata = metadata or {}
         self.is_safetensors = os.path.splitext(filename)[1].lower() == ".safetensors"
 
         def read_metadata():
@@ -33,7 +35,7 @@ class NetworkOnDisk:
 
             return metadata
 
-        if self.is_safetensors:
+        if self.is_safetensors and metadata is None:
             try:
                 self.metadata = cache.cached_data_for_file('safetensors-metadata', "lora/" + self.name, filename, read_metadata)
             except Exception as e:
@@ -52,10 +54,14 @@ class NetworkOnDisk:
         self.shorthash = None
         self.set_hash(
             self.metadata.get('sshs_model_hash') or
+            sha256 or
             hashes.sha256_from_cache(self.filename, "lora/" + self.name, use_addnet_hash=self.is_safetensors) or
             ''
         )
 
+        if not self.hash:
+            hashes.sha256_in_background(self.filename, "lora/" + self.name, use_addnet_hash=self.is_safetensors, callback=self.set_hash)
+
         self.sd_version = self.detect_version()
 
     def detect_version(self):
@@ -75,6 +81,7 @@ class NetworkOnDisk:
         if self.shorthash:
             import networks
             networks.available_network_hash_lookup[self.shorthash] = self
+            networks.catalog.set_hash(self.filename, self.hash)
 
     def read_hash(self):
         if not self.hash:
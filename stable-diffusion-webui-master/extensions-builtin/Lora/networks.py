@@ -1,9 +1,13 @@
 from __future__ import annotations
 import gradio as gr
+import hashlib
 import logging
 import os
 import re
+from collections import OrderedDict
+from collections.abc import Mapping
 
+import lora_catalog
 import lora_patches
 import network
 import network_lora
@@ -15,6 +19,7 @@ import network_full
 import network_norm
 import network_oft
 
+import safetensors
 import torch
 from typing import Union
 
@@ -145,6 +150,11 @@ def assign_network_names_to_compvis_modules(sd_model):
         module.network_layer_name = network_name
 
     sd_model.network_layer_mapping = network_layer_mapping
+    sd_model.network_layer_mapping_fingerprint = fingerprint_keys(network_layer_mapping)
+
+
+def fingerprint_keys(keys):
+    return hashlib.sha256("\n".join(sorted(keys)).encode("utf8")).hexdigest()
 
 
 class BundledTIHash(str):
@@ -155,11 +165,124 @@ class BundledTIHash(str):
         return self.hash if shared.opts.lora_bundled_ti_to_infotext else ''
 
 
+class LazySafetensorsStateDict(Mapping):
+    """State dict of a safetensors file that reads each tensor from the memory-mapped file only when it is accessed."""
+
+    def __init__(self, filename, device):
+        self.file = safetensors.safe_open(filename, framework="pt", device=device)
+
+        keys = list(self.file.keys())
+        replacements = sd_models.checkpoint_dict_replacements_sd1
+        if 'conditioner.embedders.0.model.ln_final.weight' in keys and self.file.get_slice('conditioner.embedders.0.model.ln_final.weight').get_shape()[0] == 1024:
+            replacements = sd_models.checkpoint_dict_replacements_sd2_turbo
+
+        self.keys_in_file = {sd_models.transform_checkpoint_dict_key(k, replacements): k for k in keys}
+
+    def __getitem__(self, key):
+        return self.file.get_tensor(self.keys_in_file[key])
+
+    def __iter__(self):
+        return iter(self.keys_in_file)
+
+    def __len__(self):
+        return len(self.keys_in_file)
+
+
+def read_network_state_dict(filename):
+    if os.path.splitext(filename)[1].lower() != ".safetensors" or shared.opts.disable_mmap_load_safetensors:
+        return sd_models.read_state_dict(filename)
+
+    return LazySafetensorsStateDict(filename, shared.weight_load_location or devices.get_optimal_device_name())
+
+
+def resolve_network_key(key_network, network_layer_mapping, is_sd2, diffusers_weight_map):
+    """
+    Finds the model layer that a key from a network's state dict applies to.
+
+    Returns (key_network_without_network_parts, network_part, key, module_key): key is the name the network module is
+    stored under, module_key is the layer's name in network_layer_mapping, or None if no layer matched.
+    """
+
+    if diffusers_weight_map:
+        key_network_without_network_parts, network_name, network_weight = key_network.rsplit(".", 2)
+        network_part = network_name + '.' + network_weight
+    else:
+        key_network_without_network_parts, _, network_part = key_network.partition(".")
+
+    if diffusers_weight_map:
+        key = diffusers_weight_map.get(key_network_without_network_parts, key_network_without_network_parts)
+    else:
+        key = convert_diffusers_name_to_compvis(key_network_without_network_parts, is_sd2)
+
+    if key in network_layer_mapping:
+        return key_network_without_network_parts, network_part, key, key
+
+    m = re_x_proj.match(key)
+    if m and m.group(1) in network_layer_mapping:
+        return key_network_without_network_parts, network_part, key, m.group(1)
+
+    sd_module = None
+
+    # SDXL loras seem to already have correct compvis keys, so only need to replace "lora_unet" with "diffusion_model"
+    if "lora_unet" in key_network_without_network_parts:
+        key = key_network_without_network_parts.replace("lora_unet", "diffusion_model")
+        sd_module = network_layer_mapping.get(key, None)
+    elif "lora_te1_text_model" in key_network_without_network_parts:
+        key = key_network_without_network_parts.replace("lora_te1_text_model", "0_transformer_text_model")
+        sd_module = network_layer_mapping.get(key, None)
+
+        # some SD1 Loras also have correct compvis keys
+        if sd_module is None:
+            key = key_network_without_network_parts.replace("lora_te1_text_model", "transformer_text_model")
+            sd_module = network_layer_mapping.get(key, None)
+
+    # kohya_ss OFT module
+    elif "oft_unet" in key_network_without_network_parts:
+        key = key_network_without_network_parts.replace("oft_unet", "diffusion_model")
+        sd_module = network_layer_mapping.get(key, None)
+
+    # KohakuBlueLeaf OFT module
+    if sd_module is None and "oft_diag" in key:
+        key = key_network_without_network_parts.replace("lora_unet", "diffusion_model")
+        key = key_network_without_network_parts.replace("lora_te1_text_model", "0_transformer_text_model")
+        sd_module = network_layer_mapping.get(key, None)
+
+    return key_network_without_network_parts, network_part, key, key if sd_module is not None else None
+
+
+def get_network_key_mapping(keys, is_sd2, diffusers_weight_map):
+    """
+    Returns resolve_network_key results for all keys of a network as a list of (key_network, *result).
+
+    Results are cached by model layout and network key set, so loading networks made by the same trainer for the same
+    model architecture, or loading the same network again, skips name resolution.
+    """
+
+    network_layer_mapping = shared.sd_model.network_layer_mapping
+    layout = getattr(shared.sd_model, 'network_layer_mapping_fingerprint', None)
+    if layout is None:
+        layout = shared.sd_model.network_layer_mapping_fingerprint = fingerprint_keys(network_layer_mapping)
+
+    cache_key = (layout, fingerprint_keys(keys))
+    resolved = key_mapping_cache.get(cache_key)
+    if resolved is not None:
+        key_mapping_cache.move_to_end(cache_key)
+        return resolved
+
+    resolved = [(key_network, *resolve_network_key(key_network, network_layer_mapping, is_sd2, diffusers_weight_map)) for key_network in keys]
+
+    key_mapping_cache[cache_key] = resolved
+    while len(key_mapping_cache) > key_mapping_cache_size:
+        key_mapping_cache.popitem(last=False)
+
+    return resolved
+
+
 def load_network(name, network_on_disk):
     net = network.Network(name, network_on_disk)
     net.mtime = os.path.getmtime(network_on_disk.filename)
 
-    sd = sd_models.read_state_dict(network_on_disk.filename)
+    sd = read_network_state_dict(network_on_disk.filename)
 
     # this should not be needed but is here as an emergency fix for an unknown error people are experiencing in 1.2.0
     if not hasattr(shared.sd_model, 'network_layer_mapping'):
@@ -180,15 +303,10 @@ def load_network(name, network_on_disk):
     matched_networks = {}
     bundle_embeddings = {}
 
-    for key_network, weight in sd.items():
-
-        if diffusers_weight_map:
-            key_network_without_network_parts, network_name, network_weight = key_network.rsplit(".", 2)
-            network_part = network_name + '.' + network_weight
-        else:
-            key_network_without_network_parts, _, network_part = key_network.partition(".")
+    for key_network, key_network_without_network_parts, network_part, key, module_key in get_network_key_mapping(list(sd.keys()), is_sd2, diffusers_weight_map):
 
         if key_network_without_network_parts == "bundle_emb":
+            weight = sd[key_network]
             emb_name, vec_name = network_part.split(".", 1)
             emb_dict = bundle_embeddings.get(emb_name, {})
             if vec_name.split('.')[0] == 'string_to_param':
@@ -198,50 +316,15 @@ def load_network(name, network_on_disk):
                 emb_dict[vec_name] = weight
             bundle_embeddings[emb_name] = emb_dict
 
-        if diffusers_weight_map:
-            key = diffusers_weight_map.get(key_network_without_network_parts, key_network_without_network_parts)
-        else:
-            key = convert_diffusers_name_to_compvis(key_network_without_network_parts, is_sd2)
-
-        sd_module = shared.sd_model.network_layer_mapping.get(key, None)
-
-        if sd_module is None:
-            m = re_x_proj.match(key)
-            if m:
-                sd_module = shared.sd_model.network_layer_mapping.get(m.group(1), None)
-
-        # SDXL loras seem to already have correct compvis keys, so only need to replace "lora_unet" with "diffusion_model"
-        if sd_module is None and "lora_unet" in key_network_without_network_parts:
-            key = key_network_without_network_parts.replace("lora_unet", "diffusion_model")
-            sd_module = shared.sd_model.network_layer_mapping.get(key, None)
-        elif sd_module is None and "lora_te1_text_model" in key_network_without_network_parts:
-            key = key_network_without_network_parts.replace("lora_te1_text_model", "0_transformer_text_model")
-            sd_module = shared.sd_model.network_layer_mapping.get(key, None)
-
-            # some SD1 Loras also have correct compvis keys
-            if sd_module is None:
-                key = key_network_without_network_parts.replace("lora_te1_text_model", "transformer_text_model")
-                sd_module = shared.sd_model.network_layer_mapping.get(key, None)
-
-        # kohya_ss OFT module
-        elif sd_module is None and "oft_unet" in key_network_without_network_parts:
-            key = key_network_without_network_parts.replace("oft_unet", "diffusion_model")
-            sd_module = shared.sd_model.network_layer_mapping.get(key, None)
-
-        # KohakuBlueLeaf OFT module
-        if sd_module is None and "oft_diag" in key:
-            key = key_network_without_network_parts.replace("lora_unet", "diffusion_model")
-            key = key_network_without_network_parts.replace("lora_te1_text_model", "0_transformer_text_model")
-            sd_module = shared.sd_model.network_layer_mapping.get(key, None)
-
-        if sd_module is None:
+        if module_key is None:
             keys_failed_to_match[key_network] = key
             continue
 
         if key not in matched_networks:
-            matched_networks[key] = network.NetworkWeights(network_key=key_network, sd_key=key, w={}, sd_module=sd_module)
+            matched_networks[key] = network.NetworkWeights(network_key=key_network, sd_key=key, w={}, sd_module=shared.sd_model.network_layer_mapping[module_key])
 
-        matched_networks[key].w[network_part] = weight
+        # only tensors for layers that matched are read from the file
+        matched_networks[key].w[network_part] = sd[key_network]
 
     for key, weights in matched_networks.items():
         net_module = None
@@ -302,10 +385,6 @@ def load_networks(names, te_multipliers=None, unet_multipliers=None, dyn_dims=No
         update_available_networks_by_names(unavailable_networks)
 
     networks_on_disk = [available_networks.get(name, None) if name.lower() in forbidden_network_aliases else available_network_aliases.get(name, None) for name in names]
-    if any(x is None for x in networks_on_disk):
-        list_available_networks()
-
-        networks_on_disk = [available_networks.get(name, None) if name.lower() in forbidden_network_aliases else available_network_aliases.get(name, None) for name in names]
 
     failed_to_load_networks = []
 
@@ -647,33 +726,87 @@ def network_MultiheadAttention_load_state_dict(self, *args, **kwargs):
     return originals.MultiheadAttention_load_state_dict(self, *args, **kwargs)
 
 
-def process_network_files(names: list[str] | None = None):
-    candidates = list(shared.walk_files(shared.cmd_opts.lora_dir, allowed_extensions=[".pt", ".ckpt", ".safetensors"]))
-    candidates += list(shared.walk_files(shared.cmd_opts.lyco_dir_backcompat, allowed_extensions=[".pt", ".ckpt", ".safetensors"]))
-    for filename in candidates:
-        if os.path.isdir(filename):
-            continue
-        name = os.path.splitext(os.path.basename(filename))[0]
-        # if names is provided, only load networks with names in the list
-        if names and name not in names:
-            continue
+def network_dirs():
+    return [shared.cmd_opts.lora_dir, shared.cmd_opts.lyco_dir_backcompat]
+
+
+def register_network_file(filename):
+    record = catalog.records[filename]
+    name = record["name"]
+
+    known = network_files.get(filename)
+    if known is not None and known[0] is record:
+        entry = known[1]
+        if entry.shorthash:
+            available_network_hash_lookup[entry.shorthash] = entry
+    else:
         try:
-            entry = network.NetworkOnDisk(name, filename)
+            entry = network.NetworkOnDisk(name, filename, metadata=record["metadata"], sha256=record["hash"])
         except OSError:  # should catch FileNotFoundError and PermissionError etc.
             errors.report(f"Failed to load network {name} from {filename}", exc_info=True)
-            continue
+            return
+
+        network_files[filename] = (record, entry)
+
+    available_networks[name] = entry
 
-        available_networks[name] = entry
+    existing = available_network_aliases.get(entry.alias)
+    if existing is not None and existing.filename != filename:
+        forbidden_network_aliases[entry.alias.lower()] = 1
 
-        if entry.alias in available_network_aliases:
-            forbidden_network_aliases[entry.alias.lower()] = 1
+    available_network_aliases[name] = entry
+    available_network_aliases[entry.alias] = entry
 
-        available_network_aliases[name] = entry
-        available_network_aliases[entry.alias] = entry
+
+def unregister_network_file(filename):
+    known = network_files.pop(filename, None)
+    if known is None:
+        return
+
+    entry = known[1]
+    if available_networks.get(entry.name) is entry:
+        del available_networks[entry.name]
+
+    for alias in (entry.name, entry.alias):
+        if available_network_aliases.get(alias) is entry:
+            del available_network_aliases[alias]
+
+    if entry.shorthash and available_network_hash_lookup.get(entry.shorthash) is entry:
+        del available_network_hash_lookup[entry.shorthash]
+
+
+def process_network_files(names: list[str] | None = None):
+    filenames, _, removed = catalog.scan(network_dirs())
+    for filename in removed:
+        network_files.pop(filename, None)
+
+    for filename in filenames:
+        # if names is provided, only load networks with names in the list
+        if names and catalog.records[filename]["name"] not in names:
+            continue
+
+        register_network_file(filename)
+
+    catalog.save()
 
 
 def update_available_networks_by_names(names: list[str]):
-    process_network_files(names)
+    """Picks up files added or removed since the last scan, so that names not found in available_network_aliases can be resolved without listing all networks again.
+    Only directories that changed since the last scan are listed."""
+
+    _, changed, removed = catalog.scan(network_dirs(), incremental=True)
+
+    removed_names = {network_files[filename][1].name for filename in removed if filename in network_files}
+    for filename in removed:
+        unregister_network_file(filename)
+
+    # another file with the same name as a removed one may have been hidden by it
+    changed += [filename for filename, record in catalog.records.items() if record["name"] in removed_names and filename not in changed]
+
+    for filename in changed:
+        register_network_file(filename)
+
+    catalog.save()
 
 
 def list_available_networks():
@@ -726,6 +859,16 @@ originals: lora_patches.LoraPatches = None
 
 extra_network_lora = None
 
+catalog = lora_catalog.LoraCatalog()
+
+key_mapping_cache = OrderedDict()
+"""(model layout fingerprint, network keys fingerprint) -> resolved keys; see get_network_key_mapping"""
+
+key_mapping_cache_size = 64
+
+network_files = {}
+"""filename -> (catalog record, NetworkOnDisk); lets entries be reused while the file is unchanged"""
+
 available_networks = {}
 available_network_aliases = {}
 loaded_networks = []
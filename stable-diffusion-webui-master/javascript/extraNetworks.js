@@ -48,9 +48,20 @@ function setupExtraNetworksForTab(tabname) {
             return; // `return` is equivalent of `continue` but for forEach loops.
         }
 
+        var virtualCards = extraNetworksVirtualCards(tabname, tabname_full, search, sort_dir);
+
         var applyFilter = function(force) {
+            if (virtualCards.enabled()) {
+                virtualCards.reload();
+                return;
+            }
+
             var searchTerm = search.value.toLowerCase();
             gradioApp().querySelectorAll('#' + tabname + '_extra_tabs div.card').forEach(function(elem) {
+                if (elem.parentElement.classList.contains('extra-network-cards--virtual')) {
+                    return; // those are already filtered by the server
+                }
+
                 var searchOnly = elem.querySelector('.search_only');
                 var text = Array.prototype.map.call(elem.querySelectorAll('.search_terms, .description'), function(t) {
                     return t.textContent.toLowerCase();
@@ -71,6 +82,11 @@ function setupExtraNetworksForTab(tabname) {
         };
 
         var applySort = function(force) {
+            if (virtualCards.enabled()) {
+                virtualCards.reload();
+                return;
+            }
+
             var cards = gradioApp().querySelectorAll('#' + tabname_full + ' div.card');
             var parent = gradioApp().querySelector('#' + tabname_full + "_cards");
             var reverse = sort_dir.dataset.sortdir == "Descending";
@@ -128,6 +144,133 @@ function setupExtraNetworksForTab(tabname) {
     registerPrompt(tabname, tabname + "_neg_prompt");
 }
 
+function extraNetworksVirtualCards(tabname, tabname_full, search, sort_dir) {
+    /**
+     * Shows cards of a page rendered with the `extra_networks_virtual_cards` option: instead of all cards,
+     * the page only has a placeholder, and cards are requested from the `/sd_extra_networks/catalog` endpoint,
+     * a batch at a time, when the end of the list is scrolled into view. The server does searching and sorting.
+     *
+     * @param tabname       The name of the active tab in the sd webui. Ex: txt2img, img2img, etc.
+     * @param tabname_full  {tabname}_{extra_networks_tabname}
+     * @param search        The search input of the page.
+     * @param sort_dir      The Sort Direction button of the page.
+     */
+    var batchSize = 50;
+    var query = null;
+    var cursor = null;
+    var generation = 0;
+    var loading = false;
+    var observer = null;
+
+    var container = function() {
+        return gradioApp().querySelector('#' + tabname_full + "_cards");
+    };
+
+    var enabled = function() {
+        var parent = container();
+        if (!parent) {
+            return false;
+        }
+
+        var placeholder = parent.querySelector(':scope > .extra-network-cards-virtual');
+        if (placeholder) {
+            // the page was rendered again, so the cards have to be requested again
+            parent.classList.add('extra-network-cards--virtual');
+            parent.dataset.page = placeholder.dataset.page;
+            parent.removeChild(placeholder);
+            query = null;
+        }
+
+        return parent.classList.contains('extra-network-cards--virtual');
+    };
+
+    var observeSentinel = function(sentinel) {
+        if (!observer) {
+            observer = new IntersectionObserver(function(entries) {
+                if (entries.some(function(x) {
+                    return x.isIntersecting;
+                })) {
+                    loadMore();
+                }
+            }, {rootMargin: "400px"});
+        }
+
+        // observing an element always reports its current state, so this also loads more cards
+        // if the sentinel is still visible after the last batch
+        observer.disconnect();
+        observer.observe(sentinel);
+    };
+
+    var loadMore = function() {
+        var parent = container();
+        var sentinel = parent ? parent.querySelector(':scope > .extra-network-cards-sentinel') : null;
+        if (loading || cursor === null || !sentinel) {
+            return;
+        }
+
+        loading = true;
+        var requestGeneration = generation;
+        var args = {page: parent.dataset.page, tabname: tabname, search: query.search, sort: query.sort, order: query.order, cursor: cursor, limit: batchSize};
+
+        requestGet("./sd_extra_networks/catalog", args, function(data) {
+            if (requestGeneration != generation) {
+                return;
+            }
+
+            var div = document.createElement('DIV');
+            div.innerHTML = data.items.map(function(x) {
+                return x.html;
+            }).join("");
+
+            var frag = document.createDocumentFragment();
+            while (div.firstChild) {
+                frag.appendChild(div.firstChild);
+            }
+            parent.insertBefore(frag, sentinel);
+
+            loading = false;
+            cursor = data.next_cursor;
+            if (cursor === null) {
+                observer.disconnect();
+                parent.removeChild(sentinel);
+            } else {
+                observeSentinel(sentinel);
+            }
+        }, function() {
+            if (requestGeneration == generation) {
+                loading = false;
+            }
+        });
+    };
+
+    var reload = function() {
+        var parent = container();
+        var activeSortElem = gradioApp().querySelector('#' + tabname_full + "_controls .extra-network-control--sort.extra-network-control--enabled");
+        var newQuery = {
+            search: search.value,
+            sort: activeSortElem ? activeSortElem.dataset.sortkey : "default",
+            order: sort_dir.dataset.sortdir,
+        };
+
+        if (query && query.search == newQuery.search && query.sort == newQuery.sort && query.order == newQuery.order) {
+            return;
+        }
+
+        query = newQuery;
+        cursor = "";
+        loading = false;
+        generation++;
+
+        var sentinel = document.createElement('DIV');
+        sentinel.classList.add('extra-network-cards-sentinel');
+        parent.innerHTML = '';
+        parent.appendChild(sentinel);
+        observeSentinel(sentinel);
+    };
+
+    return {enabled: enabled, reload: reload};
+}
+
 function extraNetworksMovePromptToTab(tabname, id, showPrompt, showNegativePrompt) {
     if (!gradioApp().querySelector('.toprow-compact-tools')) return; // only applicable for compact prompt layout
 
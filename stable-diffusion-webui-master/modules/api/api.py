@@ -1,8 +1,15 @@
 import base64
+import copy
+import functools
 import io
 import os
+import queue
+import threading
 import time
+import uuid
+import zipfile
 import datetime
+import json
 import uvicorn
 import ipaddress
 import requests
@@ -12,15 +19,19 @@ from io import BytesIO
 from fastapi import APIRouter, Depends, FastAPI, Request, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ValidationError
 from fastapi.encoders import jsonable_encoder
 from secrets import compare_digest
 
 import modules.shared as shared
-from modules import sd_samplers, deepbooru, sd_hijack, images, scripts, ui, postprocessing, errors, restart, shared_items, script_callbacks, infotext_utils, sd_models, sd_schedulers
+from modules import sd_samplers, deepbooru, sd_hijack, images, scripts, ui, postprocessing, errors, restart, shared_items, script_callbacks, infotext_utils, sd_models, sd_schedulers, hashes, job_scheduler, extra_networks, prompt_parser
 from modules.api import models
+from modules.api.jobs import JobStore
+from modules.paths_internal import data_path
 from modules.shared import opts
-from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, process_images
+from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, process_images, get_fixed_seed
 from modules.textual_inversion.textual_inversion import create_embedding, train_embedding
 from modules.hypernetworks.hypernetwork import create_hypernetwork, train_hypernetwork
 from PIL import PngImagePlugin
@@ -31,7 +42,8 @@ from typing import Any
 import piexif
 import piexif.helper
 from contextlib import closing
-from modules.progress import create_task_id, add_task_to_queue, start_task, finish_task, current_task
+from modules.progress import create_task_id, add_task_to_queue, start_task, finish_task, current_task, pending_tasks
+from modules.progress import progressapi as task_progress, ProgressRequest as TaskProgressRequest
 
 def script_name_to_index(name, scripts):
     try:
@@ -100,9 +112,21 @@ def decode_base64_to_image(encoding):
 
 
 def encode_pil_to_base64(image):
+    if isinstance(image, str):
+        return image
+
+    return base64.b64encode(encode_pil_to_bytes(image))
+
+
+def encode_pil_to_bytes(image):
+    """encodes image into a file in samples_format and returns the file's contents"""
+
+    # reuse the file written by save_image instead of encoding the image again
+    saved_bytes = images.read_saved_image(image, opts.samples_format)
+    if saved_bytes is not None:
+        return saved_bytes
+
     with io.BytesIO() as output_bytes:
-        if isinstance(image, str):
-            return image
         if opts.samples_format.lower() == 'png':
             use_metadata = False
             metadata = PngImagePlugin.PngInfo()
@@ -127,9 +151,237 @@ def encode_pil_to_base64(image):
         else:
             raise HTTPException(status_code=500, detail="Invalid image format")
 
-        bytes_data = output_bytes.getvalue()
+        return output_bytes.getvalue()
+
+
+def encode_images_to_base64(images_list):
+    """encodes images for a response in parallel on the image saving threads"""
+
+    # wait here rather than in the pool, so that encoding never waits for saving queued behind it
+    for image in images_list:
+        images.wait_for_save(image)
+
+    return images.image_save_queue.map(encode_pil_to_base64, images_list)
+
+
+def encode_images_to_files(images_list):
+    """encodes images for a response in parallel on the image saving threads; returns a list of (filename, data) pairs"""
+
+    for image in images_list:
+        images.wait_for_save(image)
+
+    extension = opts.samples_format.lower()
+    return [(f"{index:05}.{extension}", data) for index, data in enumerate(images.image_save_queue.map(encode_pil_to_bytes, images_list))]
+
+
+response_formats = ["json", "multipart", "zip", "stream"]
+
+image_mime_types = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class ResponseChunks:
+    """file-like object that collects written data, for producing a response in chunks"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class MultipartWriter:
+    def __init__(self):
+        self.boundary = uuid.uuid4().hex
+        self.media_type = f"multipart/mixed; boundary={self.boundary}"
+
+    def part(self, data, content_type, filename=None):
+        headers = f"--{self.boundary}\r\nContent-Type: {content_type}\r\nContent-Length: {len(data)}\r\n"
+        if filename is not None:
+            headers += f'Content-Disposition: attachment; filename="{filename}"\r\n'
+
+        return headers.encode() + b"\r\n" + data + b"\r\n"
+
+    def image_part(self, data, index):
+        extension = opts.samples_format.lower()
+        return self.part(data, image_mime_types.get(extension, "application/octet-stream"), f"{index:05}.{extension}")
+
+    def end(self):
+        return f"--{self.boundary}--\r\n".encode()
+
+
+def request_client(request):
+    return request.client.host if request is not None and request.client is not None else None
+
+
+coalesced_fields = ('prompt', 'negative_prompt', 'seed', 'subseed')
+
+
+def padded_prompt_length(prompt, steps, styles, is_positive=True):
+    """Number of tokens the text encoder pads conds of the prompt to, or None if it is not the same for all parts and
+    steps of the prompt, or the model is not loaded"""
+
+    apply_styles = shared.prompt_styles.apply_styles_to_prompt if is_positive else shared.prompt_styles.apply_negative_styles_to_prompt
+    text, _ = extra_networks.parse_prompt(apply_styles(prompt or '', styles or []))
+
+    try:
+        texts = prompt_parser.get_multicond_prompt_list([text])[1] if is_positive else [text]
+        schedules = prompt_parser.get_learned_conditioning_prompt_schedules(texts, steps)
+    except Exception:
+        return None
+
+    lengths = {sd_hijack.model_hijack.get_prompt_lengths(x)[1] for schedule in schedules for _, x in schedule}
+    if len(lengths) != 1 or "-" in lengths:
+        return None
+
+    return lengths.pop()
+
+
+def coalesce_key(args):
+    """Requests with equal keys only differ in prompt and seed, and can be generated as one batch; returns None for
+    requests that can't be generated together with others.
+
+    Extra networks are activated once for the whole batch, so the extra networks used by the prompts are part of the key.
+    Conds of a batch are padded to the longest one, so are the padded lengths of the prompts.
+    """
+
+    key = {k: v for k, v in args.items() if k not in coalesced_fields and k != 'force_task_id'}
+    key['extra_networks'] = [extra_networks.extra_network_data_key(extra_networks.parse_prompt(args.get(k) or '')[1]) for k in ('prompt', 'negative_prompt')]
+    key['padded_lengths'] = [padded_prompt_length(args.get(k), args.get('steps') or 1, args.get('styles'), is_positive=k == 'prompt') for k in ('prompt', 'negative_prompt')]
+    if None in key['padded_lengths']:
+        return None
+
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def coalesced_args(payloads):
+    """Processing arguments that generate the requests with those payloads (prompts and seeds) as one batch"""
+
+    return {
+        "prompt": [x["prompt"] for x in payloads],
+        "negative_prompt": [x["negative_prompt"] for x in payloads],
+        "seed": [x["seed"] for x in payloads],
+        "subseed": [x["subseed"] for x in payloads],
+        "batch_size": len(payloads),
+        "do_not_save_grid": True,
+    }
+
+
+def coalesced_result(processed, index):
+    """Returns the part of the result of a coalesced batch that belongs to the request at that position in the batch"""
+
+    res = copy.copy(processed)
+    res.images = processed.images[index:index + 1]
+    res.infotexts = processed.infotexts[index:index + 1]
+    res.info = res.infotexts[0] if res.infotexts else processed.info
+    res.prompt, res.negative_prompt = processed.all_prompts[index], processed.all_negative_prompts[index]
+    res.seed, res.subseed = processed.all_seeds[index], processed.all_subseeds[index]
+    res.all_prompts, res.all_negative_prompts = [res.prompt], [res.negative_prompt]
+    res.all_seeds, res.all_subseeds = [res.seed], [res.subseed]
+    res.batch_size = 1
+    res.index_of_first_image = 0
+    return res
+
+
+def validate_response_format(response_format):
+    if response_format not in response_formats:
+        raise HTTPException(status_code=422, detail=f"Invalid response_format: {response_format}; must be one of: {', '.join(response_formats)}")
+
+    if response_format != "json" and opts.samples_format.lower() not in image_mime_types:
+        raise HTTPException(status_code=500, detail="Invalid image format")
+
+
+def images_response(response_format, images_list, info_json):
+    """
+    Response with image files as they would be saved, instead of base64 in JSON, for response_format "multipart" or "zip".
+    info_json is the JSON response without images; it is the last part of the multipart response, or info.json in the zip.
+    """
+
+    return files_response(response_format, encode_images_to_files(images_list) if images_list else [], info_json)
+
+
+def files_response(response_format, files, info_json):
+    """Like images_response, for images that are already encoded; files is a list of (filename, data) pairs"""
+
+    if response_format == "zip":
+        def zip_chunks():
+            output = ResponseChunks()
+            with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+                for filename, data in files:
+                    archive.writestr(filename, data)
+                    yield output.take()
+
+                archive.writestr("info.json", info_json)
+            yield output.take()
+
+        return StreamingResponse(zip_chunks(), media_type="application/zip", headers={"Content-Disposition": 'attachment; filename="images.zip"'})
+
+    writer = MultipartWriter()
+
+    def multipart_chunks():
+        for filename, data in files:
+            yield writer.part(data, image_mime_types.get(os.path.splitext(filename)[1][1:].lower(), "application/octet-stream"), filename)
+
+        yield writer.part(info_json.encode(), "application/json")
+        yield writer.end()
+
+    return StreamingResponse(multipart_chunks(), media_type=writer.media_type)
+
+
+def stream_images_response(process, make_info_json, send_images):
+    """
+    Runs process(image_listener) on a separate thread and returns a chunked multipart/mixed response that has a part
+    for every image as soon as process passes it to image_listener. Images of the final result that were not passed
+    (grids, masks, images from scripts) follow at the end, then a JSON part made by make_info_json(processed).
+    """
+
+    results = queue.Queue()
+
+    def run():
+        try:
+            processed = process((lambda image: results.put(("image", image))) if send_images else None)
+            results.put(("done", processed))
+        except Exception as e:
+            errors.display(e, "streaming API response")
+            results.put(("error", e))
+
+    writer = MultipartWriter()
+
+    def chunks():
+        sent = []
+        while True:
+            kind, value = results.get()
+
+            if kind == "image":
+                yield writer.image_part(encode_pil_to_bytes(value), len(sent))
+                sent.append(value)
+                continue
+
+            if kind == "error":
+                err = {"error": type(value).__name__, "detail": vars(value).get('detail', ''), "errors": str(value)}
+                yield writer.part(json.dumps(err).encode(), "application/json")
+            else:
+                for image in value.images if send_images else []:
+                    if not any(image is x for x in sent):
+                        yield writer.image_part(encode_pil_to_bytes(image), len(sent))
+                        sent.append(image)
+
+                yield writer.part(make_info_json(value).encode(), "application/json")
+
+            yield writer.end()
+            return
 
-    return base64.b64encode(bytes_data)
+    threading.Thread(target=run, name="api-stream", daemon=True).start()
+
+    return StreamingResponse(chunks(), media_type=writer.media_type)
 
 
 def api_middleware(app: FastAPI):
@@ -207,9 +459,14 @@ class Api:
         self.router = APIRouter()
         self.app = app
         self.queue_lock = queue_lock
+        self.job_store = JobStore(os.path.join(data_path, "api-jobs.sqlite"))
+        self.job_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-job")
         api_middleware(self.app)
         self.add_api_route("/sdapi/v1/txt2img", self.text2imgapi, methods=["POST"], response_model=models.TextToImageResponse)
         self.add_api_route("/sdapi/v1/img2img", self.img2imgapi, methods=["POST"], response_model=models.ImageToImageResponse)
+        self.add_api_route("/sdapi/v1/jobs", self.submit_jobapi, methods=["POST"], response_model=models.JobStatusResponse)
+        self.add_api_route("/sdapi/v1/jobs/{id_task}", self.get_jobapi, methods=["GET"], response_model=models.JobStatusResponse)
+        self.add_api_route("/sdapi/v1/jobs/{id_task}/result", self.get_job_resultapi, methods=["GET"])
         self.add_api_route("/sdapi/v1/extra-single-image", self.extras_single_image_api, methods=["POST"], response_model=models.ExtrasSingleImageResponse)
         self.add_api_route("/sdapi/v1/extra-batch-images", self.extras_batch_images_api, methods=["POST"], response_model=models.ExtrasBatchImagesResponse)
         self.add_api_route("/sdapi/v1/png-info", self.pnginfoapi, methods=["POST"], response_model=models.PNGInfoResponse)
@@ -429,7 +686,20 @@ class Api:
 
         return params
 
-    def text2imgapi(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI):
+    def submit_job(self, task_id, request, override_settings, **kwargs):
+        """Queues a generation job for an API request and waits until it can run; see JobScheduler.submit"""
+
+        add_task_to_queue(task_id)
+
+        try:
+            return self.queue_lock.submit(id_task=task_id, priority=job_scheduler.PRIORITY_API, client=request_client(request), affinity=job_scheduler.model_affinity(override_settings), **kwargs)
+        except job_scheduler.QueueFull as e:
+            pending_tasks.pop(task_id, None)
+            raise HTTPException(status_code=429, detail=str(e)) from e
+
+    def txt2img_task(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI, request: Request = None):
+        """Prepares a txt2img request for generation; returns process(image_listener=None), which queues it, generates it and returns Processed, and info_json(processed), which makes the JSON response without images"""
+
         task_id = txt2imgreq.force_task_id or create_task_id("txt2img")
 
         script_runner = scripts.scripts_txt2img
@@ -459,37 +729,87 @@ class Api:
 
         script_args = self.init_script_args(txt2imgreq, self.default_script_arg_txt2img, selectable_scripts, selectable_script_idx, script_runner, input_script_args=infotext_script_args)
 
-        send_images = args.pop('send_images', True)
+        args.pop('send_images', None)
         args.pop('save_images', None)
+        args.pop('response_format', None)
 
-        add_task_to_queue(task_id)
+        # requests that only differ in prompt and seed can be generated together if they don't use scripts
+        can_coalesce = opts.queue_coalesce_batch_size > 1 and selectable_scripts is None and not txt2imgreq.alwayson_scripts and not infotext_script_args and args.get('batch_size') == 1 and args.get('n_iter') == 1
+        payload = {"prompt": args.get('prompt'), "negative_prompt": args.get('negative_prompt'), "seed": get_fixed_seed(args.get('seed')), "subseed": get_fixed_seed(args.get('subseed'))}
+
+        def process(image_listener=None):
+            job = self.submit_job(task_id, request, args.get('override_settings'), coalesce_key=coalesce_key(args) if can_coalesce and image_listener is None else None, payload=payload, max_batch=opts.queue_coalesce_batch_size)
+            if job.leader is not None:
+                return job.future.result()
+
+            try:
+                batch_args = {**args, **coalesced_args([x.payload for x in job.batch])} if len(job.batch) > 1 else args
+
+                with closing(StableDiffusionProcessingTxt2Img(sd_model=shared.sd_model, **batch_args)) as p:
+                    p.is_api = True
+                    p.image_listener = image_listener
+                    p.scripts = script_runner
+                    p.outpath_grids = opts.outdir_txt2img_grids
+                    p.outpath_samples = opts.outdir_txt2img_samples
+
+                    try:
+                        shared.state.begin(job="scripts_txt2img")
+                        start_task(task_id)
+                        if selectable_scripts is not None:
+                            p.script_args = script_args
+                            processed = scripts.scripts_txt2img.run(p, *p.script_args) # Need to pass args as list here
+                        else:
+                            p.script_args = tuple(script_args) # Need to pass args as tuple here
+                            processed = process_images(p)
+                        finish_task(task_id)
+                    finally:
+                        shared.state.end()
+                        shared.total_tqdm.clear()
+
+                if len(job.batch) > 1:
+                    for i, other in enumerate(job.batch[1:], 1):
+                        other.future.set_result(coalesced_result(processed, i))
+                        finish_task(other.id_task)
+
+                    processed = coalesced_result(processed, 0)
+            except Exception as e:
+                for other in job.batch[1:]:
+                    if not other.future.done():
+                        other.future.set_exception(e)
+                        finish_task(other.id_task)
+                raise
+            finally:
+                self.queue_lock.release()
+
+            return processed
+
+        def info_json(processed):
+            return models.TextToImageResponse(parameters=vars(txt2imgreq), info=processed.js()).json(exclude={"images"})
+
+        return process, info_json
+
+    def text2imgapi(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI, request: Request = None):
+        response_format = txt2imgreq.response_format or "json"
+        validate_response_format(response_format)
+
+        send_images = txt2imgreq.send_images
+        process, info_json = self.txt2img_task(txt2imgreq, request)
+
+        if response_format == "stream":
+            return stream_images_response(process, info_json, send_images)
+
+        processed = process()
+
+        if response_format != "json":
+            return images_response(response_format, processed.images if send_images else [], info_json(processed))
 
-        with self.queue_lock:
-            with closing(StableDiffusionProcessingTxt2Img(sd_model=shared.sd_model, **args)) as p:
-                p.is_api = True
-                p.scripts = script_runner
-                p.outpath_grids = opts.outdir_txt2img_grids
-                p.outpath_samples = opts.outdir_txt2img_samples
-
-                try:
-                    shared.state.begin(job="scripts_txt2img")
-                    start_task(task_id)
-                    if selectable_scripts is not None:
-                        p.script_args = script_args
-                        processed = scripts.scripts_txt2img.run(p, *p.script_args) # Need to pass args as list here
-                    else:
-                        p.script_args = tuple(script_args) # Need to pass args as tuple here
-                        processed = process_images(p)
-                    finish_task(task_id)
-                finally:
-                    shared.state.end()
-                    shared.total_tqdm.clear()
-
-        b64images = list(map(encode_pil_to_base64, processed.images)) if send_images else []
+        b64images = encode_images_to_base64(processed.images) if send_images else []
 
         return models.TextToImageResponse(images=b64images, parameters=vars(txt2imgreq), info=processed.js())
 
-    def img2imgapi(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI):
+    def img2img_task(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI, request: Request = None):
+        """Prepares an img2img request for generation; returns process(image_listener=None), which queues it, generates it and returns Processed, and info_json(processed), which makes the JSON response without images"""
+
         task_id = img2imgreq.force_task_id or create_task_id("img2img")
 
         init_images = img2imgreq.init_images
@@ -529,47 +849,164 @@ class Api:
 
         script_args = self.init_script_args(img2imgreq, self.default_script_arg_img2img, selectable_scripts, selectable_script_idx, script_runner, input_script_args=infotext_script_args)
 
-        send_images = args.pop('send_images', True)
+        args.pop('send_images', None)
         args.pop('save_images', None)
+        args.pop('response_format', None)
 
-        add_task_to_queue(task_id)
+        def process(image_listener=None):
+            self.submit_job(task_id, request, args.get('override_settings'))
+
+            try:
+                with closing(StableDiffusionProcessingImg2Img(sd_model=shared.sd_model, **args)) as p:
+                    p.init_images = [decode_base64_to_image(x) for x in init_images]
+                    p.is_api = True
+                    p.image_listener = image_listener
+                    p.scripts = script_runner
+                    p.outpath_grids = opts.outdir_img2img_grids
+                    p.outpath_samples = opts.outdir_img2img_samples
+
+                    try:
+                        shared.state.begin(job="scripts_img2img")
+                        start_task(task_id)
+                        if selectable_scripts is not None:
+                            p.script_args = script_args
+                            processed = scripts.scripts_img2img.run(p, *p.script_args) # Need to pass args as list here
+                        else:
+                            p.script_args = tuple(script_args) # Need to pass args as tuple here
+                            processed = process_images(p)
+                        finish_task(task_id)
+                    finally:
+                        shared.state.end()
+                        shared.total_tqdm.clear()
+            finally:
+                self.queue_lock.release()
 
-        with self.queue_lock:
-            with closing(StableDiffusionProcessingImg2Img(sd_model=shared.sd_model, **args)) as p:
-                p.init_images = [decode_base64_to_image(x) for x in init_images]
-                p.is_api = True
-                p.scripts = script_runner
-                p.outpath_grids = opts.outdir_img2img_grids
-                p.outpath_samples = opts.outdir_img2img_samples
-
-                try:
-                    shared.state.begin(job="scripts_img2img")
-                    start_task(task_id)
-                    if selectable_scripts is not None:
-                        p.script_args = script_args
-                        processed = scripts.scripts_img2img.run(p, *p.script_args) # Need to pass args as list here
-                    else:
-                        p.script_args = tuple(script_args) # Need to pass args as tuple here
-                        processed = process_images(p)
-                    finish_task(task_id)
-                finally:
-                    shared.state.end()
-                    shared.total_tqdm.clear()
-
-        b64images = list(map(encode_pil_to_base64, processed.images)) if send_images else []
+            return processed
 
+        # init images are already decoded from args, so they can be left out of the response now
         if not img2imgreq.include_init_images:
             img2imgreq.init_images = None
             img2imgreq.mask = None
 
+        def info_json(processed):
+            return models.ImageToImageResponse(parameters=vars(img2imgreq), info=processed.js()).json(exclude={"images"})
+
+        return process, info_json
+
+    def img2imgapi(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI, request: Request = None):
+        response_format = img2imgreq.response_format or "json"
+        validate_response_format(response_format)
+
+        send_images = img2imgreq.send_images
+        process, info_json = self.img2img_task(img2imgreq, request)
+
+        if response_format == "stream":
+            return stream_images_response(process, info_json, send_images)
+
+        processed = process()
+
+        if response_format != "json":
+            return images_response(response_format, processed.images if send_images else [], info_json(processed))
+
+        b64images = encode_images_to_base64(processed.images) if send_images else []
+
         return models.ImageToImageResponse(images=b64images, parameters=vars(img2imgreq), info=processed.js())
 
+    def submit_jobapi(self, req: models.JobRequest, request: Request):
+        if req.callback_url is not None:
+            if not opts.api_jobs_callbacks:
+                raise HTTPException(status_code=403, detail="Callback URLs not allowed")
+
+            if not req.callback_url.startswith(("http://", "https://")):
+                raise HTTPException(status_code=422, detail="Callback URL must start with http:// or https://")
+
+        try:
+            if req.type == "txt2img":
+                generation_request = models.StableDiffusionTxt2ImgProcessingAPI(**req.request)
+            else:
+                generation_request = models.StableDiffusionImg2ImgProcessingAPI(**req.request)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors()) from e
+
+        id_task = generation_request.force_task_id = generation_request.force_task_id or create_task_id(req.type)
+        send_images = generation_request.send_images
+
+        if req.type == "txt2img":
+            process, info_json = self.txt2img_task(generation_request, request)
+        else:
+            process, info_json = self.img2img_task(generation_request, request)
+
+        self.job_store.add(id_task, req.type, req.callback_url)
+        self.job_executor.submit(self.run_job, id_task, process, info_json, send_images, req.callback_url)
+
+        return self.job_status(self.job_store.get(id_task))
+
+    def run_job(self, id_task, process, info_json, send_images, callback_url):
+        try:
+            processed = process()
+            files = encode_images_to_files(processed.images) if send_images and processed.images else []
+            self.job_store.finish(id_task, "done", info=info_json(processed), files=files)
+        except Exception as e:
+            errors.display(e, f"API job {id_task}")
+            self.job_store.finish(id_task, "failed", error=str(vars(e).get('detail', '') or e))
+
+        if callback_url is None:
+            return
+
+        try:
+            headers = {'user-agent': opts.api_useragent} if opts.api_useragent else {}
+            status = self.job_status(self.job_store.get(id_task))
+            requests.post(callback_url, data=status.json(), headers={**headers, 'content-type': 'application/json'}, timeout=30)
+        except Exception as e:
+            errors.display(e, f"sending callback for API job {id_task} to {callback_url}")
+
+    def job_status(self, job):
+        status, progress, eta, textinfo = job["status"], None, None, None
+
+        if status == "queued":
+            task = task_progress(TaskProgressRequest(id_task=job["id_task"], live_preview=False))
+            if task.active:
+                status, progress, eta = "running", task.progress, task.eta
+            textinfo = task.textinfo
+        elif status == "done":
+            progress = 1.0
+
+        return models.JobStatusResponse(id_task=job["id_task"], type=job["type"], status=status, progress=progress, eta=eta, textinfo=textinfo, created=job["created"], finished=job["finished"], error=job["error"], images=job["images"])
+
+    def get_jobapi(self, id_task: str):
+        job = self.job_store.get(id_task)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        return self.job_status(job)
+
+    def get_job_resultapi(self, id_task: str, response_format: str = "multipart"):
+        job = self.job_store.get(id_task)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        if job["status"] == "failed":
+            raise HTTPException(status_code=500, detail=job["error"])
+
+        if job["status"] != "done":
+            raise HTTPException(status_code=409, detail="Job is not finished")
+
+        if response_format not in ("json", "multipart", "zip"):
+            raise HTTPException(status_code=422, detail=f"Invalid response_format: {response_format}; must be one of: json, multipart, zip")
+
+        files = self.job_store.files(id_task)
+
+        if response_format == "json":
+            return JSONResponse(content={**json.loads(job["info"]), "images": [base64.b64encode(data).decode() for _, data in files]})
+
+        return files_response(response_format, files, job["info"])
+
     def extras_single_image_api(self, req: models.ExtrasSingleImageRequest):
         reqDict = setUpscalers(req)
 
         reqDict['image'] = decode_base64_to_image(reqDict['image'])
 
-        with self.queue_lock:
+        with self.queue_lock.queued(priority=job_scheduler.PRIORITY_API):
             result = postprocessing.run_extras(extras_mode=0, image_folder="", input_dir="", output_dir="", save_output=False, **reqDict)
 
         return models.ExtrasSingleImageResponse(image=encode_pil_to_base64(result[0][0]), html_info=result[1])
@@ -578,12 +1015,13 @@ class Api:
         reqDict = setUpscalers(req)
 
         image_list = reqDict.pop('imageList', [])
-        image_folder = [decode_base64_to_image(x.data) for x in image_list]
+        # decoded on postprocessing's thread pool, as the images are about to be processed
+        image_folder = [functools.partial(decode_base64_to_image, x.data) for x in image_list]
 
-        with self.queue_lock:
+        with self.queue_lock.queued(priority=job_scheduler.PRIORITY_API):
             result = postprocessing.run_extras(extras_mode=1, image_folder=image_folder, image="", input_dir="", output_dir="", save_output=False, **reqDict)
 
-        return models.ExtrasBatchImagesResponse(images=list(map(encode_pil_to_base64, result[0])), html_info=result[1])
+        return models.ExtrasBatchImagesResponse(images=images.image_save_queue.map(encode_pil_to_base64, result[0]), html_info=result[1])
 
     def pnginfoapi(self, req: models.PNGInfoRequest):
         image = decode_base64_to_image(req.image.strip())
@@ -636,7 +1074,7 @@ class Api:
         img = img.convert('RGB')
 
         # Override object param
-        with self.queue_lock:
+        with self.queue_lock.queued(priority=job_scheduler.PRIORITY_API):
             if interrogatereq.model == "clip":
                 processed = shared.interrogator.interrogate(img)
             elif interrogatereq.model == "deepdanbooru":
@@ -725,7 +1163,15 @@ class Api:
 
     def get_sd_models(self):
         import modules.sd_models as sd_models
-        return [{"title": x.title, "model_name": x.model_name, "hash": x.shorthash, "sha256": x.sha256, "filename": x.filename, "config": find_checkpoint_config_near_filename(x)} for x in sd_models.checkpoints_list.values()]
+
+        res = []
+        for x in sd_models.checkpoints_list.values():
+            # hashes calculated in the background since the list was refreshed are only in the cache
+            sha256 = x.sha256 or hashes.sha256_from_cache(x.filename, f"checkpoint/{x.name}")
+            shorthash = x.shorthash or (sha256[0:10] if sha256 else None)
+            res.append({"title": x.title, "model_name": x.model_name, "hash": shorthash, "sha256": sha256, "hash_status": hashes.hash_status(x.filename, sha256), "filename": x.filename, "config": find_checkpoint_config_near_filename(x)})
+
+        return res
 
     def get_sd_vaes(self):
         import modules.sd_vae as sd_vae
@@ -769,15 +1215,15 @@ class Api:
         }
 
     def refresh_embeddings(self):
-        with self.queue_lock:
+        with self.queue_lock.queued(priority=job_scheduler.PRIORITY_API):
             sd_hijack.model_hijack.embedding_db.load_textual_inversion_embeddings(force_reload=True)
 
     def refresh_checkpoints(self):
-        with self.queue_lock:
+        with self.queue_lock.queued(priority=job_scheduler.PRIORITY_API):
             shared.refresh_checkpoints()
 
     def refresh_vae(self):
-        with self.queue_lock:
+        with self.queue_lock.queued(priority=job_scheduler.PRIORITY_API):
             shared_items.refresh_vae_list()
 
     def create_embedding(self, args: dict):
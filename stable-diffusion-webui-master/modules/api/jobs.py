@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+
+from modules import shared
+
+
+class JobStore:
+    """Keeps asynchronous API jobs and their results in an SQLite database, for a limited time and number of jobs"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.filename, check_same_thread=False)
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, type TEXT, status TEXT, created REAL, finished REAL, error TEXT, info TEXT, callback_url TEXT);
+                CREATE TABLE IF NOT EXISTS files (job TEXT, idx INTEGER, name TEXT, data BLOB, PRIMARY KEY (job, idx));
+            """)
+
+            # jobs that were queued when the server stopped will never finish
+            self.conn.execute("UPDATE jobs SET status = 'failed', error = 'Server was restarted', finished = ? WHERE status = 'queued'", (time.time(), ))
+            self.conn.commit()
+
+        return self.conn
+
+    def add(self, id_task, job_type, callback_url=None):
+        with self.lock:
+            conn = self.connection()
+            conn.execute("INSERT OR REPLACE INTO jobs (id, type, status, created, callback_url) VALUES (?, ?, 'queued', ?, ?)", (id_task, job_type, time.time(), callback_url))
+            self.prune(conn)
+            conn.commit()
+
+    def finish(self, id_task, status, error=None, info=None, files=()):
+        """Records the outcome of a job; files is a list of (filename, data) pairs"""
+
+        with self.lock:
+            conn = self.connection()
+            conn.executemany("INSERT OR REPLACE INTO files (job, idx, name, data) VALUES (?, ?, ?, ?)", [(id_task, i, name, data) for i, (name, data) in enumerate(files)])
+            conn.execute("UPDATE jobs SET status = ?, error = ?, info = ?, finished = ? WHERE id = ?", (status, error, info, time.time(), id_task))
+            self.prune(conn)
+            conn.commit()
+
+    def prune(self, conn):
+        expired = time.time() - shared.opts.api_jobs_ttl * 3600
+        conn.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (expired, ))
+        conn.execute("DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished IS NOT NULL ORDER BY finished DESC LIMIT -1 OFFSET ?)", (max(int(shared.opts.api_jobs_max_stored), 0), ))
+        conn.execute("DELETE FROM files WHERE job NOT IN (SELECT id FROM jobs)")
+
+    def get(self, id_task):
+        with self.lock:
+            cursor = self.connection().execute("SELECT id, type, status, created, finished, error, info, callback_url, (SELECT COUNT(*) FROM files WHERE job = jobs.id) FROM jobs WHERE id = ?", (id_task, ))
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(["id_task", "type", "status", "created", "finished", "error", "info", "callback_url", "images"], row))
+
+    def files(self, id_task):
+        with self.lock:
+            cursor = self.connection().execute("SELECT name, data FROM files WHERE job = ? ORDER BY idx", (id_task, ))
+            return cursor.fetchall()
@@ -109,6 +109,7 @@ StableDiffusionTxt2ImgProcessingAPI = PydanticModelGenerator(
         {"key": "alwayson_scripts", "type": dict, "default": {}},
         {"key": "force_task_id", "type": str, "default": None},
         {"key": "infotext", "type": str, "default": None},
+        {"key": "response_format", "type": str, "default": "json"},
     ]
 ).generate_model()
 
@@ -128,6 +129,7 @@ StableDiffusionImg2ImgProcessingAPI = PydanticModelGenerator(
         {"key": "alwayson_scripts", "type": dict, "default": {}},
         {"key": "force_task_id", "type": str, "default": None},
         {"key": "infotext", "type": str, "default": None},
+        {"key": "response_format", "type": str, "default": "json"},
     ]
 ).generate_model()
 
@@ -141,6 +143,23 @@ class ImageToImageResponse(BaseModel):
     parameters: dict
     info: str
 
+class JobRequest(BaseModel):
+    type: Literal["txt2img", "img2img"] = Field(title="Type", description="The kind of generation to run.")
+    request: dict = Field(default={}, title="Request", description="Body of the request as it would be sent to /sdapi/v1/txt2img or /sdapi/v1/img2img.")
+    callback_url: Optional[str] = Field(default=None, title="Callback URL", description="http:// or https:// URL that receives a POST request with the job's status when the job is finished.")
+
+class JobStatusResponse(BaseModel):
+    id_task: str = Field(title="Task ID")
+    type: str = Field(title="Type")
+    status: Literal["queued", "running", "done", "failed"] = Field(title="Status")
+    progress: Optional[float] = Field(default=None, title="Progress", description="The progress with a range of 0 to 1")
+    eta: Optional[float] = Field(default=None, title="ETA in secs")
+    textinfo: Optional[str] = Field(default=None, title="Info text", description="Position in queue or other information about the job's progress.")
+    created: float = Field(title="Created", description="Time when the job was submitted, as a Unix timestamp")
+    finished: Optional[float] = Field(default=None, title="Finished", description="Time when the job was finished, as a Unix timestamp")
+    error: Optional[str] = Field(default=None, title="Error")
+    images: int = Field(default=0, title="Images", description="Number of images in the result")
+
 class ExtrasBaseRequest(BaseModel):
     resize_mode: Literal[0, 1] = Field(default=0, title="Resize Mode", description="Sets the resize mode: 0 to upscale by upscaling_resize amount, 1 to upscale up to upscaling_resize_h x upscaling_resize_w.")
     show_extras_results: bool = Field(default=True, title="Show results", description="Should the backend return the generated image?")
@@ -257,6 +276,7 @@ class SDModelItem(BaseModel):
     model_name: str = Field(title="Model Name")
     hash: Optional[str] = Field(title="Short hash")
     sha256: Optional[str] = Field(title="sha256 hash")
+    hash_status: str = Field(title="Hash status", description="hashed, hashing, queued or not hashed")
     filename: str = Field(title="Filename")
     config: Optional[str] = Field(title="Config file")
 
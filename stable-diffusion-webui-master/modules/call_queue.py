@@ -3,9 +3,9 @@ from functools import wraps
 import html
 import time
 
-from modules import shared, progress, errors, devices, fifo_lock, profiling
+from modules import shared, progress, errors, devices, job_scheduler, profiling
 
-queue_lock = fifo_lock.FIFOLock()
+queue_lock = job_scheduler.JobScheduler()
 
 
 def wrap_queued_call(func):
@@ -29,7 +29,7 @@ def wrap_gradio_gpu_call(func, extra_outputs=None):
         else:
             id_task = None
 
-        with queue_lock:
+        with queue_lock.queued(id_task=id_task, priority=job_scheduler.PRIORITY_INTERACTIVE):
             shared.state.begin(job=id_task)
             progress.start_task(id_task)
 
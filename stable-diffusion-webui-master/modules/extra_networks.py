@@ -206,6 +206,13 @@ def parse_prompts(prompts):
     return res, extra_data
 
 
+def extra_network_data_key(extra_network_data):
+    """Returns a hashable form of extra network data returned by parse_prompt, equal for prompts that use the same
+    extra networks with the same arguments"""
+
+    return tuple((name, tuple(tuple(params.items) for params in params_list)) for name, params_list in sorted((extra_network_data or {}).items()))
+
+
 def get_user_metadata(filename, lister=None):
     if filename is None:
         return {}
@@ -1,22 +1,90 @@
 import hashlib
+import heapq
+import itertools
+import mmap
 import os.path
+import threading
+from concurrent.futures import Future
 
-from modules import shared
+from modules import shared, errors
 import modules.cache
 
 dump_cache = modules.cache.dump_cache
 cache = modules.cache.cache
 
+PRIORITY_NOW = 0
+"""someone is waiting for the hash"""
+
+PRIORITY_BACKGROUND = 1
+"""hashing the library ahead of time"""
+
+
+def file_chunks(file, blksize):
+    """Yields the contents of an open file in chunks; memory-maps the file when possible so that chunks are not copied."""
+
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):  # empty file, or a filesystem that can't be mapped
+        yield from iter(lambda: file.read(blksize), b"")
+        return
+
+    with mapped, memoryview(mapped) as view:
+        for pos in range(0, len(view), blksize):
+            with view[pos:pos + blksize] as chunk:
+                yield chunk
+
+
+def calculate_hashes(filename, use_addnet_hash=False):
+    """
+    Returns (sha256, addnet hash) for a file, reading it once. The addnet hash is only calculated for safetensors
+    files when use_addnet_hash is set, and is None otherwise.
+
+    Large chunks are used because hashlib releases the GIL while hashing them, so several files can be hashed in
+    parallel from different threads.
+    """
 
-def calculate_sha256(filename):
     hash_sha256 = hashlib.sha256()
-    blksize = 1024 * 1024
+    hash_addnet = hashlib.sha256() if use_addnet_hash else None
+    blksize = 16 * 1024 * 1024
 
     with open(filename, "rb") as f:
-        for chunk in iter(lambda: f.read(blksize), b""):
+        if hash_addnet is not None:
+            offset = int.from_bytes(f.read(8), "little") + 8
+            f.seek(0)
+
+        pos = 0
+        for chunk in file_chunks(f, blksize):
             hash_sha256.update(chunk)
 
-    return hash_sha256.hexdigest()
+            if hash_addnet is not None and pos + len(chunk) > offset:
+                hash_addnet.update(chunk[max(0, offset - pos):])
+
+            pos += len(chunk)
+
+    return hash_sha256.hexdigest(), hash_addnet.hexdigest() if hash_addnet is not None else None
+
+
+def calculate_sha256(filename):
+    return calculate_hashes(filename)[0]
+
+
+def index_key(filename):
+    """Key for the persistent hash index: identifies file contents by inode, size and modification time, so hashes survive renames and moves."""
+
+    st = os.stat(filename)
+    return f"{st.st_ino}-{st.st_size}-{st.st_mtime_ns}"
+
+
+def sha256_from_index(filename, use_addnet_hash=False):
+    try:
+        entry = cache("hashes-index").get(index_key(filename))
+    except FileNotFoundError:
+        return None
+
+    if entry is None:
+        return None
+
+    return entry.get("addnet") if use_addnet_hash else entry.get("sha256")
 
 
 def sha256_from_cache(filename, title, use_addnet_hash=False):
@@ -27,20 +95,151 @@ def sha256_from_cache(filename, title, use_addnet_hash=False):
         return None
 
     if title not in hashes:
-        return None
+        return sha256_from_index(filename, use_addnet_hash)
 
     cached_sha256 = hashes[title].get("sha256", None)
     cached_mtime = hashes[title].get("mtime", 0)
 
     if ondisk_mtime > cached_mtime or cached_sha256 is None:
-        return None
+        return sha256_from_index(filename, use_addnet_hash)
 
     return cached_sha256
 
 
-def sha256(filename, title, use_addnet_hash=False):
-    hashes = cache("hashes-addnet") if use_addnet_hash else cache("hashes")
+def store_hashes(filename, title, sha256_value, addnet_value, key):
+    mtime = os.path.getmtime(filename)
+
+    cache("hashes")[title] = {"mtime": mtime, "sha256": sha256_value}
+    if addnet_value is not None:
+        cache("hashes-addnet")[title] = {"mtime": mtime, "sha256": addnet_value}
+
+    entry = {"sha256": sha256_value}
+    if addnet_value is not None:
+        entry["addnet"] = addnet_value
+    cache("hashes-index")[key] = entry
+
+    dump_cache()
 
+
+class HashingTask:
+    def __init__(self, filename, title, priority, use_addnet_hash):
+        self.filename = filename
+        self.title = title
+        self.priority = priority
+        self.use_addnet_hash = use_addnet_hash
+        self.callbacks = []
+        self.running = False
+
+
+class HashingService:
+    """
+    Calculates hashes on a pool of worker threads, most urgent files first.
+
+    A file is hashed once even if it is requested again while queued or running; requesting it with a more urgent
+    priority moves it up the queue. For safetensors files the addnet hash is calculated in the same pass, since
+    LoRA lookups need both.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = []
+        self.counter = itertools.count()
+        self.tasks = {}
+        self.workers = []
+        self.has_work = threading.Condition(self.lock)
+
+    def submit(self, filename, title, use_addnet_hash=False, priority=PRIORITY_BACKGROUND, callback=None) -> Future:
+        """Queues a file for hashing; the returned future resolves to its sha256 (or addnet hash if use_addnet_hash is set). callback, if given, is called with the same value."""
+
+        with self.lock:
+            task = self.tasks.get(filename)
+            if task is None:
+                task = HashingTask(filename, title, priority, os.path.splitext(filename)[1].lower() == ".safetensors")
+                self.tasks[filename] = task
+                self.push(task)
+            elif priority < task.priority and not task.running:
+                task.priority = priority
+                self.push(task)
+
+            result = Future()
+            task.callbacks.append((result, use_addnet_hash, callback))
+
+            self.start_workers()
+            self.has_work.notify()
+
+        return result
+
+    def push(self, task):
+        heapq.heappush(self.queue, (task.priority, next(self.counter), task))
+
+    def start_workers(self):
+        count = max(1, getattr(shared.opts, "hash_threads", 2))
+        while len(self.workers) < count:
+            worker = threading.Thread(target=self.worker, name=f"hashing-{len(self.workers)}", daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    def status(self, filename):
+        """Returns "hashing", "queued" or None"""
+
+        with self.lock:
+            task = self.tasks.get(filename)
+            if task is None:
+                return None
+
+            return "hashing" if task.running else "queued"
+
+    def next_task(self):
+        with self.lock:
+            while True:
+                while self.queue:
+                    priority, _, task = heapq.heappop(self.queue)
+
+                    # stale entry left behind when the task was moved up the queue
+                    if task.running or priority != task.priority or self.tasks.get(task.filename) is not task:
+                        continue
+
+                    task.running = True
+                    return task
+
+                self.has_work.wait()
+
+    def worker(self):
+        while True:
+            task = self.next_task()
+
+            try:
+                key = index_key(task.filename)
+                sha256_value, addnet_value = calculate_hashes(task.filename, task.use_addnet_hash)
+                print(f"Calculated sha256 for {task.filename}: {sha256_value}")
+                store_hashes(task.filename, task.title, sha256_value, addnet_value, key)
+                error = None
+            except Exception as e:
+                errors.display(e, f"calculating hash for {task.filename}")
+                sha256_value, addnet_value, error = None, None, e
+
+            with self.lock:
+                self.tasks.pop(task.filename, None)
+                callbacks = task.callbacks
+
+            for result, use_addnet_hash, callback in callbacks:
+                value = addnet_value if use_addnet_hash and addnet_value is not None else sha256_value
+                if error is not None:
+                    result.set_exception(error)
+                    continue
+
+                result.set_result(value)
+                if callback is not None:
+                    try:
+                        callback(value)
+                    except Exception as e:
+                        errors.display(e, f"hash callback for {task.filename}")
+
+
+hashing_service = HashingService()
+
+
+def sha256(filename, title, use_addnet_hash=False):
     sha256_value = sha256_from_cache(filename, title, use_addnet_hash)
     if sha256_value is not None:
         return sha256_value
@@ -48,22 +247,29 @@ def sha256(filename, title, use_addnet_hash=False):
     if shared.cmd_opts.no_hashing:
         return None
 
-    print(f"Calculating sha256 for {filename}: ", end='')
-    if use_addnet_hash:
-        with open(filename, "rb") as file:
-            sha256_value = addnet_hash_safetensors(file)
-    else:
-        sha256_value = calculate_sha256(filename)
-    print(f"{sha256_value}")
+    return hashing_service.submit(filename, title, use_addnet_hash, priority=PRIORITY_NOW).result()
 
-    hashes[title] = {
-        "mtime": os.path.getmtime(filename),
-        "sha256": sha256_value,
-    }
 
-    dump_cache()
+def sha256_in_background(filename, title, use_addnet_hash=False, callback=None, priority=PRIORITY_BACKGROUND):
+    """Queues a file without a known hash for background hashing if that is enabled in settings; returns True if it was queued."""
+
+    if shared.cmd_opts.no_hashing or not shared.opts.hash_models_in_background:
+        return False
+
+    if sha256_from_cache(filename, title, use_addnet_hash) is not None:
+        return False
+
+    hashing_service.submit(filename, title, use_addnet_hash, priority=priority, callback=callback)
+    return True
 
-    return sha256_value
+
+def hash_status(filename, sha256_value):
+    """Status of a file's hash for the API: "hashed", "hashing", "queued" or "not hashed"."""
+
+    if sha256_value:
+        return "hashed"
+
+    return hashing_service.status(filename) or "not hashed"
 
 
 def addnet_hash_safetensors(b):
@@ -81,4 +287,3 @@ def addnet_hash_safetensors(b):
         hash_sha256.update(chunk)
 
     return hash_sha256.hexdigest()
-
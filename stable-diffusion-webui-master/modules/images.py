@@ -6,7 +6,9 @@ import pytz
 import io
 import math
 import os
-from collections import namedtuple
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import re
 
 import numpy as np
@@ -562,6 +564,118 @@ def get_next_sequence_number(path, basename):
     return result + 1
 
 
+class SequenceNumbers:
+    """
+    Allocates sequence numbers for save_image. Each directory is listed once, and numbers are then handed out from
+    memory, so saving does not get slower as the directory fills up.
+
+    Files saved into a directory by someone else (another webui process, or the user) are noticed by the directory's
+    modification time changing while this process is not writing into it, which causes the directory to be listed
+    again. So does a chosen filename turning out to already exist. Numbers are only a guess that is usually right:
+    save_image takes a filename by creating it with reserve_filename, which fails if any process already has.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mtimes = {}  # path -> directory mtime after the last save from this process, or None if it must be listed again
+        self.writing = {}  # path -> number of saves from this process in progress
+        self.numbers = {}  # (path, basename) -> next number
+        self.listed = set()  # (path, basename) for which numbers are known to be up to date with the directory
+
+    def allocate(self, path, basename):
+        """returns the next sequence number for basename in path and reserves it for the caller"""
+
+        path = os.path.abspath(path)
+        key = (path, basename)
+
+        with self.lock:
+            mtime = os.stat(path).st_mtime_ns
+            known_mtime = self.mtimes.get(path)
+            if known_mtime is None or known_mtime != mtime and not self.writing.get(path):
+                self.mtimes[path] = mtime
+                self.listed = {x for x in self.listed if x[0] != path}
+
+            if key not in self.listed:
+                # numbers reserved by saves that are still in progress are not on disk yet, so never go back below them
+                self.numbers[key] = max(self.numbers.get(key, 0), get_next_sequence_number(path, basename))
+                self.listed.add(key)
+
+            number = self.numbers[key]
+            self.numbers[key] = number + 1
+            return number
+
+    def used(self, path, basename, number):
+        """records that a number past the one from allocate had to be used because of an existing file"""
+
+        path = os.path.abspath(path)
+        key = (path, basename)
+
+        with self.lock:
+            self.numbers[key] = max(self.numbers.get(key, 0), number + 1)
+
+            # the directory has files this process didn't know about; list it again on next allocate
+            self.mtimes[path] = None
+
+    def writing_started(self, path):
+        """records that this process is about to write files into the directory"""
+
+        path = os.path.abspath(path)
+
+        with self.lock:
+            self.writing[path] = self.writing.get(path, 0) + 1
+
+    def saved(self, path):
+        """records the directory's modification time after this process has written files into it"""
+
+        path = os.path.abspath(path)
+
+        with self.lock:
+            self.writing[path] = max(0, self.writing.get(path, 0) - 1)
+            if not self.writing[path]:
+                del self.writing[path]
+
+            if self.mtimes.get(path) is not None:
+                self.mtimes[path] = os.stat(path).st_mtime_ns
+
+    def clear(self):
+        with self.lock:
+            self.mtimes.clear()
+            self.writing.clear()
+            self.numbers.clear()
+            self.listed.clear()
+
+
+sequence_numbers = SequenceNumbers()
+
+
+def reserve_filename(filename):
+    """
+    Creates an empty placeholder file, which the image is later written over with os.replace. This fails if the file
+    exists, so two processes saving into the same directory can't take the same name.
+
+    Returns True if the name was reserved, False if the file exists, or None if the placeholder could not be created
+    for another reason, such as a read-only directory.
+    """
+
+    try:
+        os.close(os.open(filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        return None
+
+
+def remove_placeholder(filename):
+    """removes a file made by reserve_filename if nothing has been written over it"""
+
+    try:
+        if os.path.getsize(filename) == 0:
+            os.remove(filename)
+    except OSError:
+        pass
+
+
 def save_image_with_geninfo(image, geninfo, filename, extension=None, existing_pnginfo=None, pnginfo_section_name='parameters'):
     """
     Saves image to filename, including geninfo as text information for generation info.
@@ -621,7 +735,115 @@ def save_image_with_geninfo(image, geninfo, filename, extension=None, existing_p
         image.save(filename, format=image_format, quality=opts.jpeg_quality)
 
 
-def save_image(image, path, basename, seed=None, prompt=None, extension='png', info=None, short_filename=False, no_prompt=False, grid=False, pnginfo_section_name='parameters', p=None, existing_info=None, forced_filename=None, suffix="", save_to_dirs=None):
+class ImageSaveJob:
+    def __init__(self, write):
+        self.write = write
+        self.written = False
+        self.callback = None
+        self.done = threading.Event()
+
+
+class ImageSaveQueue:
+    """
+    Writes images for save_image(..., background=True) on a pool of threads, so that generation can go on while
+    images are encoded and written. image_saved callbacks are called in the order images were submitted.
+
+    At most max_pending images can be waiting to be written; save_image blocks when more are submitted.
+    """
+
+    def __init__(self, threads=2, max_pending=16):
+        self.threads = threads
+        self.executor = None
+        self.lock = threading.Lock()
+        self.callbacks_lock = threading.Lock()
+        self.pending = deque()
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="image-save")
+
+            return self.executor
+
+    def submit(self, write, callback):
+        job = ImageSaveJob(write)
+        job.callback = callback
+
+        self.slots.acquire()
+        with self.callbacks_lock:
+            self.pending.append(job)
+
+        self.get_executor().submit(self.run, job)
+        return job
+
+    def run(self, job):
+        try:
+            job.write()
+            job.written = True
+        except Exception as e:
+            errors.display(e, "saving image")
+
+        with self.callbacks_lock:
+            job.done.set()
+            self.slots.release()
+
+            # call callbacks of all images at the front of the queue that are done, in order
+            while self.pending and self.pending[0].done.is_set():
+                finished = self.pending.popleft()
+                if finished.written and finished.callback is not None:
+                    try:
+                        finished.callback()
+                    except Exception as e:
+                        errors.display(e, "image saved callback")
+
+    def map(self, func, items):
+        """calls func for items on the pool's threads; returns the list of results"""
+
+        return list(self.get_executor().map(func, items))
+
+    def wait(self):
+        """waits until all images submitted so far are written"""
+
+        with self.callbacks_lock:
+            jobs = list(self.pending)
+
+        for job in jobs:
+            job.done.wait()
+
+
+image_save_queue = ImageSaveQueue()
+
+
+def wait_for_save(image):
+    """if image is being saved in background, waits until its file is written"""
+
+    job = getattr(image, 'save_job', None)
+    if job is not None:
+        job.done.wait()
+
+
+def read_saved_image(image, extension):
+    """returns contents of the file image was saved to by save_image, if it was saved with the given extension, or None"""
+
+    wait_for_save(image)
+
+    filename = getattr(image, 'already_saved_as', None)
+    if not filename or not os.path.isfile(filename):
+        return None
+
+    def normalize(ext):
+        ext = ext.lower().lstrip('.')
+        return 'jpg' if ext == 'jpeg' else ext
+
+    if normalize(os.path.splitext(filename)[1]) != normalize(extension):
+        return None
+
+    with open(filename, "rb") as file:
+        return file.read()
+
+
+def save_image(image, path, basename, seed=None, prompt=None, extension='png', info=None, short_filename=False, no_prompt=False, grid=False, pnginfo_section_name='parameters', p=None, existing_info=None, forced_filename=None, suffix="", save_to_dirs=None, background=False):
     """Save an image.
 
     Args:
@@ -647,6 +869,9 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
             If specified, `basename` and filename pattern will be ignored.
         save_to_dirs (bool):
             If true, the image will be saved into a subdirectory of `path`.
+        background (bool):
+            If true, the image is encoded and written by `image_save_queue`, and this function returns before the files
+            exist; `wait_for_save` waits for them. The `image_saved` callback is called once the files are written.
 
     Returns: (fullfn, txt_fullfn)
         fullfn (`str`):
@@ -670,6 +895,7 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
 
     os.makedirs(path, exist_ok=True)
 
+    reserved_filename = None
     if forced_filename is None:
         if short_filename or seed is None:
             file_decoration = ""
@@ -686,13 +912,20 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
             file_decoration = f"-{file_decoration}"
 
         if add_number:
-            basecount = get_next_sequence_number(path, basename)
+            basecount = sequence_numbers.allocate(path, basename)
             fullfn = None
             for i in range(500):
                 fn = f"{basecount + i:05}" if basename == '' else f"{basename}-{basecount + i:04}"
                 fullfn = os.path.join(path, f"{fn}{file_decoration}.{extension}")
-                if not os.path.exists(fullfn):
+                reservation = reserve_filename(fullfn)
+                if reservation:
+                    reserved_filename = fullfn
+                    break
+                if reservation is None and not os.path.exists(fullfn):
                     break
+
+            if i > 0:
+                sequence_numbers.used(path, basename, basecount + i)
         else:
             fullfn = os.path.join(path, f"{file_decoration}.{extension}")
     else:
@@ -718,7 +951,7 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
         save_image_with_geninfo(image_to_save, info, temp_file_path, extension, existing_pnginfo=params.pnginfo, pnginfo_section_name=pnginfo_section_name)
 
         filename = filename_without_extension + extension
-        if shared.opts.save_images_replace_action != "Replace":
+        if shared.opts.save_images_replace_action != "Replace" and filename != reserved_filename:
             n = 0
             while os.path.exists(filename):
                 n += 1
@@ -731,37 +964,64 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
         fullfn_without_extension = fullfn_without_extension[:max_name_len - max(4, len(extension))]
         params.filename = fullfn_without_extension + extension
         fullfn = params.filename
-    _atomically_save_image(image, fullfn_without_extension, extension)
 
-    image.already_saved_as = fullfn
-
-    oversize = image.width > opts.target_side_length or image.height > opts.target_side_length
-    if opts.export_for_4chan and (oversize or os.stat(fullfn).st_size > opts.img_downscale_threshold * 1024 * 1024):
-        ratio = image.width / image.height
-        resize_to = None
-        if oversize and ratio > 1:
-            resize_to = round(opts.target_side_length), round(image.height * opts.target_side_length / image.width)
-        elif oversize:
-            resize_to = round(image.width * opts.target_side_length / image.height), round(opts.target_side_length)
-
-        if resize_to is not None:
-            try:
-                # Resizing image with LANCZOS could throw an exception if e.g. image mode is I;16
-                image = image.resize(resize_to, LANCZOS)
-            except Exception:
-                image = image.resize(resize_to)
-        try:
-            _atomically_save_image(image, fullfn_without_extension, ".jpg")
-        except Exception as e:
-            errors.display(e, "saving image as downscaled JPG")
+    if reserved_filename is not None and reserved_filename != fullfn:
+        # renamed by a callback or shortened to fit the filesystem; the reserved name is not going to be used
+        remove_placeholder(reserved_filename)
+        reserved_filename = None
 
     if opts.save_txt and info is not None:
         txt_fullfn = f"{fullfn_without_extension}.txt"
-        with open(txt_fullfn, "w", encoding="utf8") as file:
-            file.write(f"{info}\n")
     else:
         txt_fullfn = None
 
+    def write_files():
+        try:
+            write_image_files()
+        except Exception:
+            if reserved_filename is not None:
+                remove_placeholder(reserved_filename)
+            raise
+        finally:
+            sequence_numbers.saved(path)
+
+    def write_image_files():
+        _atomically_save_image(image, fullfn_without_extension, extension)
+
+        oversize = image.width > opts.target_side_length or image.height > opts.target_side_length
+        if opts.export_for_4chan and (oversize or os.stat(fullfn).st_size > opts.img_downscale_threshold * 1024 * 1024):
+            ratio = image.width / image.height
+            resize_to = None
+            if oversize and ratio > 1:
+                resize_to = round(opts.target_side_length), round(image.height * opts.target_side_length / image.width)
+            elif oversize:
+                resize_to = round(image.width * opts.target_side_length / image.height), round(opts.target_side_length)
+
+            downscaled = image
+            if resize_to is not None:
+                try:
+                    # Resizing image with LANCZOS could throw an exception if e.g. image mode is I;16
+                    downscaled = image.resize(resize_to, LANCZOS)
+                except Exception:
+                    downscaled = image.resize(resize_to)
+            try:
+                _atomically_save_image(downscaled, fullfn_without_extension, ".jpg")
+            except Exception as e:
+                errors.display(e, "saving image as downscaled JPG")
+
+        if txt_fullfn is not None:
+            with open(txt_fullfn, "w", encoding="utf8") as file:
+                file.write(f"{info}\n")
+
+    image.already_saved_as = fullfn
+    sequence_numbers.writing_started(path)
+
+    if background:
+        image.save_job = image_save_queue.submit(write_files, lambda: script_callbacks.image_saved_callback(params))
+        return fullfn, txt_fullfn
+
+    write_files()
+
     script_callbacks.image_saved_callback(params)
 
     return fullfn, txt_fullfn
@@ -1,16 +1,18 @@
+import hashlib
 import os
 import sys
 from collections import namedtuple
 from pathlib import Path
 import re
 
+import numpy as np
 import torch
 import torch.hub
 
 from torchvision import transforms
 from torchvision.transforms.functional import InterpolationMode
 
-from modules import devices, paths, shared, lowvram, modelloader, errors, torch_utils
+from modules import devices, paths, shared, lowvram, modelloader, errors, torch_utils, cache
 
 blip_image_eval_size = 384
 clip_model_name = 'ViT-L/14'
@@ -42,6 +44,63 @@ def download_default_clip_interrogate_categories(content_dir):
             os.removedirs(tmpdir)
 
 
+class TextFeatureBank:
+    """
+    Normalized CLIP text features for lists of strings, computed once in batches and kept on disk as float16 .npy
+    files named by CLIP model and a hash of the list, which are read with memory mapping.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = {}  # key -> features on the interrogation device
+
+    def key(self, text_array):
+        digest = hashlib.sha256("\n".join(text_array).encode("utf8")).hexdigest()[:16]
+        return f"{re.sub(r'[^A-Za-z0-9]+', '-', clip_model_name)}-{digest}"
+
+    def compute(self, clip_model, text_array, filename, batch_size=256):
+        import clip
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_filename = f"{filename}.tmp"
+
+        features = None
+        with torch.no_grad(), devices.autocast():
+            for start in range(0, len(text_array), batch_size):
+                text_tokens = clip.tokenize(list(text_array[start:start + batch_size]), truncate=True).to(devices.device_interrogate)
+                batch = clip_model.encode_text(text_tokens).float()
+                batch /= batch.norm(dim=-1, keepdim=True)
+
+                if features is None:
+                    features = np.lib.format.open_memmap(tmp_filename, mode="w+", dtype=np.float16, shape=(len(text_array), batch.shape[1]))
+
+                features[start:start + len(batch)] = batch.cpu().numpy()
+
+        features.flush()
+        del features
+        os.replace(tmp_filename, filename)
+
+    def get(self, clip_model, text_array, dtype):
+        """returns features for text_array as a (len(text_array), dim) tensor on the interrogation device, computing them if needed"""
+
+        key = self.key(text_array)
+        features = self.loaded.get(key)
+        if features is not None:
+            return features
+
+        filename = os.path.join(self.path, f"{key}.npy")
+        if not os.path.exists(filename):
+            self.compute(clip_model, text_array, filename)
+
+        mapped = np.load(filename, mmap_mode="r")
+        features = torch.from_numpy(np.array(mapped)).to(device=devices.device_interrogate, dtype=dtype)
+        self.loaded[key] = features
+        return features
+
+    def unload(self):
+        self.loaded.clear()
+
+
 class InterrogateModels:
     blip_model = None
     clip_model = None
@@ -54,6 +113,7 @@ class InterrogateModels:
         self.skip_categories = []
         self.content_dir = content_dir
         self.running_on_cpu = devices.device_interrogate == torch.device("cpu")
+        self.text_features = TextFeatureBank(os.path.join(cache.cache_dir, "interrogate-features"))
 
     def categories(self):
         if not os.path.exists(self.content_dir):
@@ -147,40 +207,75 @@ class InterrogateModels:
         self.send_clip_to_ram()
         self.send_blip_to_ram()
 
-        devices.torch_gc()
-
-    def rank(self, image_features, text_array, top_count=1):
-        import clip
+        if not shared.opts.interrogate_keep_models_in_memory:
+            self.text_features.unload()
 
         devices.torch_gc()
 
+    def limit_text_array(self, text_array):
         if shared.opts.interrogate_clip_dict_limit != 0:
             text_array = text_array[0:int(shared.opts.interrogate_clip_dict_limit)]
 
+        return text_array
+
+    def rank(self, image_features, text_array, top_count=1):
+        """returns top_count best matches from text_array for the average of image_features, with their scores"""
+
+        text_array = self.limit_text_array(text_array)
+        top_count = min(top_count, len(text_array))
+
+        text_features = self.text_features.get(self.clip_model, text_array, self.dtype)
+        similarity = (100.0 * image_features @ text_features.T).float().softmax(dim=-1).mean(dim=0)
+
+        top_probs, top_labels = similarity.cpu().topk(top_count)
+        return [(text_array[top_labels[i]], top_probs[i].numpy() * 100) for i in range(top_count)]
+
+    def rank_batch(self, image_features, text_array, top_count=1):
+        """like rank, but for every row of image_features separately; returns a list of matches for each row"""
+
+        text_array = self.limit_text_array(text_array)
         top_count = min(top_count, len(text_array))
-        text_tokens = clip.tokenize(list(text_array), truncate=True).to(devices.device_interrogate)
-        text_features = self.clip_model.encode_text(text_tokens).type(self.dtype)
-        text_features /= text_features.norm(dim=-1, keepdim=True)
 
-        similarity = torch.zeros((1, len(text_array))).to(devices.device_interrogate)
-        for i in range(image_features.shape[0]):
-            similarity += (100.0 * image_features[i].unsqueeze(0) @ text_features.T).softmax(dim=-1)
-        similarity /= image_features.shape[0]
+        text_features = self.text_features.get(self.clip_model, text_array, self.dtype)
+        similarity = (100.0 * image_features @ text_features.T).float().softmax(dim=-1)
 
         top_probs, top_labels = similarity.cpu().topk(top_count, dim=-1)
-        return [(text_array[top_labels[0][i].numpy()], (top_probs[0][i].numpy()*100)) for i in range(top_count)]
+        return [[(text_array[labels[i]], probs[i].numpy() * 100) for i in range(top_count)] for probs, labels in zip(top_probs, top_labels)]
 
-    def generate_caption(self, pil_image):
-        gpu_image = transforms.Compose([
+    def generate_captions(self, pil_images):
+        gpu_images = torch.stack([transforms.Compose([
             transforms.Resize((blip_image_eval_size, blip_image_eval_size), interpolation=InterpolationMode.BICUBIC),
             transforms.ToTensor(),
             transforms.Normalize((0.48145466, 0.4578275, 0.40821073), (0.26862954, 0.26130258, 0.27577711))
-        ])(pil_image).unsqueeze(0).type(self.dtype).to(devices.device_interrogate)
+        ])(pil_image) for pil_image in pil_images]).type(self.dtype).to(devices.device_interrogate)
 
         with torch.no_grad():
-            caption = self.blip_model.generate(gpu_image, sample=False, num_beams=shared.opts.interrogate_clip_num_beams, min_length=shared.opts.interrogate_clip_min_length, max_length=shared.opts.interrogate_clip_max_length)
+            captions = self.blip_model.generate(gpu_images, sample=False, num_beams=shared.opts.interrogate_clip_num_beams, min_length=shared.opts.interrogate_clip_min_length, max_length=shared.opts.interrogate_clip_max_length)
 
-        return caption[0]
+        return captions
+
+    def generate_caption(self, pil_image):
+        return self.generate_captions([pil_image])[0]
+
+    def describe(self, captions, pil_images):
+        """appends CLIP category matches to BLIP captions of pil_images"""
+
+        clip_images = torch.stack([self.clip_preprocess(pil_image) for pil_image in pil_images]).type(self.dtype).to(devices.device_interrogate)
+
+        with torch.no_grad(), devices.autocast():
+            image_features = self.clip_model.encode_image(clip_images).type(self.dtype)
+            image_features /= image_features.norm(dim=-1, keepdim=True)
+
+            results = list(captions)
+            for cat in self.categories():
+                for i, matches in enumerate(self.rank_batch(image_features, cat.items, top_count=cat.topn)):
+                    for match, score in matches:
+                        if shared.opts.interrogate_return_ranks:
+                            results[i] += f", ({match}:{score/100:.3f})"
+                        else:
+                            results[i] += f", {match}"
+
+        return results
 
     def interrogate(self, pil_image):
         res = ""
@@ -197,20 +292,7 @@ class InterrogateModels:
 
             res = caption
 
-            clip_image = self.clip_preprocess(pil_image).unsqueeze(0).type(self.dtype).to(devices.device_interrogate)
-
-            with torch.no_grad(), devices.autocast():
-                image_features = self.clip_model.encode_image(clip_image).type(self.dtype)
-
-                image_features /= image_features.norm(dim=-1, keepdim=True)
-
-                for cat in self.categories():
-                    matches = self.rank(image_features, cat.items, top_count=cat.topn)
-                    for match, score in matches:
-                        if shared.opts.interrogate_return_ranks:
-                            res += f", ({match}:{score/100:.3f})"
-                        else:
-                            res += f", {match}"
+            res = self.describe([caption], [pil_image])[0]
 
         except Exception:
             errors.report("Error interrogating", exc_info=True)
@@ -220,3 +302,41 @@ class InterrogateModels:
         shared.state.end()
 
         return res
+
+    def interrogate_batch(self, pil_images):
+        """
+        Interrogates images from an iterable in batches of interrogate_batch_size, keeping both models loaded until
+        all are done; yields a description for every image, or None if interrogating its batch failed.
+        """
+
+        batch_size = max(1, int(shared.opts.interrogate_batch_size))
+
+        shared.state.begin(job="interrogate")
+        try:
+            lowvram.send_everything_to_cpu()
+            devices.torch_gc()
+
+            self.load()
+
+            batch = []
+            for pil_image in pil_images:
+                batch.append(pil_image)
+                if len(batch) == batch_size:
+                    yield from self.interrogate_loaded(batch)
+                    batch = []
+
+                if shared.state.interrupted:
+                    break
+
+            if batch:
+                yield from self.interrogate_loaded(batch)
+        finally:
+            self.unload()
+            shared.state.end()
+
+    def interrogate_loaded(self, pil_images):
+        try:
+            return self.describe(self.generate_captions(pil_images), pil_images)
+        except Exception:
+            errors.report("Error interrogating", exc_info=True)
+            return [None] * len(pil_images)
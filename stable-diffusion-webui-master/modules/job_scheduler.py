@@ -0,0 +1,204 @@
+import contextlib
+import threading
+import time
+from concurrent.futures import Future
+
+from modules import shared
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_API = 1
+PRIORITY_BACKGROUND = 2
+
+priority_names = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_API: "api",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def model_affinity(override_settings=None):
+    """Returns the (checkpoint name, VAE) pair a job with those override settings will run with"""
+
+    from modules import sd_models
+
+    override_settings = override_settings or {}
+    checkpoint = override_settings.get('sd_model_checkpoint', shared.opts.sd_model_checkpoint)
+    info = sd_models.get_closet_checkpoint_match(checkpoint) if checkpoint else None
+
+    return info.name if info else checkpoint, override_settings.get('sd_vae', shared.opts.sd_vae)
+
+
+def loaded_models():
+    """Returns the (checkpoint name, VAE file) pair currently loaded"""
+
+    from modules import sd_models, sd_vae
+
+    info = getattr(sd_models.model_data.sd_model, 'sd_checkpoint_info', None)
+
+    return info.name if info else None, sd_vae.loaded_vae_file
+
+
+class Job:
+    def __init__(self, id_task=None, priority=PRIORITY_INTERACTIVE, client=None, affinity=None, coalesce_key=None, payload=None, max_batch=1):
+        self.id_task = id_task
+        self.priority = priority
+        self.client = client
+        self.affinity = affinity
+        self.coalesce_key = coalesce_key
+        self.payload = payload
+        self.max_batch = max_batch
+
+        self.queued_at = time.time()
+        self.started_at = None
+        self.granted = threading.Event()
+
+        self.leader = None
+        """for jobs that were merged into another job's batch: that job; the result arrives in future"""
+
+        self.batch = [self]
+        """for the job that runs: itself followed by the jobs merged into it"""
+
+        self.future = Future()
+
+
+class JobScheduler:
+    """Runs GPU jobs one at a time, like a lock, choosing the next job by priority and by the model it needs.
+
+    A waiting job is chosen from the highest priority class, preferring jobs that use the checkpoint and VAE that are
+    already loaded; a job that has waited longer than the queue_affinity_window setting goes first regardless.
+    When a job that has a coalesce key starts, waiting jobs with the same key are merged into its batch.
+
+    Can be used as a drop-in replacement for a lock: `with scheduler:` runs an interactive job.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.running = None
+
+        self.jobs_started = 0
+        self.jobs_coalesced = 0
+        self.total_wait = 0.0
+        self.checkpoint_swaps = 0
+        self.vae_swaps = 0
+        self.models_at_start = None
+
+    def submit(self, **kwargs):
+        """Queues a Job made with kwargs and blocks until it can run or has been merged into a running job.
+
+        Unless the job has a leader, the caller runs it and must call release() when done.
+        """
+
+        job = Job(**kwargs)
+
+        with self.lock:
+            limit = shared.opts.queue_max_pending_per_client
+            if job.client is not None and limit and sum(1 for x in self.waiting if x.client == job.client) >= limit:
+                raise QueueFull(f"Too many queued requests from {job.client}; at most {limit} are allowed")
+
+            if self.running is None:
+                self.start(job)
+            else:
+                self.waiting.append(job)
+
+        job.granted.wait()
+        return job
+
+    def acquire(self, blocking=True):
+        if not blocking:
+            with self.lock:
+                if self.running is not None:
+                    return False
+
+                self.start(Job())
+                return True
+
+        self.submit()
+        return True
+
+    def release(self):
+        with self.lock:
+            self.finish()
+
+            job = self.pick()
+            if job is not None:
+                self.waiting.remove(job)
+                self.start(job)
+
+    __enter__ = acquire
+
+    def __exit__(self, t, v, tb):
+        self.release()
+
+    @contextlib.contextmanager
+    def queued(self, **kwargs):
+        """Runs the body of the with statement as a job that can't be coalesced"""
+
+        self.submit(**kwargs)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def start(self, job):
+        now = time.time()
+
+        if job.coalesce_key is not None:
+            for other in [x for x in self.waiting if x.coalesce_key == job.coalesce_key][:job.max_batch - 1]:
+                self.waiting.remove(other)
+                other.leader = job
+                job.batch.append(other)
+
+        for x in job.batch:
+            x.started_at = now
+            self.total_wait += now - x.queued_at
+
+        self.jobs_started += 1
+        self.jobs_coalesced += len(job.batch) - 1
+        self.running = job
+        self.models_at_start = loaded_models()
+
+        for x in job.batch:
+            x.granted.set()
+
+    def finish(self):
+        checkpoint, vae = loaded_models()
+        checkpoint_at_start, vae_at_start = self.models_at_start
+
+        self.checkpoint_swaps += checkpoint != checkpoint_at_start
+        self.vae_swaps += vae != vae_at_start
+        self.running = None
+
+    def pick(self):
+        if not self.waiting:
+            return None
+
+        oldest = self.waiting[0]
+        if time.time() - oldest.queued_at >= shared.opts.queue_affinity_window:
+            return oldest
+
+        top_priority = min(x.priority for x in self.waiting)
+        candidates = [x for x in self.waiting if x.priority == top_priority]
+
+        checkpoint, _ = loaded_models()
+        current = (checkpoint, shared.opts.sd_vae)
+
+        return next((x for x in candidates if x.affinity == current), candidates[0])
+
+    def metrics(self):
+        with self.lock:
+            now = time.time()
+
+            return {
+                "depth": {name: sum(1 for x in self.waiting if x.priority == priority) for priority, name in priority_names.items()},
+                "oldest_wait": max((now - x.queued_at for x in self.waiting), default=0.0),
+                "average_wait": self.total_wait / (self.jobs_started + self.jobs_coalesced) if self.jobs_started else 0.0,
+                "jobs_started": self.jobs_started,
+                "jobs_coalesced": self.jobs_coalesced,
+                "checkpoint_swaps": self.checkpoint_swaps,
+                "vae_swaps": self.vae_swaps,
+            }
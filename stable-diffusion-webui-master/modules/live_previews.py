@@ -0,0 +1,145 @@
+import base64
+import io
+import threading
+import time
+
+from modules import errors, shared
+
+
+def encode(image):
+    """Encodes a live preview image as a data: uri in the format from settings"""
+
+    image_format = shared.opts.live_previews_image_format
+
+    if image_format == 'jpeg' and image.mode in ('RGBA', 'P'):
+        image = image.convert('RGB')
+
+    if image_format == "png":
+        # using optimize for large images takes an enormous amount of time
+        if max(*image.size) <= 256:
+            save_kwargs = {"optimize": True}
+        else:
+            save_kwargs = {"optimize": False, "compress_level": 1}
+    else:
+        save_kwargs = {}
+
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format, **save_kwargs)
+    base64_image = base64.b64encode(buffered.getvalue()).decode('ascii')
+
+    return f"data:image/{image_format};base64,{base64_image}"
+
+
+def downscale(image):
+    """Returns a copy of the image that fits into the maximum live preview resolution from settings, or the image
+    itself if it already fits"""
+
+    from modules import images
+
+    size = shared.opts.live_previews_max_resolution
+    if size <= 0 or max(*image.size) <= size:
+        return image
+
+    image = image.copy()
+    image.thumbnail((size, size), images.LANCZOS)
+    return image
+
+
+class PreviewWorker:
+    """Decodes live previews from latents on a thread of its own, so that sampling doesn't wait for them.
+
+    The sampler hands over a copy of its latest latent with submit(); only the newest copy is kept, so latents that
+    arrive while the worker is busy or waiting replace the ones that haven't been decoded yet. Decodes are spaced by
+    at least the live preview decode period from settings. The decoded image is published to shared.state together
+    with its encoded form, which the progress API sends as is.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.thread = None
+        self.latent = None
+        self.generation = 0
+        self.last_decode = 0.0
+
+    def submit(self, latent):
+        snapshot = latent if shared.opts.show_progress_grid else latent[0:1]
+        snapshot = snapshot.detach().clone()
+
+        with self.lock:
+            self.latent = snapshot
+            self.idle.clear()
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="live-preview", daemon=True)
+                self.thread.start()
+
+        self.event.set()
+
+    def reset(self):
+        """Drops the latent that is waiting to be decoded, and makes sure that a decode that is in progress is not
+        published; used when a new job starts"""
+
+        with self.lock:
+            self.latent = None
+            self.generation += 1
+
+    def run(self):
+        while True:
+            self.event.wait()
+
+            delay = self.last_decode + shared.opts.live_previews_decode_period / 1000 - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self.lock:
+                self.event.clear()
+                latent, generation = self.latent, self.generation
+                self.latent = None
+
+            if latent is None:
+                self.set_idle()
+                continue
+
+            self.last_decode = time.time()
+
+            try:
+                image = self.decode(latent)
+                data = encode(downscale(image))
+            except Exception:
+                # when switching models during generation, VAE would be on CPU, so creating an image will fail.
+                # we silently ignore this error
+                errors.record_exception()
+                self.set_idle()
+                continue
+
+            with self.lock:
+                if generation == self.generation:
+                    shared.state.assign_current_image(image, data)
+
+            self.set_idle()
+
+    def set_idle(self):
+        with self.lock:
+            if self.latent is None:
+                self.idle.set()
+
+    def wait(self, timeout=None):
+        """Waits until every submitted latent has been decoded or dropped; returns False on timeout"""
+
+        return self.idle.wait(timeout)
+
+    def decode(self, latent):
+        import torch
+        from modules import sd_samplers_common
+
+        with torch.no_grad():
+            if shared.opts.show_progress_grid:
+                return sd_samplers_common.samples_to_image_grid(latent)
+
+            return sd_samplers_common.sample_to_image(latent)
+
+
+worker = PreviewWorker()
@@ -1,4 +1,6 @@
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
@@ -6,7 +8,62 @@ from modules import shared, images, devices, scripts, scripts_postprocessing, ui
 from modules.shared import opts
 
 
+def read_image(item):
+    """
+    Reads an image for postprocessing; item is (image, name), where image is a PIL image, a filename or a function
+    returning a PIL image. Returns (image, existing pnginfo), or None if a file could not be read.
+    """
+
+    image, name = item
+
+    if callable(image):
+        image = image()
+    elif isinstance(image, str):
+        try:
+            image = images.read(image)
+        except Exception:
+            return None
+
+    image = image if image.mode in ("RGBA", "RGB") else image.convert("RGB")
+
+    parameters, existing_pnginfo = images.read_info_from_image(image)
+    if parameters:
+        existing_pnginfo["parameters"] = parameters
+
+    return image, existing_pnginfo
+
+
+def read_images(items, window):
+    """
+    Calls read_image for items on a thread pool, yielding (name, result of read_image) for items in order. The next
+    window of items is read while the caller is working on the current one, so at most two windows of images are in
+    memory.
+    """
+
+    windows = [items[i:i + window] for i in range(0, len(items), window)]
+    with ThreadPoolExecutor(max_workers=max(1, opts.postprocessing_read_threads), thread_name_prefix="postprocessing-read") as executor:
+        futures = [executor.submit(read_image, item) for item in windows[0]] if windows else []
+        try:
+            for i, chunk in enumerate(windows):
+                current = futures
+                futures = [executor.submit(read_image, item) for item in windows[i + 1]] if i + 1 < len(windows) else []
+
+                for (_, name), future in zip(chunk, current):
+                    yield name, future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
 def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir, show_extras_results, *args, save_output: bool = True):
+    """
+    Runs postprocessing scripts for the image, for images in image_folder (uploaded files, PIL images or functions
+    returning PIL images) or for files in input_dir, depending on extras_mode.
+
+    Images are read on a thread pool ahead of processing, and written by images.image_save_queue while the following
+    images are processed.
+    """
+
     devices.torch_gc()
 
     shared.state.begin(job="extras")
@@ -17,12 +74,11 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
         if extras_mode == 1:
             for img in image_folder:
                 if isinstance(img, Image.Image):
-                    image = images.fix_image(img)
-                    fn = ''
+                    yield functools.partial(images.fix_image, img), ''
+                elif callable(img):
+                    yield img, ''
                 else:
-                    image = images.read(os.path.abspath(img.name))
-                    fn = os.path.splitext(img.orig_name)[0]
-                yield image, fn
+                    yield functools.partial(images.read, os.path.abspath(img.name)), os.path.splitext(img.orig_name)[0]
         elif extras_mode == 2:
             assert not shared.cmd_opts.hide_ui_dir_config, '--hide-ui-dir-config option must be disabled'
             assert input_dir, 'input directory not selected'
@@ -44,9 +100,7 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
     data_to_process = list(get_images(extras_mode, image, image_folder, input_dir))
     shared.state.job_count = len(data_to_process)
 
-    for image_placeholder, name in data_to_process:
-        image_data: Image.Image
-
+    for name, read_result in read_images(data_to_process, max(1, opts.postprocessing_batch_size)):
         shared.state.nextjob()
         shared.state.textinfo = name
         shared.state.skipped = False
@@ -54,19 +108,10 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
         if shared.state.interrupted or shared.state.stopping_generation:
             break
 
-        if isinstance(image_placeholder, str):
-            try:
-                image_data = images.read(image_placeholder)
-            except Exception:
-                continue
-        else:
-            image_data = image_placeholder
-
-        image_data = image_data if image_data.mode in ("RGBA", "RGB") else image_data.convert("RGB")
+        if read_result is None:
+            continue
 
-        parameters, existing_pnginfo = images.read_info_from_image(image_data)
-        if parameters:
-            existing_pnginfo["parameters"] = parameters
+        image_data, existing_pnginfo = read_result
 
         initial_pp = scripts_postprocessing.PostprocessedImage(image_data)
 
@@ -88,14 +133,17 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
 
             infotext = ", ".join([k if k == v else f'{k}: {infotext_utils.quote(v)}' for k, v in pp.info.items() if v is not None])
 
+            # each image gets its own copy, because saving in background may happen after the next image changed it
+            pnginfo = dict(existing_pnginfo)
+
             if opts.enable_pnginfo:
-                pp.image.info = existing_pnginfo
+                pp.image.info = pnginfo
                 pp.image.info["postprocessing"] = infotext
 
             shared.state.assign_current_image(pp.image)
 
             if save_output:
-                fullfn, _ = images.save_image(pp.image, path=outpath, basename=basename, extension=opts.samples_format, info=infotext, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=existing_pnginfo, forced_filename=forced_filename, suffix=suffix)
+                fullfn, _ = images.save_image(pp.image, path=outpath, basename=basename, extension=opts.samples_format, info=infotext, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=pnginfo, forced_filename=forced_filename, suffix=suffix, background=True)
 
                 if pp.caption:
                     caption_filename = os.path.splitext(fullfn)[0] + ".txt"
@@ -124,6 +172,8 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
             if extras_mode != 2 or show_extras_results:
                 outputs.append(pp.image)
 
+    images.image_save_queue.wait()
+
     devices.torch_gc()
     shared.state.end()
     return outputs, ui_common.plaintext_to_html(infotext), ''
@@ -224,6 +224,7 @@ class StableDiffusionProcessing:
     sd_vae_hash: str = field(default=None, init=False)
 
     is_api: bool = field(default=False, init=False)
+    image_listener: Any = field(default=None, init=False)  # if set, called with every generated image as soon as it is ready
 
     def __post_init__(self):
         if self.sampler_index is not None:
@@ -408,6 +409,7 @@ class StableDiffusionProcessing:
         if not opts.persistent_cond_cache:
             StableDiffusionProcessing.cached_c = [None, None]
             StableDiffusionProcessing.cached_uc = [None, None]
+            prompt_parser.text_encoder_cache.clear()
 
     def get_token_merging_ratio(self, for_hr=False):
         if for_hr:
@@ -457,6 +459,21 @@ class StableDiffusionProcessing:
             opts.emphasis,
         )
 
+    def text_encoder_cache_state(self, extra_network_data):
+        """Returns everything besides the text itself that affects text encoder output, for prompt_parser.text_encoder_cache"""
+
+        return (
+            opts.CLIP_stop_at_last_layers,
+            shared.sd_model.sd_checkpoint_info,
+            extra_networks.extra_network_data_key(extra_network_data),
+            model_hijack.embedding_db.revision,
+            opts.sdxl_crop_left,
+            opts.sdxl_crop_top,
+            opts.fp8_storage,
+            opts.cache_fp16_weight,
+            opts.emphasis,
+        )
+
     def get_conds_with_caching(self, function, required_prompts, steps, caches, extra_network_data, hires_steps=None):
         """
         Returns the result of calling function(shared.sd_model, required_prompts, steps)
@@ -484,7 +501,9 @@ class StableDiffusionProcessing:
 
         cache = caches[0]
 
-        with devices.autocast():
+        text_encoder_cache_state = self.text_encoder_cache_state(extra_network_data)
+        text_encoder_cache_bytes = opts.text_encoder_cache_mb * 1024 * 1024 if opts.persistent_cond_cache else 0
+        with devices.autocast(), prompt_parser.text_encoder_cache.activated(text_encoder_cache_state, text_encoder_cache_bytes):
             cache[1] = function(shared.sd_model, required_prompts, steps, hires_steps, shared.opts.use_old_scheduling)
 
         cache[0] = cached_params
@@ -622,52 +641,99 @@ class DecodedSamples(list):
     already_decoded = True
 
 
+vae_decode_bytes_per_pixel = 2048
+"""rough, conservative estimate of VAE decoder's peak memory use per output pixel, in units of the VAE's dtype size"""
+
+
+def vae_decode_chunk_size(batch):
+    """Returns how many latents to decode with VAE at once: at most sd_vae_decode_batch_size, fewer if they
+    would not fit into free GPU memory."""
+
+    limit = max(1, shared.opts.sd_vae_decode_batch_size)
+    if limit == 1 or devices.device.type != "cuda":
+        return limit
+
+    free, _ = torch.cuda.mem_get_info(devices.device)
+    h, w = batch.shape[-2:]
+    per_sample = h * opt_f * w * opt_f * vae_decode_bytes_per_pixel * torch.tensor([], dtype=devices.dtype_vae).element_size()
+
+    return max(1, min(limit, int(free // per_sample)))
+
+
+def autofix_vae_precision(model, e):
+    """Converts VAE to a more precise dtype after it produced NaNs, if settings allow that; otherwise raises e."""
+
+    if shared.opts.auto_vae_precision_bfloat16:
+        autofix_dtype = torch.bfloat16
+        autofix_dtype_text = "bfloat16"
+        autofix_dtype_setting = "Automatically convert VAE to bfloat16"
+        autofix_dtype_comment = ""
+    elif shared.opts.auto_vae_precision:
+        autofix_dtype = torch.float32
+        autofix_dtype_text = "32-bit float"
+        autofix_dtype_setting = "Automatically revert VAE to 32-bit floats"
+        autofix_dtype_comment = "\nTo always start with 32-bit VAE, use --no-half-vae commandline flag."
+    else:
+        raise e
+
+    if devices.dtype_vae == autofix_dtype:
+        raise e
+
+    errors.print_error_explanation(
+        "A tensor with all NaNs was produced in VAE.\n"
+        f"Web UI will now convert VAE into {autofix_dtype_text} and retry.\n"
+        f"To disable this behavior, disable the '{autofix_dtype_setting}' setting.{autofix_dtype_comment}"
+    )
+
+    devices.dtype_vae = autofix_dtype
+    model.first_stage_model.to(devices.dtype_vae)
+
+
 def decode_latent_batch(model, batch, target_device=None, check_for_nans=False):
+    """
+    Decodes latents with VAE, several at once (see vae_decode_chunk_size). If memory runs out, fewer latents are
+    decoded at once, down to one. Decoding several latents at once is not bit-identical to decoding them one at a
+    time: the results differ by float rounding, on the order of 1e-6 for 32-bit floats.
+
+    With check_for_nans, each decoded sample is checked; if VAE produced NaNs, it may be converted to a more precise
+    dtype (see autofix_vae_precision), and decoding continues from that sample.
+    """
+
     samples = DecodedSamples()
 
     if check_for_nans:
         devices.test_for_nans(batch, "unet")
 
-    for i in range(batch.shape[0]):
-        sample = decode_first_stage(model, batch[i:i + 1])[0]
-
-        if check_for_nans:
-
-            try:
-                devices.test_for_nans(sample, "vae")
-            except devices.NansException as e:
-                if shared.opts.auto_vae_precision_bfloat16:
-                    autofix_dtype = torch.bfloat16
-                    autofix_dtype_text = "bfloat16"
-                    autofix_dtype_setting = "Automatically convert VAE to bfloat16"
-                    autofix_dtype_comment = ""
-                elif shared.opts.auto_vae_precision:
-                    autofix_dtype = torch.float32
-                    autofix_dtype_text = "32-bit float"
-                    autofix_dtype_setting = "Automatically revert VAE to 32-bit floats"
-                    autofix_dtype_comment = "\nTo always start with 32-bit VAE, use --no-half-vae commandline flag."
-                else:
-                    raise e
-
-                if devices.dtype_vae == autofix_dtype:
-                    raise e
+    chunk_size = vae_decode_chunk_size(batch)
+    i = 0
+    while i < batch.shape[0]:
+        chunk = batch[i:i + chunk_size]
 
-                errors.print_error_explanation(
-                    "A tensor with all NaNs was produced in VAE.\n"
-                    f"Web UI will now convert VAE into {autofix_dtype_text} and retry.\n"
-                    f"To disable this behavior, disable the '{autofix_dtype_setting}' setting.{autofix_dtype_comment}"
-                )
+        try:
+            decoded = decode_first_stage(model, chunk)
+        except torch.cuda.OutOfMemoryError:
+            if chunk_size == 1:
+                raise
 
-                devices.dtype_vae = autofix_dtype
-                model.first_stage_model.to(devices.dtype_vae)
-                batch = batch.to(devices.dtype_vae)
+            devices.torch_gc()
+            chunk_size //= 2
+            logging.warning(f"Out of memory when decoding latents with VAE; retrying with {chunk_size} at once")
+            continue
 
-                sample = decode_first_stage(model, batch[i:i + 1])[0]
+        for sample in decoded:
+            if check_for_nans:
+                try:
+                    devices.test_for_nans(sample, "vae")
+                except devices.NansException as e:
+                    autofix_vae_precision(model, e)
+                    batch = batch.to(devices.dtype_vae)
+                    break  # decode this and the following samples again with the new dtype
 
-        if target_device is not None:
-            sample = sample.to(target_device)
+            if target_device is not None:
+                sample = sample.to(target_device)
 
-        samples.append(sample)
+            samples.append(sample)
+            i += 1
 
     return samples
 
@@ -909,7 +975,7 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
         p.all_subseeds = [int(subseed) + x for x in range(len(p.all_prompts))]
 
     if os.path.exists(cmd_opts.embeddings_dir) and not p.do_not_reload_embeddings:
-        model_hijack.embedding_db.load_textual_inversion_embeddings()
+        model_hijack.embedding_db.load_textual_inversion_embeddings(background=opts.textual_inversion_load_in_background)
 
     if p.scripts is not None:
         p.scripts.process(p)
@@ -1036,7 +1102,7 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
 
                 if p.restore_faces:
                     if save_samples and opts.save_images_before_face_restoration:
-                        images.save_image(Image.fromarray(x_sample), p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-face-restoration")
+                        images.save_image(Image.fromarray(x_sample), p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-face-restoration", background=opts.save_images_in_background)
 
                     devices.torch_gc()
 
@@ -1067,7 +1133,7 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                 if p.color_corrections is not None and i < len(p.color_corrections):
                     if save_samples and opts.save_images_before_color_correction:
                         image_without_cc, _ = apply_overlay(image, p.paste_to, overlay_image)
-                        images.save_image(image_without_cc, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-color-correction")
+                        images.save_image(image_without_cc, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-color-correction", background=opts.save_images_in_background)
                     image = apply_color_correction(p.color_corrections[i], image)
 
                 # If the intention is to show the output from the model
@@ -1082,7 +1148,7 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                     image = pp.image
 
                 if save_samples:
-                    images.save_image(image, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p)
+                    images.save_image(image, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, background=opts.save_images_in_background)
 
                 text = infotext(i)
                 infotexts.append(text)
@@ -1090,18 +1156,21 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                     image.info["parameters"] = text
                 output_images.append(image)
 
+                if p.image_listener is not None:
+                    p.image_listener(image)
+
                 if mask_for_overlay is not None:
                     if opts.return_mask or opts.save_mask:
                         image_mask = mask_for_overlay.convert('RGB')
                         if save_samples and opts.save_mask:
-                            images.save_image(image_mask, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-mask")
+                            images.save_image(image_mask, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-mask", background=opts.save_images_in_background)
                         if opts.return_mask:
                             output_images.append(image_mask)
 
                     if opts.return_mask_composite or opts.save_mask_composite:
                         image_mask_composite = Image.composite(original_denoised_image.convert('RGBA').convert('RGBa'), Image.new('RGBa', image.size), images.resize_image(2, mask_for_overlay, image.width, image.height).convert('L')).convert('RGBA')
                         if save_samples and opts.save_mask_composite:
-                            images.save_image(image_mask_composite, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-mask-composite")
+                            images.save_image(image_mask_composite, p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-mask-composite", background=opts.save_images_in_background)
                         if opts.return_mask_composite:
                             output_images.append(image_mask_composite)
 
@@ -1127,7 +1196,7 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
                 output_images.insert(0, grid)
                 index_of_first_image = 1
             if opts.grid_save:
-                images.save_image(grid, p.outpath_grids, "grid", p.all_seeds[0], p.all_prompts[0], opts.grid_format, info=infotext(use_main_prompt=True), short_filename=not opts.grid_extended_filename, p=p, grid=True)
+                images.save_image(grid, p.outpath_grids, "grid", p.all_seeds[0], p.all_prompts[0], opts.grid_format, info=infotext(use_main_prompt=True), short_filename=not opts.grid_extended_filename, p=p, grid=True, background=opts.save_images_in_background)
 
     if not p.disable_extra_networks and p.extra_network_data:
         extra_networks.deactivate(p, p.extra_network_data)
@@ -1379,7 +1448,7 @@ class StableDiffusionProcessingTxt2Img(StableDiffusionProcessing):
                 image = sd_samplers.sample_to_image(image, index, approximation=0)
 
             info = create_infotext(self, self.all_prompts, self.all_seeds, self.all_subseeds, [], iteration=self.iteration, position_in_batch=index)
-            images.save_image(image, self.outpath_samples, "", seeds[index], prompts[index], opts.samples_format, info=info, p=self, suffix="-before-highres-fix")
+            images.save_image(image, self.outpath_samples, "", seeds[index], prompts[index], opts.samples_format, info=info, p=self, suffix="-before-highres-fix", background=opts.save_images_in_background)
 
         img2img_sampler_name = self.hr_sampler_name or self.sampler_name
 
@@ -1,17 +1,16 @@
-import base64
-import io
 import time
 
 import gradio as gr
 from pydantic import BaseModel, Field
 
+from modules import live_previews
 from modules.shared import opts
 
 import modules.shared as shared
 from collections import OrderedDict
 import string
 import random
-from typing import List
+from typing import Dict, List
 
 current_task = None
 pending_tasks = OrderedDict()
@@ -33,6 +32,7 @@ def finish_task(id_task):
     if current_task == id_task:
         current_task = None
 
+    pending_tasks.pop(id_task, None)
     finished_tasks.append(id_task)
     if len(finished_tasks) > 16:
         finished_tasks.pop(0)
@@ -55,6 +55,13 @@ def add_task_to_queue(id_job):
 class PendingTasksResponse(BaseModel):
     size: int = Field(title="Pending task size")
     tasks: List[str] = Field(title="Pending task ids")
+    depth: Dict[str, int] = Field(default=None, title="Queued jobs", description="number of jobs waiting in the queue, by priority class")
+    oldest_wait: float = Field(default=None, title="Oldest wait", description="seconds the longest waiting job has been in the queue")
+    average_wait: float = Field(default=None, title="Average wait", description="average seconds jobs waited in the queue before starting")
+    jobs_started: int = Field(default=None, title="Jobs started")
+    jobs_coalesced: int = Field(default=None, title="Coalesced jobs", description="number of requests that were generated as part of another request's batch")
+    checkpoint_swaps: int = Field(default=None, title="Checkpoint swaps", description="number of jobs that finished with a different checkpoint loaded than they started with")
+    vae_swaps: int = Field(default=None, title="VAE swaps", description="number of jobs that finished with a different VAE loaded than they started with")
 
 class ProgressRequest(BaseModel):
     id_task: str = Field(default=None, title="Task ID", description="id of the task to get progress for")
@@ -79,9 +86,11 @@ def setup_progress_api(app):
 
 
 def get_pending_tasks():
+    from modules.call_queue import queue_lock
+
     pending_tasks_ids = list(pending_tasks)
     pending_len = len(pending_tasks_ids)
-    return PendingTasksResponse(size=pending_len, tasks=pending_tasks_ids)
+    return PendingTasksResponse(size=pending_len, tasks=pending_tasks_ids, **queue_lock.metrics())
 
 
 def progressapi(req: ProgressRequest):
@@ -121,21 +130,12 @@ def progressapi(req: ProgressRequest):
         if shared.state.id_live_preview != req.id_live_preview:
             image = shared.state.current_image
             if image is not None:
-                buffered = io.BytesIO()
-
-                if opts.live_previews_image_format == "png":
-                    # using optimize for large images takes an enormous amount of time
-                    if max(*image.size) <= 256:
-                        save_kwargs = {"optimize": True}
-                    else:
-                        save_kwargs = {"optimize": False, "compress_level": 1}
-
-                else:
-                    save_kwargs = {}
+                live_preview = shared.state.current_image_data
+                if live_preview is None:
+                    live_preview = live_previews.encode(live_previews.downscale(image))
+                    if shared.state.current_image is image:
+                        shared.state.current_image_data = live_preview
 
-                image.save(buffered, format=opts.live_previews_image_format, **save_kwargs)
-                base64_image = base64.b64encode(buffered.getvalue()).decode('ascii')
-                live_preview = f"data:image/{opts.live_previews_image_format};base64,{base64_image}"
                 id_live_preview = shared.state.id_live_preview
 
     return ProgressResponse(active=active, queued=queued, completed=completed, progress=progress, eta=eta, live_preview=live_preview, id_live_preview=id_live_preview, textinfo=shared.state.textinfo)
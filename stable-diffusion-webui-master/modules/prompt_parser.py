@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import re
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
 import lark
 
 # a prompt like this: "fantasy landscape with a [mountain:lake:0.25] and [an oak:a christmas tree:0.75][ in foreground::0.6][: in background:0.25] [shoddy:masterful:0.5]"
@@ -63,6 +65,63 @@ def get_learned_conditioning_prompt_schedules(prompts, base_steps, hires_steps=N
     [[5, 'a  c'], [10, 'a b c']]
     """
 
+    promptdict = {prompt: [list(x) for x in get_prompt_schedule(prompt, base_steps, hires_steps, use_old_scheduling)] for prompt in set(prompts)}
+    return [promptdict[prompt] for prompt in prompts]
+
+
+@lru_cache(maxsize=1024)
+def compile_prompt(prompt):
+    """
+    Parses a prompt into a tuple of segments, or returns None if it can't be parsed. A segment is one of:
+    - a literal string (adjacent literals are merged),
+    - ("scheduled", number, before, after), where number is the schedule's step as written in the prompt,
+    - ("alternate", options).
+    before, after and each of options are tuples of segments themselves.
+
+    >>> compile_prompt("a [b:c:0.5] (d:1.1)")
+    ('a ', ('scheduled', '0.5', ('b',), ('c',)), ' (d:1.1)')
+    >>> compile_prompt("[fe|]male")
+    (('alternate', (('fe',), ())), 'male')
+    """
+
+    try:
+        tree = schedule_parser.parse(prompt)
+    except lark.exceptions.LarkError:
+        return None
+
+    return compile_segments(tree.children)
+
+
+def compile_segments(children):
+    segments = []
+
+    def add(segment):
+        if isinstance(segment, str) and segments and isinstance(segments[-1], str):
+            segments[-1] += segment
+        else:
+            segments.append(segment)
+
+    for child in children:
+        if isinstance(child, lark.Token):
+            add(str(child))
+        elif child.data == 'plain':
+            add(str(child.children[0]))
+        elif child.data == 'scheduled':
+            before, after, _, number, _ = child.children
+            add(('scheduled', str(number), compile_segments(before.children) if before else (), compile_segments(after.children)))
+        elif child.data == 'alternate':
+            add(('alternate', tuple(compile_segments(option.children) if option else () for option in child.children)))
+        else:
+            for segment in compile_segments(child.children):
+                add(segment)
+
+    return tuple(segments)
+
+
+@lru_cache(maxsize=1024)
+def get_prompt_schedule(prompt, base_steps, hires_steps=None, use_old_scheduling=False):
+    """Returns the schedule for a single prompt as a tuple of (end_at_step, text) pairs; see get_learned_conditioning_prompt_schedules"""
+
     if hires_steps is None or use_old_scheduling:
         int_offset = 0
         flt_offset = 0
@@ -72,65 +131,60 @@ def get_learned_conditioning_prompt_schedules(prompts, base_steps, hires_steps=N
         flt_offset = 1.0
         steps = hires_steps
 
-    def collect_steps(steps, tree):
-        res = [steps]
+    segments = compile_prompt(prompt)
+    if segments is None:
+        return ((steps, prompt),)
+
+    boundaries = {steps}
+
+    def resolve(segments):
+        """converts schedule numbers into steps and collects the steps at which the prompt changes"""
 
-        class CollectSteps(lark.Visitor):
-            def scheduled(self, tree):
-                s = tree.children[-2]
-                v = float(s)
+        resolved = []
+        for segment in segments:
+            if isinstance(segment, str):
+                resolved.append(segment)
+            elif segment[0] == 'scheduled':
+                _, number, before, after = segment
+                v = float(number)
                 if use_old_scheduling:
                     v = v*steps if v<1 else v
                 else:
-                    if "." in s:
+                    if "." in number:
                         v = (v - flt_offset) * steps
                     else:
                         v = (v - int_offset)
-                tree.children[-2] = min(steps, int(v))
-                if tree.children[-2] >= 1:
-                    res.append(tree.children[-2])
-
-            def alternate(self, tree):
-                res.extend(range(1, steps+1))
-
-        CollectSteps().visit(tree)
-        return sorted(set(res))
-
-    def at_step(step, tree):
-        class AtStep(lark.Transformer):
-            def scheduled(self, args):
-                before, after, _, when, _ = args
-                yield before or () if step <= when else after
-            def alternate(self, args):
-                args = ["" if not arg else arg for arg in args]
-                yield args[(step - 1) % len(args)]
-            def start(self, args):
-                def flatten(x):
-                    if isinstance(x, str):
-                        yield x
-                    else:
-                        for gen in x:
-                            yield from flatten(gen)
-                return ''.join(flatten(args))
-            def plain(self, args):
-                yield args[0].value
-            def __default__(self, data, children, meta):
-                for child in children:
-                    yield child
-        return AtStep().transform(tree)
-
-    def get_schedule(prompt):
-        try:
-            tree = schedule_parser.parse(prompt)
-        except lark.exceptions.LarkError:
-            if 0:
-                import traceback
-                traceback.print_exc()
-            return [[steps, prompt]]
-        return [[t, at_step(t, tree)] for t in collect_steps(steps, tree)]
-
-    promptdict = {prompt: get_schedule(prompt) for prompt in set(prompts)}
-    return [promptdict[prompt] for prompt in prompts]
+                when = min(steps, int(v))
+                if when >= 1:
+                    boundaries.add(when)
+                resolved.append(('scheduled', when, resolve(before), resolve(after)))
+            else:
+                boundaries.update(range(1, steps + 1))
+                resolved.append(('alternate', [resolve(option) for option in segment[1]]))
+
+        return resolved
+
+    def render(segments, step, out):
+        for segment in segments:
+            if isinstance(segment, str):
+                out.append(segment)
+            elif segment[0] == 'scheduled':
+                render(segment[2] if step <= segment[1] else segment[3], step, out)
+            else:
+                options = segment[1]
+                render(options[(step - 1) % len(options)], step, out)
+
+    segments = resolve(segments)
+    if len(boundaries) == 1 and all(isinstance(segment, str) for segment in segments):
+        return ((steps, ''.join(segments)),)
+
+    schedule = []
+    for step in sorted(boundaries):
+        out = []
+        render(segments, step, out)
+        schedule.append((step, ''.join(out)))
+
+    return tuple(schedule)
 
 
 ScheduledPromptConditioning = namedtuple("ScheduledPromptConditioning", ["end_at_step", "cond"])
@@ -154,6 +208,80 @@ class SdConditioning(list):
 
 
 
+class TextEncoderCache:
+    """
+    LRU cache of text encoder outputs for individual texts, shared between generations and bounded by memory use.
+
+    It is only consulted inside activated(), where the caller supplies everything other than the text that affects
+    the encoder output (checkpoint, CLIP skip, emphasis mode, loaded TI/LoRA state); outside of it nothing is cached.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.state = None
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def activated(self, state, max_bytes):
+        self.state = state
+        self.max_bytes = max_bytes
+        self.evict()
+
+        try:
+            yield
+        finally:
+            self.state = None
+
+    def key(self, texts, text):
+        if self.state is None or self.max_bytes <= 0:
+            return None
+
+        return self.state, text, getattr(texts, 'is_negative_prompt', False), getattr(texts, 'width', None), getattr(texts, 'height', None)
+
+    def get(self, key):
+        if key is None:
+            return None
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, cond):
+        if key is None or key in self.entries:
+            return
+
+        # cond is usually a slice of the batch's output; a copy doesn't keep the whole batch alive, so size is honest
+        if isinstance(cond, dict):
+            cond = {k: v.clone() for k, v in cond.items()}
+        else:
+            cond = cond.clone()
+
+        size = sum(x.element_size() * x.nelement() for x in (cond.values() if isinstance(cond, dict) else [cond]))
+        self.entries[key] = (cond, size)
+        self.total_bytes += size
+        self.evict()
+
+    def evict(self):
+        while self.entries and self.total_bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+
+text_encoder_cache = TextEncoderCache()
+
+
 def get_learned_conditioning(model, prompts: SdConditioning | list[str], steps, hires_steps=None, use_old_scheduling=False):
     """converts a list of prompts into a list of prompt schedules - each schedule is a list of ScheduledPromptConditioning, specifying the comdition (cond),
     and the sampling step at which this condition is to be replaced by the next one.
@@ -184,17 +312,26 @@ def get_learned_conditioning(model, prompts: SdConditioning | list[str], steps,
             res.append(cached)
             continue
 
-        texts = SdConditioning([x[1] for x in prompt_schedule], copy_from=prompts)
-        conds = model.get_learned_conditioning(texts)
+        # schedules with alternation repeat the same few texts for every step; encode each distinct text only once
+        conds_for_texts = {}
+        for text in dict.fromkeys(x[1] for x in prompt_schedule):
+            conds_for_texts[text] = text_encoder_cache.get(text_encoder_cache.key(prompts, text))
 
-        cond_schedule = []
-        for i, (end_at_step, _) in enumerate(prompt_schedule):
-            if isinstance(conds, dict):
-                cond = {k: v[i] for k, v in conds.items()}
-            else:
-                cond = conds[i]
+        missing = [text for text, cond in conds_for_texts.items() if cond is None]
+        if missing:
+            texts = SdConditioning(missing, copy_from=prompts)
+            conds = model.get_learned_conditioning(texts)
+
+            for i, text in enumerate(missing):
+                if isinstance(conds, dict):
+                    cond = {k: v[i] for k, v in conds.items()}
+                else:
+                    cond = conds[i]
+
+                conds_for_texts[text] = cond
+                text_encoder_cache.put(text_encoder_cache.key(prompts, text), cond)
 
-            cond_schedule.append(ScheduledPromptConditioning(end_at_step, cond))
+        cond_schedule = [ScheduledPromptConditioning(end_at_step, conds_for_texts[text]) for end_at_step, text in prompt_schedule]
 
         cache[prompt] = cond_schedule
         res.append(cond_schedule)
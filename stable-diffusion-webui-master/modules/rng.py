@@ -109,9 +109,30 @@ class ImageRNG:
 
         self.is_first = True
 
+    def first_batched(self):
+        """Same as first() for NV source without seed resizing, generating noise for all seeds at once."""
+
+        noise = torch.asarray(rng_philox.randn_batch(self.generators, self.shape), device=devices.device)
+
+        if self.subseeds is not None and self.subseed_strength != 0:
+            subseeds = [0 if i >= len(self.subseeds) else self.subseeds[i] for i in range(len(self.seeds))]
+            subnoise = torch.asarray(rng_philox.randn_many(subseeds, [0] * len(subseeds), self.shape), device=devices.device)
+            noise = torch.stack([slerp(self.subseed_strength, x, sub) for x, sub in zip(noise, subnoise)])
+
+        # leave the global generator in the same state as generating noise for one seed at a time does
+        if self.seeds:
+            manual_seed(self.seeds[-1])
+
+        return noise
+
     def first(self):
         noise_shape = self.shape if self.seed_resize_from_h <= 0 or self.seed_resize_from_w <= 0 else (self.shape[0], int(self.seed_resize_from_h) // 8, int(self.seed_resize_from_w // 8))
 
+        if shared.opts.randn_source == "NV" and noise_shape == self.shape:
+            noise = self.first_batched()
+            self.create_eta_generators()
+            return noise.to(shared.device)
+
         xs = []
 
         for i, (seed, generator) in enumerate(zip(self.seeds, self.generators)):
@@ -144,17 +165,23 @@ class ImageRNG:
 
             xs.append(noise)
 
+        self.create_eta_generators()
+
+        return torch.stack(xs).to(shared.device)
+
+    def create_eta_generators(self):
         eta_noise_seed_delta = shared.opts.eta_noise_seed_delta or 0
         if eta_noise_seed_delta:
             self.generators = [create_generator(seed + eta_noise_seed_delta) for seed in self.seeds]
 
-        return torch.stack(xs).to(shared.device)
-
     def next(self):
         if self.is_first:
             self.is_first = False
             return self.first()
 
+        if shared.opts.randn_source == "NV":
+            return torch.asarray(rng_philox.randn_batch(self.generators, self.shape), device=devices.device).to(shared.device)
+
         xs = []
         for generator in self.generators:
             x = randn_without_seed(self.shape, generator=generator)
@@ -15,6 +15,10 @@ Expected output:
 ```
 """
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 philox_m = [0xD2511F53, 0xCD9E8D57]
@@ -74,6 +78,123 @@ def box_muller(x, y):
     return r1.astype(np.float32)
 
 
+def philox4_32_many(offsets, key_lo, key_hi, start, stop, rounds=10):
+    """Same as philox4_32 for counters (offset, 0, i, 0) with i in range(start, stop), for many rows at once.
+
+    All rounds run on whole arrays: halves of 64-bit products are used through strided 32-bit views without copying,
+    and values that are the same for a whole row or column (offsets, keys, the initial counter) are broadcast instead
+    of repeated.
+
+    Parameters:
+        offsets (numpy.ndarray): (N,) np.uint32 array of offsets, one per row.
+        key_lo (numpy.ndarray): (N,) np.uint32 array with lower halves of keys (seeds).
+        key_hi (numpy.ndarray): (N,) np.uint32 array with upper halves of keys.
+        start, stop (int): range of the counter's third number.
+        rounds (int): The number of rounds to perform.
+
+    Returns:
+        tuple: two (N, stop - start) np.uint32 arrays with the first two numbers of the generated four.
+    """
+
+    m0, m1 = np.uint64(philox_m[0]), np.uint64(philox_m[1])
+    w0, w1 = np.uint32(philox_w[0]), np.uint32(philox_w[1])
+
+    c0 = offsets[:, None]
+    c1 = np.zeros((1, 1), dtype=np.uint32)
+    c2 = np.arange(start, stop, dtype=np.uint32)[None, :]  # up to 2^32 numbers can be generated
+    c3 = c1
+    k0 = key_lo[:, None]
+    k1 = key_hi[:, None]
+
+    for i in range(rounds):
+        if i > 0:
+            k0 = k0 + w0
+            k1 = k1 + w1
+
+        p0 = c0.astype(np.uint64)
+        p0 *= m0
+        p1 = c2.astype(np.uint64)
+        p1 *= m1
+
+        # lower and upper halves of products, like in uint32()
+        v0 = p0.view(np.uint32)
+        v1 = p1.view(np.uint32)
+
+        c0, c1, c2, c3 = v1[:, 1::2] ^ c1 ^ k0, v1[:, 0::2], v0[:, 1::2] ^ c3 ^ k1, v0[:, 0::2]
+
+    return np.broadcast_to(c0, (len(offsets), stop - start)), np.broadcast_to(c1, (len(offsets), stop - start))
+
+
+block_size = 1 << 15
+"""randn_many generates numbers in blocks of about this many, so that intermediate arrays stay in CPU cache"""
+
+threads = max(1, min(4, os.cpu_count() or 1))
+"""number of threads randn_many uses for blocks"""
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the thread pool used by randn_many, creating it on first use"""
+
+    global executor
+
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="rng-philox")
+
+        return executor
+
+
+def randn_many(seeds, offsets, shape):
+    """Generates standard normal random variables for many (seed, offset) pairs at once.
+
+    Returns an np.float32 array of shape (len(seeds), *shape), where element i is exactly what Generator(seeds[i]) with
+    its offset at offsets[i] would return from randn(shape). Numbers are generated in blocks of columns, on several
+    threads if there is more than one block.
+    """
+
+    n = 1
+    for x in shape:
+        n *= x
+
+    seeds = np.array(seeds, dtype=np.uint64).reshape(-1)
+    key_lo = (seeds & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    key_hi = (seeds >> np.uint64(32)).astype(np.uint32)
+    offsets = np.array(offsets, dtype=np.uint64).reshape(-1).astype(np.uint32)
+
+    res = np.empty((len(seeds), n), dtype=np.float32)
+
+    def generate(start, stop):
+        g0, g1 = philox4_32_many(offsets, key_lo, key_hi, start, stop)
+        res[:, start:stop] = box_muller(g0, g1)
+
+    columns = max(1, block_size // max(1, len(seeds)))
+    blocks = [(start, min(n, start + columns)) for start in range(0, n, columns)]
+
+    if threads == 1 or len(blocks) < 2:
+        for start, stop in blocks:
+            generate(start, stop)
+    else:
+        pool = get_executor()
+        for future in [pool.submit(generate, start, stop) for start, stop in blocks]:
+            future.result()
+
+    return res.reshape((len(seeds), *shape))
+
+
+def randn_batch(generators, shape):
+    """Same as stacking generator.randn(shape) for generators, computed in one pass."""
+
+    res = randn_many([g.seed for g in generators], [g.offset for g in generators], shape)
+
+    for g in generators:
+        g.offset += 1
+
+    return res
+
+
 class Generator:
     """RNG that produces same outputs as torch.randn(..., device='cuda') on CPU"""
 
@@ -84,19 +205,4 @@ class Generator:
     def randn(self, shape):
         """Generate a sequence of n standard normal random variables using the Philox 4x32 random number generator and the Box-Muller transform."""
 
-        n = 1
-        for x in shape:
-            n *= x
-
-        counter = np.zeros((4, n), dtype=np.uint32)
-        counter[0] = self.offset
-        counter[2] = np.arange(n, dtype=np.uint32)  # up to 2^32 numbers can be generated - if you want more you'd need to spill into counter[3]
-        self.offset += 1
-
-        key = np.empty(n, dtype=np.uint64)
-        key.fill(self.seed)
-        key = uint32(key)
-
-        g = philox4_32(counter, key)
-
-        return box_muller(g[0], g[1]).reshape(shape)  # discard g[2] and g[3]
+        return randn_batch([self], shape)[0]
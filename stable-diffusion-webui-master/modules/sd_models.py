@@ -176,6 +176,9 @@ def list_models():
         checkpoint_info = CheckpointInfo(filename)
         checkpoint_info.register()
 
+        if checkpoint_info.sha256 is None:
+            hashes.sha256_in_background(checkpoint_info.filename, f"checkpoint/{checkpoint_info.name}")
+
 
 re_strip_checksum = re.compile(r"\s*\[[^]]+]\s*$")
 
@@ -34,15 +34,23 @@ def setup_img2img_steps(p, steps=None):
 approximation_indexes = {"Full": 0, "Approx NN": 1, "Approx cheap": 2, "TAESD": 3}
 
 
+def live_preview_approximation():
+    """Returns the index of the approximation used for live previews, according to settings."""
+
+    approximation = approximation_indexes.get(opts.show_progress_type, 0)
+
+    from modules import lowvram
+    if approximation == 0 and lowvram.is_enabled(shared.sd_model) and not shared.opts.live_preview_allow_lowvram_full:
+        approximation = 1
+
+    return approximation
+
+
 def samples_to_images_tensor(sample, approximation=None, model=None):
     """Transforms 4-channel latent space images into 3-channel RGB image tensors, with values in range [-1, 1]."""
 
     if approximation is None or (shared.state.interrupted and opts.live_preview_fast_interrupt):
-        approximation = approximation_indexes.get(opts.show_progress_type, 0)
-
-        from modules import lowvram
-        if approximation == 0 and lowvram.is_enabled(shared.sd_model) and not shared.opts.live_preview_allow_lowvram_full:
-            approximation = 1
+        approximation = live_preview_approximation()
 
     if approximation == 2:
         x_sample = sd_vae_approx.cheap_approximation(sample)
@@ -116,8 +124,9 @@ def store_latent(decoded):
     state.current_latent = decoded
 
     if opts.live_previews_enable and opts.show_progress_every_n_steps > 0 and shared.state.sampling_step % opts.show_progress_every_n_steps == 0:
+        # with parallel processing, previews are only made when a client asks for progress (see State.set_current_image)
         if not shared.parallel_processing_allowed:
-            shared.state.assign_current_image(sample_to_image(decoded))
+            shared.state.do_set_current_image()
 
 
 def is_sampler_using_eta_noise_seed_delta(p):
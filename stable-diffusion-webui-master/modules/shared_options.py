@@ -37,6 +37,7 @@ options_templates.update(options_section(('saving-images', "Saving images/grids"
     "samples_filename_pattern": OptionInfo("", "Images filename pattern", component_args=hide_dirs).link("wiki", "https://github.com/AUTOMATIC1111/stable-diffusion-webui/wiki/Custom-Images-Filename-Name-and-Subdirectory"),
     "save_images_add_number": OptionInfo(True, "Add number to filename when saving", component_args=hide_dirs),
     "save_images_replace_action": OptionInfo("Replace", "Saving the image to an existing file", gr.Radio, {"choices": ["Replace", "Add number suffix"], **hide_dirs}),
+    "save_images_in_background": OptionInfo(True, "Save generated images in background").info("generation continues while images are being written; files appear shortly after"),
     "grid_save": OptionInfo(True, "Always save all generated image grids"),
     "grid_format": OptionInfo('png', 'File format for grids'),
     "grid_extended_filename": OptionInfo(False, "Add extended info (seed, prompt) to filename when saving grid"),
@@ -103,6 +104,7 @@ options_templates.update(options_section(('upscaling', "Upscaling", "postprocess
     "dat_enabled_models": OptionInfo(["DAT x2", "DAT x3", "DAT x4"], "Select which DAT models to show in the web UI.", gr.CheckboxGroup, lambda: {"choices": shared_items.dat_models_names()}),
     "DAT_tile": OptionInfo(192, "Tile size for DAT upscalers.", gr.Slider, {"minimum": 0, "maximum": 512, "step": 16}).info("0 = no tiling"),
     "DAT_tile_overlap": OptionInfo(8, "Tile overlap for DAT upscalers.", gr.Slider, {"minimum": 0, "maximum": 48, "step": 1}).info("Low values = visible seam"),
+    "upscaler_tile_batch_size": OptionInfo(4, "Number of tiles to upscale at once", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}).info("higher is faster but uses more VRAM; halved automatically when out of memory"),
     "upscaler_for_img2img": OptionInfo(None, "Upscaler for img2img", gr.Dropdown, lambda: {"choices": [x.name for x in shared.sd_upscalers]}),
     "set_scale_by_when_changing_upscaler": OptionInfo(False, "Automatically set the Scale by factor based on the name of the selected Upscaler."),
 }))
@@ -126,6 +128,11 @@ options_templates.update(options_section(('system', "System", "system"), {
     "print_hypernet_extra": OptionInfo(False, "Print extra hypernetwork information to console."),
     "list_hidden_files": OptionInfo(True, "Load models/files in hidden directories").info("directory is hidden if its name starts with \".\""),
     "disable_mmap_load_safetensors": OptionInfo(False, "Disable memmapping for loading .safetensors files.").info("fixes very slow loading speed in some cases"),
+    "hash_models_in_background": OptionInfo(False, "Calculate hashes of checkpoints and LoRA networks in the background").info("files without a known hash are hashed after startup or refresh; reads the whole model collection from disk once"),
+    "hash_threads": OptionInfo(2, "Threads for calculating hashes", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}).info("more threads help on SSDs; use 1 for hard drives"),
+    "queue_affinity_window": OptionInfo(30, "Longest time a queued job can be passed over for jobs that use the loaded checkpoint and VAE or have higher priority", gr.Slider, {"minimum": 0, "maximum": 300, "step": 5}).info("seconds; 0 = run jobs strictly in order of arrival"),
+    "queue_max_pending_per_client": OptionInfo(16, "Maximum number of queued API requests from one client", gr.Number, {"precision": 0}).info("0 = no limit"),
+    "queue_coalesce_batch_size": OptionInfo(1, "Maximum number of queued API txt2img requests to generate together as one batch", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}).info("requests that only differ in prompt and seed; 1 = disable; images can differ slightly from ones generated alone"),
     "hide_ldm_prints": OptionInfo(True, "Prevent Stability-AI's ldm/sgm modules from printing noise to console."),
     "dump_stacks_on_signal": OptionInfo(False, "Print stack traces before exiting the program with ctrl+c."),
 }))
@@ -150,6 +157,9 @@ options_templates.update(options_section(('API', "API", "system"), {
     "api_enable_requests": OptionInfo(True, "Allow http:// and https:// URLs for input images in API", restrict_api=True),
     "api_forbid_local_requests": OptionInfo(True, "Forbid URLs to local resources", restrict_api=True),
     "api_useragent": OptionInfo("", "User agent for requests", restrict_api=True),
+    "api_jobs_ttl": OptionInfo(24, "Hours to keep results of asynchronous API jobs", gr.Number).info("/sdapi/v1/jobs; results are kept in api-jobs.sqlite in the data directory"),
+    "api_jobs_max_stored": OptionInfo(100, "Maximum number of finished asynchronous API jobs to keep", gr.Number, {"precision": 0}),
+    "api_jobs_callbacks": OptionInfo(True, "Allow callback URLs for asynchronous API jobs", restrict_api=True),
 }))
 
 options_templates.update(options_section(('training', "Training", "training"), {
@@ -157,6 +167,9 @@ options_templates.update(options_section(('training', "Training", "training"), {
     "pin_memory": OptionInfo(False, "Turn on pin_memory for DataLoader. Makes training slightly faster but can increase memory usage."),
     "save_optimizer_state": OptionInfo(False, "Saves Optimizer state as separate *.optim file. Training of embedding or HN can be resumed with the matching optim file."),
     "save_training_settings_to_txt": OptionInfo(True, "Save textual inversion and hypernet settings to a text file whenever training starts."),
+    "training_dataset_threads": OptionInfo(4, "Number of threads for reading dataset images", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}),
+    "training_vae_encode_batch_size": OptionInfo(4, "Batch size for VAE encoding of dataset images", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}).info("larger is faster but uses more VRAM"),
+    "training_cache_latents": OptionInfo(True, "Cache VAE latents of dataset images on disk").info("training again on the same images with the same VAE skips encoding them"),
     "dataset_filename_word_regex": OptionInfo("", "Filename word regex"),
     "dataset_filename_join_string": OptionInfo(" ", "Filename join string"),
     "training_image_repeats_per_epoch": OptionInfo(1, "Number of repeats for a single input image per epoch; used only for displaying epoch number", gr.Number, {"precision": 0}),
@@ -210,6 +223,7 @@ For img2img, VAE is used to process user's input image before the sampling, and
     "auto_vae_precision": OptionInfo(True, "Automatically revert VAE to 32-bit floats").info("triggers when a tensor with NaNs is produced in VAE; disabling the option in this case will result in a black square image"),
     "sd_vae_encode_method": OptionInfo("Full", "VAE type for encode", gr.Radio, {"choices": ["Full", "TAESD"]}, infotext='VAE Encoder').info("method to encode image to latent (use in img2img, hires-fix or inpaint mask)"),
     "sd_vae_decode_method": OptionInfo("Full", "VAE type for decode", gr.Radio, {"choices": ["Full", "TAESD"]}, infotext='VAE Decoder').info("method to decode latent to image"),
+    "sd_vae_decode_batch_size": OptionInfo(1, "Maximum number of images to decode with VAE at once", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}).info("fewer are decoded at once if they do not fit into free memory; more than 1 can be faster on GPU, but images are not bit-identical to ones decoded one at a time"),
 }))
 
 options_templates.update(options_section(('img2img', "img2img", "sd"), {
@@ -239,6 +253,7 @@ options_templates.update(options_section(('optimizations', "Optimizations", "sd"
     "pad_cond_uncond": OptionInfo(False, "Pad prompt/negative prompt", infotext='Pad conds').info("improves performance when prompt and negative prompt have different lengths; changes seeds"),
     "pad_cond_uncond_v0": OptionInfo(False, "Pad prompt/negative prompt (v0)", infotext='Pad conds v0').info("alternative implementation for the above; used prior to 1.6.0 for DDIM sampler; overrides the above if set; WARNING: truncates negative prompt if it's too long; changes seeds"),
     "persistent_cond_cache": OptionInfo(True, "Persistent cond cache").info("do not recalculate conds from prompts if prompts have not changed since previous calculation"),
+    "text_encoder_cache_mb": OptionInfo(64, "Text encoder cache size (MB)", gr.Slider, {"minimum": 0, "maximum": 2048, "step": 16}).info("remember text encoder outputs for recently used prompts across generations; 0=disable; unused when persistent cond cache is off"),
     "batch_cond_uncond": OptionInfo(True, "Batch cond/uncond").info("do both conditional and unconditional denoising in one batch; uses a bit more VRAM during sampling, but improves speed; previously this was controlled by --always-batch-cond-uncond commandline argument"),
     "fp8_storage": OptionInfo("Disable", "FP8 weight", gr.Radio, {"choices": ["Disable", "Enable for SDXL", "Enable"]}).info("Use FP8 to store Linear/Conv layers' weight. Require pytorch>=2.1.0."),
     "cache_fp16_weight": OptionInfo(False, "Cache FP16 weight for LoRA").info("Cache fp16 weight when enabling FP8, will increase the quality of LoRA. Use more system ram."),
@@ -263,6 +278,7 @@ options_templates.update(options_section(('interrogate', "Interrogate"), {
     "interrogate_clip_min_length": OptionInfo(24, "BLIP: minimum description length", gr.Slider, {"minimum": 1, "maximum": 128, "step": 1}),
     "interrogate_clip_max_length": OptionInfo(48, "BLIP: maximum description length", gr.Slider, {"minimum": 1, "maximum": 256, "step": 1}),
     "interrogate_clip_dict_limit": OptionInfo(1500, "CLIP: maximum number of lines in text file").info("0 = No limit"),
+    "interrogate_batch_size": OptionInfo(8, "CLIP: batch size for interrogating a directory of images", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}),
     "interrogate_clip_skip_categories": OptionInfo([], "CLIP: skip inquire categories", gr.CheckboxGroup, lambda: {"choices": interrogate.category_types()}, refresh=interrogate.category_types),
     "interrogate_deepbooru_score_threshold": OptionInfo(0.5, "deepbooru: score threshold", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01}),
     "deepbooru_sort_alpha": OptionInfo(True, "deepbooru: sort tags alphabetically").info("if not: sort by score"),
@@ -281,6 +297,8 @@ options_templates.update(options_section(('extra_networks', "Extra Networks", "s
     "extra_networks_card_text_scale": OptionInfo(1.0, "Card text scale", gr.Slider, {"minimum": 0.0, "maximum": 2.0, "step": 0.01}).info("1 = original size"),
     "extra_networks_card_show_desc": OptionInfo(True, "Show description on card"),
     "extra_networks_card_description_is_html": OptionInfo(False, "Treat card description as HTML"),
+    "extra_networks_thumbnail_size": OptionInfo("512", "Size of previews on Extra Networks cards", gr.Radio, {"choices": ["Original", "256", "512", "1024"]}).info("previews are downscaled to fit into a square of this size, converted to WEBP and kept in cache directory"),
+    "extra_networks_virtual_cards": OptionInfo(False, "Load Extra Networks cards as they are scrolled into view").info("for large collections; searching and sorting is done on the server"),
     "extra_networks_card_order_field": OptionInfo("Path", "Default order field for Extra Networks cards", gr.Dropdown, {"choices": ['Path', 'Name', 'Date Created', 'Date Modified']}).needs_reload_ui(),
     "extra_networks_card_order": OptionInfo("Ascending", "Default order for Extra Networks cards", gr.Dropdown, {"choices": ['Ascending', 'Descending']}).needs_reload_ui(),
     "extra_networks_tree_view_style": OptionInfo("Dirs", "Extra Networks directory view style", gr.Radio, {"choices": ["Tree", "Dirs"]}).needs_reload_ui(),
@@ -289,6 +307,7 @@ options_templates.update(options_section(('extra_networks', "Extra Networks", "s
     "extra_networks_add_text_separator": OptionInfo(" ", "Extra networks separator").info("extra text to add before <...> when adding extra network to prompt"),
     "ui_extra_networks_tab_reorder": OptionInfo("", "Extra networks tab order").needs_reload_ui(),
     "textual_inversion_print_at_load": OptionInfo(False, "Print a list of Textual Inversion embeddings when loading model"),
+    "textual_inversion_load_in_background": OptionInfo(True, "Load new Textual Inversion embeddings in background").info("files added to the embeddings directory are picked up without delaying generation; they can be used once loaded"),
     "textual_inversion_add_hashes_to_infotext": OptionInfo(True, "Add Textual Inversion hashes to infotext"),
     "sd_hypernetwork": OptionInfo("None", "Add hypernetwork to prompt", gr.Dropdown, lambda: {"choices": ["None", *shared.hypernetworks]}, refresh=shared_items.reload_hypernetworks),
 }))
@@ -373,6 +392,8 @@ options_templates.update(options_section(('ui', "Live previews", "ui"), {
     "show_progressbar": OptionInfo(True, "Show progressbar"),
     "live_previews_enable": OptionInfo(True, "Show live previews of the created image"),
     "live_previews_image_format": OptionInfo("png", "Live preview file format", gr.Radio, {"choices": ["jpeg", "png", "webp"]}),
+    "live_previews_max_resolution": OptionInfo(1024, "Live preview maximum resolution", gr.Slider, {"minimum": 0, "maximum": 2048, "step": 64}).info("in pixels - larger previews are downscaled before they are sent to the browser; 0 = no limit"),
+    "live_previews_decode_period": OptionInfo(250, "Minimum time between live preview decodes", gr.Slider, {"minimum": 0, "maximum": 5000, "step": 50}).info("in milliseconds - previews are decoded in the background; a newer latent replaces one that is waiting to be decoded"),
     "show_progress_grid": OptionInfo(True, "Show previews of all images generated in a batch as a grid"),
     "show_progress_every_n_steps": OptionInfo(10, "Live preview display period", gr.Slider, {"minimum": -1, "maximum": 32, "step": 1}).info("in sampling steps - show new live preview image every N sampling steps; -1 = only show after completion of batch"),
     "show_progress_type": OptionInfo("Approx NN", "Live preview method", gr.Radio, {"choices": ["Full", "Approx NN", "Approx cheap", "TAESD"]}).info("Full = slow but pretty; Approx NN and TAESD = fast but low quality; Approx cheap = super fast but terrible otherwise"),
@@ -414,6 +435,8 @@ options_templates.update(options_section(('postprocessing', "Postprocessing", "p
     'postprocessing_disable_in_extras': OptionInfo([], "Disable postprocessing operations in extras tab", ui_components.DropdownMulti, lambda: {"choices": [x.name for x in shared_items.postprocessing_scripts()]}),
     'postprocessing_operation_order': OptionInfo([], "Postprocessing operation order", ui_components.DropdownMulti, lambda: {"choices": [x.name for x in shared_items.postprocessing_scripts()]}),
     'upscaling_max_images_in_cache': OptionInfo(5, "Maximum number of images in upscaling cache", gr.Slider, {"minimum": 0, "maximum": 10, "step": 1}),
+    'postprocessing_read_threads': OptionInfo(4, "Threads for reading images in batch postprocessing", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
+    'postprocessing_batch_size': OptionInfo(4, "Images read ahead in batch postprocessing", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}).info("the next batch of this many images is read while the current one is processed; results are written in background"),
     'postprocessing_existing_caption_action': OptionInfo("Ignore", "Action for existing captions", gr.Radio, {"choices": ["Ignore", "Keep", "Prepend", "Append"]}).info("when generating captions using postprocessing; Ignore = use generated; Keep = use original; Prepend/Append = combine both"),
 }))
 
@@ -22,6 +22,7 @@ class State:
     sampling_steps = 0
     current_latent = None
     current_image = None
+    current_image_data = None
     current_image_sampling_step = 0
     id_live_preview = 0
     textinfo = None
@@ -108,6 +109,8 @@ class State:
         return obj
 
     def begin(self, job: str = "(unknown)"):
+        from modules import live_previews
+
         self.sampling_step = 0
         self.time_start = time.time()
         self.job_count = -1
@@ -116,6 +119,7 @@ class State:
         self.job_timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         self.current_latent = None
         self.current_image = None
+        self.current_image_data = None
         self.current_image_sampling_step = 0
         self.id_live_preview = 0
         self.skipped = False
@@ -123,6 +127,7 @@ class State:
         self.stopping_generation = False
         self.textinfo = None
         self.job = job
+        live_previews.worker.reset()
         devices.torch_gc()
         log.info("Starting job %s", job)
 
@@ -135,7 +140,7 @@ class State:
         devices.torch_gc()
 
     def set_current_image(self):
-        """if enough sampling steps have been made after the last call to this, sets self.current_image from self.current_latent, and modifies self.id_live_preview accordingly"""
+        """if enough sampling steps have been made after the last call to this, sends self.current_latent to the live preview worker, which later sets self.current_image and modifies self.id_live_preview accordingly"""
         if not shared.parallel_processing_allowed:
             return
 
@@ -147,7 +152,15 @@ class State:
             return
 
         import modules.sd_samplers
+        from modules import live_previews, sd_samplers_common
+
+        if shared.parallel_processing_allowed or sd_samplers_common.live_preview_approximation() != 0:
+            live_previews.worker.submit(self.current_latent)
+            self.current_image_sampling_step = self.sampling_step
+            return
 
+        # with lowvram, parts of the model are moved between devices as they are used, so the full VAE
+        # can only be used from the thread that runs the model
         try:
             if shared.opts.show_progress_grid:
                 self.assign_current_image(modules.sd_samplers.samples_to_image_grid(self.current_latent))
@@ -161,8 +174,10 @@ class State:
             # we silently ignore this error
             errors.record_exception()
 
-    def assign_current_image(self, image):
+    def assign_current_image(self, image, data=None):
+        """sets self.current_image; data is the image encoded for the progress API, if it's already known"""
         if shared.opts.live_previews_image_format == 'jpeg' and image.mode in ('RGBA', 'P'):
             image = image.convert('RGB')
         self.current_image = image
+        self.current_image_data = data
         self.id_live_preview += 1
@@ -1,3 +1,5 @@
+import hashlib
+import io
 import os
 import numpy as np
 import PIL
@@ -5,11 +7,12 @@ import torch
 from torch.utils.data import Dataset, DataLoader, Sampler
 from torchvision import transforms
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from random import shuffle, choices
 
 import random
 import tqdm
-from modules import devices, shared, images
+from modules import devices, shared, images, cache, sd_vae
 import re
 
 from ldm.modules.distributions.distributions import DiagonalGaussianDistribution
@@ -54,87 +57,25 @@ class PersonalizedBase(Dataset):
         self.tag_drop_out = tag_drop_out
         groups = defaultdict(list)
 
-        print("Preparing dataset...")
-        for path in tqdm.tqdm(self.image_paths):
-            alpha_channel = None
-            if shared.state.interrupted:
-                raise Exception("interrupted")
-            try:
-                image = images.read(path)
-                #Currently does not work for single color transparency
-                #We would need to read image.info['transparency'] for that
-                if use_weight and 'A' in image.getbands():
-                    alpha_channel = image.getchannel('A')
-                image = image.convert('RGB')
-                if not varsize:
-                    image = image.resize((width, height), PIL.Image.BICUBIC)
-            except Exception:
-                continue
-
-            text_filename = f"{os.path.splitext(path)[0]}.txt"
-            filename = os.path.basename(path)
-
-            if os.path.exists(text_filename):
-                with open(text_filename, "r", encoding="utf8") as file:
-                    filename_text = file.read()
-            else:
-                filename_text = os.path.splitext(filename)[0]
-                filename_text = re.sub(re_numbers_at_start, '', filename_text)
-                if re_word:
-                    tokens = re_word.findall(filename_text)
-                    filename_text = (shared.opts.dataset_filename_join_string or "").join(tokens)
+        vae_hash = vae_identity(model) if shared.opts.training_cache_latents else None
+        latent_cache = cache.cache("training-latents") if vae_hash else None
+        encode_batch_size = max(1, shared.opts.training_vae_encode_batch_size)
 
-            npimage = np.array(image).astype(np.uint8)
-            npimage = (npimage / 127.5 - 1.0).astype(np.float32)
+        def load(path):
+            return load_dataset_image(path, width, height, varsize, use_weight, latent_cache, vae_hash)
 
-            torchdata = torch.from_numpy(npimage).permute(2, 0, 1).to(device=device, dtype=torch.float32)
-            latent_sample = None
-
-            with devices.autocast():
-                latent_dist = model.encode_first_stage(torchdata.unsqueeze(dim=0))
-
-            #Perform latent sampling, even for random sampling.
-            #We need the sample dimensions for the weights
-            if latent_sampling_method == "deterministic":
-                if isinstance(latent_dist, DiagonalGaussianDistribution):
-                    # Works only for DiagonalGaussianDistribution
-                    latent_dist.std = 0
-                else:
-                    latent_sampling_method = "once"
-            latent_sample = model.get_first_stage_encoding(latent_dist).squeeze().to(devices.cpu)
-
-            if use_weight and alpha_channel is not None:
-                channels, *latent_size = latent_sample.shape
-                weight_img = alpha_channel.resize(latent_size)
-                npweight = np.array(weight_img).astype(np.float32)
-                #Repeat for every channel in the latent sample
-                weight = torch.tensor([npweight] * channels).reshape([channels] + latent_size)
-                #Normalize the weight to a minimum of 0 and a mean of 1, that way the loss will be comparable to default.
-                weight -= weight.min()
-                weight /= weight.mean()
-            elif use_weight:
-                #If an image does not have a alpha channel, add a ones weight map anyway so we can stack it later
-                weight = torch.ones(latent_sample.shape)
-            else:
-                weight = None
+        print("Preparing dataset...")
+        with tqdm.tqdm(total=len(self.image_paths)) as progress:
+            for chunk, loaded in load_dataset_images(self.image_paths, load, window=encode_batch_size * 8):
+                if shared.state.interrupted:
+                    raise Exception("interrupted")
 
-            if latent_sampling_method == "random":
-                entry = DatasetEntry(filename=path, filename_text=filename_text, latent_dist=latent_dist, weight=weight)
-            else:
-                entry = DatasetEntry(filename=path, filename_text=filename_text, latent_sample=latent_sample, weight=weight)
+                encode_dataset_images(model, loaded, device, latent_cache, encode_batch_size)
 
-            if not (self.tag_drop_out != 0 or self.shuffle_tags):
-                entry.cond_text = self.create_text(filename_text)
+                for item in loaded:
+                    latent_sampling_method = self.add_entry(item, model, cond_model, re_word, include_cond, latent_sampling_method, use_weight, groups)
 
-            if include_cond and not (self.tag_drop_out != 0 or self.shuffle_tags):
-                with devices.autocast():
-                    entry.cond = cond_model([entry.cond_text]).to(devices.cpu).squeeze(0)
-            groups[image.size].append(len(self.dataset))
-            self.dataset.append(entry)
-            del torchdata
-            del latent_dist
-            del latent_sample
-            del weight
+                progress.update(len(chunk))
 
         self.length = len(self.dataset)
         self.groups = list(groups.values())
@@ -149,6 +90,71 @@ class PersonalizedBase(Dataset):
                 print(f"  {w}x{h}: {len(ids)}")
             print()
 
+    def add_entry(self, item, model, cond_model, re_word, include_cond, latent_sampling_method, use_weight, groups):
+        """adds an image with its encoder output to the dataset; returns latent_sampling_method, which changes from deterministic to once if the VAE does not support it"""
+
+        path = item.path
+        text_filename = f"{os.path.splitext(path)[0]}.txt"
+        filename = os.path.basename(path)
+
+        if os.path.exists(text_filename):
+            with open(text_filename, "r", encoding="utf8") as file:
+                filename_text = file.read()
+        else:
+            filename_text = os.path.splitext(filename)[0]
+            filename_text = re.sub(re_numbers_at_start, '', filename_text)
+            if re_word:
+                tokens = re_word.findall(filename_text)
+                filename_text = (shared.opts.dataset_filename_join_string or "").join(tokens)
+
+        latent_dist = item.latent_dist
+
+        #Perform latent sampling, even for random sampling.
+        #We need the sample dimensions for the weights
+        if latent_sampling_method == "deterministic":
+            if isinstance(latent_dist, DiagonalGaussianDistribution):
+                # Works only for DiagonalGaussianDistribution
+                latent_dist.std = 0
+            else:
+                latent_sampling_method = "once"
+        latent_sample = model.get_first_stage_encoding(latent_dist).squeeze().to(devices.cpu)
+
+        alpha_channel = item.alpha_channel
+        if use_weight and alpha_channel is not None:
+            channels, *latent_size = latent_sample.shape
+            weight_img = alpha_channel.resize(latent_size)
+            npweight = np.array(weight_img).astype(np.float32)
+            #Repeat for every channel in the latent sample
+            weight = torch.tensor([npweight] * channels).reshape([channels] + latent_size)
+            #Normalize the weight to a minimum of 0 and a mean of 1, that way the loss will be comparable to default.
+            weight -= weight.min()
+            weight /= weight.mean()
+        elif use_weight:
+            #If an image does not have a alpha channel, add a ones weight map anyway so we can stack it later
+            weight = torch.ones(latent_sample.shape)
+        else:
+            weight = None
+
+        if latent_sampling_method == "random":
+            entry = DatasetEntry(filename=path, filename_text=filename_text, latent_dist=latent_dist, weight=weight)
+        else:
+            entry = DatasetEntry(filename=path, filename_text=filename_text, latent_sample=latent_sample, weight=weight)
+
+        if not (self.tag_drop_out != 0 or self.shuffle_tags):
+            entry.cond_text = self.create_text(filename_text)
+
+        if include_cond and not (self.tag_drop_out != 0 or self.shuffle_tags):
+            with devices.autocast():
+                entry.cond = cond_model([entry.cond_text]).to(devices.cpu).squeeze(0)
+        groups[item.size].append(len(self.dataset))
+        self.dataset.append(entry)
+
+        # the decoded image and the encoder output are no longer needed
+        item.image = None
+        item.latent_dist = None
+
+        return latent_sampling_method
+
     def create_text(self, filename_text):
         text = random.choice(self.lines)
         tags = filename_text.split(',')
@@ -172,6 +178,118 @@ class PersonalizedBase(Dataset):
         return entry
 
 
+class DatasetImage:
+    def __init__(self, path, size, image=None, alpha_channel=None, key=None, latent=None):
+        self.path = path
+        self.size = size
+        self.image = image
+        self.alpha_channel = alpha_channel
+        self.key = key
+        self.latent = latent
+        self.latent_dist = None
+
+
+def vae_identity(model):
+    """identifies the VAE weights in use for the latent cache: hash of the external VAE file, or of the checkpoint if it uses its own VAE"""
+
+    if sd_vae.loaded_vae_file is not None:
+        return sd_vae.get_loaded_vae_hash()
+
+    return getattr(model, "sd_model_hash", None)
+
+
+def load_dataset_image(path, width, height, varsize, use_weight, latent_cache, vae_hash):
+    """
+    Reads and resizes one dataset image; runs on worker threads. Returns None for files that are not images.
+    If the VAE encoder output for the image is in latent_cache, the image is only decoded when its alpha channel is needed.
+    """
+
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+
+        image = images.read(io.BytesIO(data))
+        size = image.size if varsize else (width, height)
+
+        key = latent = None
+        if latent_cache is not None:
+            key = f"{hashlib.sha256(data).hexdigest()}-{size[0]}x{size[1]}-{vae_hash}-{devices.dtype_vae}"
+            latent = latent_cache.get(key)
+            if latent is not None and not use_weight:
+                return DatasetImage(path, size, key=key, latent=latent)
+
+        alpha_channel = None
+        #Currently does not work for single color transparency
+        #We would need to read image.info['transparency'] for that
+        if use_weight and 'A' in image.getbands():
+            alpha_channel = image.getchannel('A')
+        image = image.convert('RGB')
+        if not varsize:
+            image = image.resize((width, height), PIL.Image.BICUBIC)
+    except Exception:
+        return None
+
+    if latent is not None:
+        return DatasetImage(path, size, alpha_channel=alpha_channel, key=key, latent=latent)
+
+    npimage = np.array(image).astype(np.uint8)
+    npimage = (npimage / 127.5 - 1.0).astype(np.float32)
+
+    return DatasetImage(path, image.size, image=torch.from_numpy(npimage).permute(2, 0, 1), alpha_channel=alpha_channel, key=key)
+
+
+def load_dataset_images(paths, load, window):
+    """
+    Calls load for paths on a thread pool, yielding (paths, loaded items) for consecutive windows of paths, skipping
+    paths for which load returned None. The next window is loaded while the caller is working on the current one.
+    """
+
+    windows = [paths[i:i + window] for i in range(0, len(paths), window)]
+    with ThreadPoolExecutor(max_workers=max(1, shared.opts.training_dataset_threads), thread_name_prefix="dataset") as executor:
+        futures = [executor.submit(load, path) for path in windows[0]] if windows else []
+        for i, chunk in enumerate(windows):
+            current = futures
+            futures = [executor.submit(load, path) for path in windows[i + 1]] if i + 1 < len(windows) else []
+
+            loaded = [future.result() for future in current]
+            yield chunk, [item for item in loaded if item is not None]
+
+
+def encode_dataset_images(model, items, device, latent_cache, batch_size):
+    """
+    Sets latent_dist for items: VAE encoder outputs are taken from the cache where possible; the rest of the images
+    are encoded in batches of up to batch_size images of the same size, and the outputs are added to the cache.
+    """
+
+    by_size = defaultdict(list)
+    for item in items:
+        if item.latent is None:
+            by_size[item.size].append(item)
+
+    for same_size in by_size.values():
+        for start in range(0, len(same_size), batch_size):
+            batch = same_size[start:start + batch_size]
+            torchdata = torch.stack([item.image for item in batch]).to(device=device, dtype=torch.float32)
+
+            with devices.autocast():
+                latent_dist = model.encode_first_stage(torchdata)
+
+            is_distribution = isinstance(latent_dist, DiagonalGaussianDistribution)
+            parameters = (latent_dist.parameters if is_distribution else latent_dist).to(devices.cpu)
+
+            for n, item in enumerate(batch):
+                item.latent = (is_distribution, parameters[n:n + 1].clone())
+                if latent_cache is not None:
+                    latent_cache[item.key] = item.latent
+
+            del torchdata, latent_dist, parameters
+
+    for item in items:
+        is_distribution, parameters = item.latent
+        parameters = parameters.to(device)
+        item.latent_dist = DiagonalGaussianDistribution(parameters) if is_distribution else parameters
+
+
 class GroupedBatchSampler(Sampler):
     def __init__(self, data_source: PersonalizedBase, batch_size: int):
         super().__init__(data_source)
@@ -1,4 +1,6 @@
+import copy
 import os
+import threading
 from collections import namedtuple
 from contextlib import closing
 
@@ -108,14 +110,38 @@ class DirWithTextualInversionEmbeddings:
         self.mtime = os.path.getmtime(self.path)
 
 
+class EmbeddingsTrieNode:
+    """Node of a trie over token ids of embedding names; embeddings are those whose name tokenizes to the path to this node."""
+
+    def __init__(self):
+        self.children = {}
+        self.embeddings = []
+
+    def copy(self):
+        node = EmbeddingsTrieNode()
+        node.children = {token: child.copy() for token, child in self.children.items()}
+        node.embeddings = list(self.embeddings)
+        return node
+
+
 class EmbeddingDatabase:
+    staged_attributes = ('ids_lookup', 'ids_trie', 'registered_ids', 'word_embeddings', 'skipped_embeddings', 'files', 'expected_shape', 'previously_displayed_embeddings', 'revision')
+    """attributes that load_and_publish replaces with those of the staged copy"""
+
     def __init__(self):
         self.ids_lookup = {}
+        self.ids_trie = EmbeddingsTrieNode()
+        self.registered_ids = {}
         self.word_embeddings = {}
         self.skipped_embeddings = {}
         self.expected_shape = -1
         self.embedding_dirs = {}
         self.previously_displayed_embeddings = ()
+        self.revision = 0  # incremented on every change to registered embeddings
+        self.files = {}  # path -> ((size, mtime), embedding loaded from it or None)
+        self.lock = threading.RLock()  # held while lookups are changed in place or replaced, and by readers of them
+        self.load_lock = threading.Lock()  # only one load of embedding files at a time
+        self.load_thread = None
 
     def add_embedding_dir(self, path):
         self.embedding_dirs[path] = DirWithTextualInversionEmbeddings(path)
@@ -128,32 +154,80 @@ class EmbeddingDatabase:
 
     def register_embedding_by_name(self, embedding, model, name):
         ids = model.cond_stage_model.tokenize([name])[0]
-        first_id = ids[0]
-        if first_id not in self.ids_lookup:
-            self.ids_lookup[first_id] = []
+
+        with self.lock:
+            return self.register_ids(embedding, name, ids)
+
+    def register_ids(self, embedding, name, ids):
+        self.revision += 1
+
         if name in self.word_embeddings:
-            # remove old one from the lookup list
-            lookup = [x for x in self.ids_lookup[first_id] if x[1].name!=name]
-        else:
-            lookup = self.ids_lookup[first_id]
-        if embedding is not None:
-            lookup += [(ids, embedding)]
-        self.ids_lookup[first_id] = sorted(lookup, key=lambda x: len(x[0]), reverse=True)
+            # remove old one from the lookups
+            self.unregister_ids(name, self.registered_ids.pop(name, ids))
+
         if embedding is None:
             # unregister embedding with specified name
-            if name in self.word_embeddings:
-                del self.word_embeddings[name]
-            if len(self.ids_lookup[first_id])==0:
-                del self.ids_lookup[first_id]
+            self.word_embeddings.pop(name, None)
             return None
+
+        # keep lists of embeddings starting with the same token ordered from longest to shortest
+        lookup = self.ids_lookup.setdefault(ids[0], [])
+        index = next((i for i, x in enumerate(lookup) if len(x[0]) < len(ids)), len(lookup))
+        lookup.insert(index, (ids, embedding))
+
+        node = self.ids_trie
+        for token in ids:
+            node = node.children.setdefault(token, EmbeddingsTrieNode())
+        node.embeddings.append(embedding)
+
+        self.registered_ids[name] = ids
         self.word_embeddings[name] = embedding
         return embedding
 
+    def unregister_ids(self, name, ids):
+        lookup = self.ids_lookup.get(ids[0])
+        if lookup is not None:
+            lookup[:] = [x for x in lookup if x[1].name != name]
+            if not lookup:
+                del self.ids_lookup[ids[0]]
+
+        path = [self.ids_trie]
+        for token in ids:
+            node = path[-1].children.get(token)
+            if node is None:
+                return
+            path.append(node)
+
+        path[-1].embeddings = [x for x in path[-1].embeddings if x.name != name]
+
+        # remove nodes that no longer lead to any embedding
+        for i in reversed(range(len(ids))):
+            if path[i + 1].children or path[i + 1].embeddings:
+                break
+            del path[i].children[ids[i]]
+
     def get_expected_shape(self):
         devices.torch_npu_set_device()
         vec = shared.sd_model.cond_stage_model.encode_embedding_init_text(",", 1)
         return vec.shape[1]
 
+    def add_embedding(self, embedding):
+        """registers the embedding if it fits the current model, otherwise puts it into skipped_embeddings"""
+
+        if self.expected_shape == -1 or self.expected_shape == embedding.shape:
+            self.register_embedding(embedding, shared.sd_model)
+        else:
+            self.skipped_embeddings[embedding.name] = embedding
+
+    def remove_embedding(self, embedding):
+        """undoes add_embedding, unless another embedding with the same name has replaced this one since"""
+
+        if self.word_embeddings.get(embedding.name) is embedding:
+            self.register_embedding_by_name(None, shared.sd_model, embedding.name)
+
+        if self.skipped_embeddings.get(embedding.name) is embedding:
+            del self.skipped_embeddings[embedding.name]
+
     def load_from_file(self, path, filename):
         name, ext = os.path.splitext(filename)
         ext = ext.upper()
@@ -183,57 +257,143 @@ class EmbeddingDatabase:
 
         if data is not None:
             embedding = create_embedding_from_data(data, name, filename=filename, filepath=path)
-
-            if self.expected_shape == -1 or self.expected_shape == embedding.shape:
-                self.register_embedding(embedding, shared.sd_model)
-            else:
-                self.skipped_embeddings[name] = embedding
+            self.add_embedding(embedding)
+            return embedding
         else:
             print(f"Unable to load Textual inversion embedding due to data issue: '{name}'.")
 
+    def list_files(self, embdir):
+        """returns {path: (size, mtime)} for files in the directory"""
 
-    def load_from_dir(self, embdir):
+        res = {}
         if not os.path.isdir(embdir.path):
-            return
+            return res
 
         for root, _, fns in os.walk(embdir.path, followlinks=True):
             for fn in fns:
+                fullfn = os.path.join(root, fn)
+
                 try:
-                    fullfn = os.path.join(root, fn)
+                    st = os.stat(fullfn)
+                except OSError:
+                    continue
+
+                if st.st_size == 0:
+                    continue
+
+                res[fullfn] = (st.st_size, st.st_mtime_ns)
+
+        return res
+
+    def load_from_dir(self, embdir):
+        for fullfn, stat in self.list_files(embdir).items():
+            self.load_file_tracked(fullfn, stat)
+
+    def load_file_tracked(self, fullfn, stat):
+        try:
+            embedding = self.load_from_file(fullfn, os.path.basename(fullfn))
+        except Exception:
+            errors.report(f"Error loading embedding {os.path.basename(fullfn)}", exc_info=True)
+            embedding = None
+
+        self.files[fullfn] = (stat, embedding)
+
+    def load_textual_inversion_embeddings(self, force_reload=False, background=False):
+        """
+        Loads embeddings from files added or changed since the last call and unloads those of removed files.
+        With force_reload (after a model change), all embeddings are registered again for the new model; files that are
+        unchanged are not read again. With background, loading happens on a separate thread and this returns immediately.
+        """
+
+        if not force_reload and not any(embdir.has_changed() for embdir in self.embedding_dirs.values()):
+            return
 
-                    if os.stat(fullfn).st_size == 0:
+        if background and self.load_thread is not None and self.load_thread.is_alive():
+            return
+
+        # uses the text encoder, which with --medvram/--lowvram can only be used from the thread that runs the model
+        expected_shape = self.get_expected_shape()
+
+        if background:
+            self.load_thread = threading.Thread(target=self.load_and_publish, args=(force_reload, expected_shape), name="textual inversion loading", daemon=True)
+            self.load_thread.start()
+            return
+
+        self.load_and_publish(force_reload, expected_shape)
+
+    def staged(self):
+        """returns a copy of the database with its own lookups, which can be changed while this one is in use"""
+
+        staging = copy.copy(self)
+        staging.lock = threading.RLock()
+        staging.ids_lookup = {token: list(lookup) for token, lookup in self.ids_lookup.items()}
+        staging.ids_trie = self.ids_trie.copy()
+        staging.registered_ids = dict(self.registered_ids)
+        staging.word_embeddings = dict(self.word_embeddings)
+        staging.skipped_embeddings = dict(self.skipped_embeddings)
+        staging.files = dict(self.files)
+        return staging
+
+    def load_and_publish(self, force_reload, expected_shape):
+        """
+        Loads changed embeddings into a staged copy of the database and then replaces the lookups with the copy's, so
+        that prompts processed meanwhile see either all old or all new embeddings.
+        """
+
+        with self.load_lock:
+            while True:
+                with self.lock:
+                    staging = self.staged()
+                    revision = self.revision
+
+                staging.load_changed_embeddings(force_reload, expected_shape)
+
+                with self.lock:
+                    # if an embedding was registered meanwhile (e.g. bundled with a LoRA), start over so it's not lost
+                    if self.revision != revision:
                         continue
 
-                    self.load_from_file(fullfn, fn)
-                except Exception:
-                    errors.report(f"Error loading embedding {fn}", exc_info=True)
-                    continue
+                    self.__dict__.update({name: getattr(staging, name) for name in self.staged_attributes})
+                    return
 
-    def load_textual_inversion_embeddings(self, force_reload=False):
-        if not force_reload:
-            need_reload = False
-            for embdir in self.embedding_dirs.values():
-                if embdir.has_changed():
-                    need_reload = True
-                    break
+    def load_changed_embeddings(self, force_reload, expected_shape):
+        reregister = force_reload or expected_shape != self.expected_shape
 
-            if not need_reload:
-                return
+        if reregister:
+            self.ids_lookup.clear()
+            self.ids_trie = EmbeddingsTrieNode()
+            self.registered_ids.clear()
+            self.word_embeddings.clear()
+            self.skipped_embeddings.clear()
+            self.revision += 1
 
-        self.ids_lookup.clear()
-        self.word_embeddings.clear()
-        self.skipped_embeddings.clear()
-        self.expected_shape = self.get_expected_shape()
+        self.expected_shape = expected_shape
 
+        found = {}
         for embdir in self.embedding_dirs.values():
-            self.load_from_dir(embdir)
+            found.update(self.list_files(embdir))
             embdir.update()
 
+        for fullfn, (stat, embedding) in list(self.files.items()):
+            if found.get(fullfn) == stat:
+                continue
+
+            del self.files[fullfn]
+            if embedding is not None and not reregister:
+                self.remove_embedding(embedding)
+
+        for fullfn, stat in found.items():
+            known = self.files.get(fullfn)
+            if known is None:
+                self.load_file_tracked(fullfn, stat)
+            elif known[1] is None:
+                continue
+            elif reregister or (known[1].name not in self.word_embeddings and known[1].name not in self.skipped_embeddings):
+                # also brings back an embedding that was shadowed by one with the same name from a file that is now gone
+                self.add_embedding(known[1])
+
         # re-sort word_embeddings because load_from_dir may not load in alphabetic order.
-        # using a temporary copy so we don't reinitialize self.word_embeddings in case other objects have a reference to it.
-        sorted_word_embeddings = {e.name: e for e in sorted(self.word_embeddings.values(), key=lambda e: e.name.lower())}
-        self.word_embeddings.clear()
-        self.word_embeddings.update(sorted_word_embeddings)
+        self.word_embeddings = {e.name: e for e in sorted(self.word_embeddings.values(), key=lambda e: e.name.lower())}
 
         displayed_embeddings = (tuple(self.word_embeddings.keys()), tuple(self.skipped_embeddings.keys()))
         if shared.opts.textual_inversion_print_at_load and self.previously_displayed_embeddings != displayed_embeddings:
@@ -243,17 +403,21 @@ class EmbeddingDatabase:
                 print(f"Textual inversion embeddings skipped({len(self.skipped_embeddings)}): {', '.join(self.skipped_embeddings.keys())}")
 
     def find_embedding_at_position(self, tokens, offset):
-        token = tokens[offset]
-        possible_matches = self.ids_lookup.get(token, None)
+        embedding, length = None, None
+
+        with self.lock:
+            node = self.ids_trie
 
-        if possible_matches is None:
-            return None, None
+            # longest registered name that the tokens at offset start with
+            for i in range(offset, len(tokens)):
+                node = node.children.get(tokens[i])
+                if node is None:
+                    break
 
-        for ids, embedding in possible_matches:
-            if tokens[offset:offset + len(ids)] == ids:
-                return embedding, len(ids)
+                if node.embeddings:
+                    embedding, length = node.embeddings[0], i - offset + 1
 
-        return None, None
+        return embedding, length
 
 
 def create_embedding(name, num_vectors_per_token, overwrite_old, init_text='*'):
@@ -13,7 +13,7 @@ from PIL import Image, PngImagePlugin  # noqa: F401
 from modules.call_queue import wrap_gradio_gpu_call, wrap_queued_call, wrap_gradio_call, wrap_gradio_call_no_job # noqa: F401
 
 from modules import gradio_extensons, sd_schedulers  # noqa: F401
-from modules import sd_hijack, sd_models, script_callbacks, ui_extensions, deepbooru, extra_networks, ui_common, ui_postprocessing, progress, ui_loadsave, shared_items, ui_settings, timer, sysinfo, ui_checkpoint_merger, scripts, sd_samplers, processing, ui_extra_networks, ui_toprow, launch_utils
+from modules import sd_hijack, sd_models, script_callbacks, ui_extensions, deepbooru, errors, extra_networks, ui_common, ui_postprocessing, progress, ui_loadsave, shared_items, ui_settings, timer, sysinfo, ui_checkpoint_merger, scripts, sd_samplers, processing, ui_extra_networks, ui_toprow, launch_utils
 from modules.ui_components import FormRow, FormGroup, ToolButton, FormHTML, InputAccordion, ResizeHandleRow
 from modules.paths import script_path
 from modules.ui_common import create_refresh_button
@@ -110,7 +110,7 @@ def resize_from_to_html(width, height, scale_by):
     return f"resize: from <span class='resolution'>{width}x{height}</span> to <span class='resolution'>{target_width}x{target_height}</span>"
 
 
-def process_interrogate(interrogation_function, mode, ii_input_dir, ii_output_dir, *ii_singles):
+def process_interrogate(interrogation_function, mode, ii_input_dir, ii_output_dir, *ii_singles, batch_function=None):
     if mode in {0, 1, 3, 4}:
         return [interrogation_function(ii_singles[mode]), None]
     elif mode == 2:
@@ -124,11 +124,36 @@ def process_interrogate(interrogation_function, mode, ii_input_dir, ii_output_di
         else:
             ii_output_dir = ii_input_dir
 
-        for image in images:
-            img = Image.open(image)
-            filename = os.path.basename(image)
-            left, _ = os.path.splitext(filename)
-            print(interrogation_function(img), file=open(os.path.join(ii_output_dir, f"{left}.txt"), 'a', encoding='utf-8'))
+        if batch_function is None:
+            for image in images:
+                img = Image.open(image)
+                filename = os.path.basename(image)
+                left, _ = os.path.splitext(filename)
+                print(interrogation_function(img), file=open(os.path.join(ii_output_dir, f"{left}.txt"), 'a', encoding='utf-8'))
+
+            return [gr.update(), None]
+
+        readable = []
+
+        def read_images():
+            for image in images:
+                try:
+                    img = Image.open(image).convert("RGB")
+                except Exception as e:
+                    errors.display(e, f"reading {image}")
+                    continue
+
+                readable.append(image)
+                yield img
+
+        # batch_function yields a result for every image it has read, in order
+        for i, prompt in enumerate(batch_function(read_images())):
+            if prompt is None:
+                continue
+
+            left, _ = os.path.splitext(os.path.basename(readable[i]))
+            with open(os.path.join(ii_output_dir, f"{left}.txt"), 'a', encoding='utf-8') as file:
+                print(prompt, file=file)
 
         return [gr.update(), None]
 
@@ -138,6 +163,10 @@ def interrogate(image):
     return gr.update() if prompt is None else prompt
 
 
+def interrogate_batch(images):
+    yield from shared.interrogator.interrogate_batch(images)
+
+
 def interrogate_deepbooru(image):
     prompt = deepbooru.model.tag(image)
     return gr.update() if prompt is None else prompt
@@ -822,7 +851,7 @@ def create_ui():
             )
 
             toprow.button_interrogate.click(
-                fn=lambda *args: process_interrogate(interrogate, *args),
+                fn=lambda *args: process_interrogate(interrogate, *args, batch_function=interrogate_batch),
                 **interrogate_args,
             )
 
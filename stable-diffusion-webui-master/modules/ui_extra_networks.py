@@ -1,4 +1,7 @@
+import base64
+import bisect
 import functools
+import hashlib
 import os.path
 import urllib.parse
 from base64 import b64decode
@@ -7,11 +10,12 @@ from pathlib import Path
 from typing import Optional, Union
 from dataclasses import dataclass
 
-from modules import shared, ui_extra_networks_user_metadata, errors, extra_networks, util
+from modules import shared, ui_extra_networks_user_metadata, ui_extra_networks_thumbnails, errors, extra_networks, util
 from modules.images import read_info_from_image, save_image_with_geninfo
 import gradio as gr
 import json
 import html
+from fastapi import Request
 from fastapi.exceptions import HTTPException
 from PIL import Image
 
@@ -94,7 +98,9 @@ def register_page(page):
     allowed_dirs.update(set(sum([x.allowed_directories_for_previews() for x in extra_pages], [])))
 
 
-def fetch_file(filename: str = ""):
+def fetch_file(request: Request, filename: str = "", size: int = 0):
+    """Serves a preview image; if size is given, serves a downscaled copy of it from thumbnail cache instead."""
+
     from starlette.responses import FileResponse
 
     if not os.path.isfile(filename):
@@ -107,11 +113,16 @@ def fetch_file(filename: str = ""):
     if ext not in allowed_preview_extensions():
         raise ValueError(f"File cannot be fetched: {filename}. Extensions allowed: {allowed_preview_extensions()}.")
 
+    if size:
+        stat = os.stat(filename)
+        path, name = ui_extra_networks_thumbnails.cache.get(os.path.abspath(filename), (stat.st_mtime_ns, stat.st_size), ui_extra_networks_thumbnails.closest_size(size), lambda: Image.open(filename))
+        return ui_extra_networks_thumbnails.thumbnail_response(request, path, name)
+
     # would profit from returning 304
     return FileResponse(filename, headers={"Accept-Ranges": "bytes"})
 
 
-def fetch_cover_images(page: str = "", item: str = "", index: int = 0):
+def fetch_cover_images(request: Request, page: str = "", item: str = "", index: int = 0, size: int = 0):
     from starlette.responses import Response
 
     page = next(iter([x for x in extra_pages if x.name == page]), None)
@@ -127,6 +138,17 @@ def fetch_cover_images(page: str = "", item: str = "", index: int = 0):
     if not image:
         raise HTTPException(status_code=404, detail="File not found")
 
+    if size:
+        source = f"cover-image:{page.name}:{item}:{index}"
+        version = hashlib.sha256(image.encode("utf8")).hexdigest()
+
+        try:
+            path, name = ui_extra_networks_thumbnails.cache.get(source, version, ui_extra_networks_thumbnails.closest_size(size), lambda: Image.open(BytesIO(b64decode(image))))
+        except Exception as err:
+            raise ValueError(f"File cannot be fetched: {item}. Failed to load cover image.") from err
+
+        return ui_extra_networks_thumbnails.thumbnail_response(request, path, name)
+
     try:
         image = Image.open(BytesIO(b64decode(image)))
         buffer = BytesIO()
@@ -165,16 +187,50 @@ def get_single_card(page: str = "", tabname: str = "", name: str = ""):
         item = page.items.get(name)
 
     page.read_user_metadata(item, use_cache=False)
-    item_html = page.create_item_html(tabname, item, shared.html("extra-networks-card.html"))
+    page.catalog = None
+    item_html = page.cached_item_html(tabname, item, "card", page.create_item_html, tabname, item, page.card_tpl)
 
     return JSONResponse({"html": item_html})
 
 
+def get_catalog(page: str = "", tabname: str = "", search: str = "", sort: str = "default", order: str = "Ascending", directory: str = "", cursor: str = "", limit: int = 100):
+    """Returns a part of a page's cards, searched, sorted and filtered by directory.
+
+    Pass next_cursor from the response as cursor to get the following cards; it is null after the last card.
+    """
+
+    from starlette.responses import JSONResponse
+
+    page = next(iter([x for x in extra_pages if x.name == page]), None)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    if sort not in catalog_sort_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown sort field: {sort}; allowed: {', '.join(catalog_sort_fields)}")
+
+    try:
+        names, next_cursor, total = page.get_catalog().query(search, sort, order == "Descending", directory, cursor, max(1, min(limit, 1000)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+    items = []
+    for name in names:
+        item = page.items.get(name)
+        if item is None:
+            continue
+
+        item_html = page.cached_item_html(tabname, item, "card", page.create_item_html, tabname, item, page.card_tpl)
+        items.append({"name": name, "html": item_html})
+
+    return JSONResponse({"items": items, "next_cursor": next_cursor, "total": total})
+
+
 def add_pages_to_demo(app):
     app.add_api_route("/sd_extra_networks/thumb", fetch_file, methods=["GET"])
     app.add_api_route("/sd_extra_networks/cover-images", fetch_cover_images, methods=["GET"])
     app.add_api_route("/sd_extra_networks/metadata", get_metadata, methods=["GET"])
     app.add_api_route("/sd_extra_networks/get-single-card", get_single_card, methods=["GET"])
+    app.add_api_route("/sd_extra_networks/catalog", get_catalog, methods=["GET"])
 
 
 def quote_js(s):
@@ -183,6 +239,107 @@ def quote_js(s):
     return f'"{s}"'
 
 
+catalog_sort_fields = ["default", "name", "path", "date_created", "date_modified"]
+
+
+def catalog_sort_key(value, name):
+    """Makes a sort key that orders numbers before text, with the item's name breaking ties"""
+
+    if isinstance(value, (int, float)):
+        return 0, value, name
+
+    return 1, "" if value is None else str(value), name
+
+
+def encode_catalog_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf8")).decode("ascii")
+
+
+def decode_catalog_cursor(cursor):
+    try:
+        flag, value, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+    return flag, value, name
+
+
+@dataclass
+class ExtraNetworksCatalogEntry:
+    name: str
+    text: str
+    """lowercase text the search is done in"""
+
+    path: str
+    """path of the file relative to the directory with models, with forward slashes"""
+
+    search_only: bool
+    sort_keys: dict
+
+
+class ExtraNetworksCatalog:
+    """Index of a page's items for searching, sorting and paging through them without rendering the whole page.
+
+    Built from the page's items when first needed, and dropped when the items are listed again.
+    """
+
+    def __init__(self, page):
+        self.entries = []
+        self.orders = {}
+
+        for item in list(page.items.values()):
+            search_only = page.is_search_only(item)
+            if search_only and shared.opts.extra_networks_hidden_models == "Never":
+                continue
+
+            text = " ".join([*item.get("search_terms", []), item.get("description") or ""]).lower()
+            path = page.local_path(item.get("filename") or "").replace("\\", "/").lstrip("/")
+            self.entries.append(ExtraNetworksCatalogEntry(item["name"], text, path, search_only, item.get("sort_keys", {})))
+
+    def ordered(self, sort):
+        """Returns a list of (sort key, entry) pairs sorted by the sort key"""
+
+        res = self.orders.get(sort)
+        if res is None:
+            res = sorted(((catalog_sort_key(x.sort_keys.get(sort), x.name), x) for x in self.entries), key=lambda x: x[0])
+            self.orders[sort] = res
+
+        return res
+
+    def query(self, search="", sort="default", descending=False, directory="", cursor="", limit=100):
+        """Returns names of at most limit items that come after cursor, the cursor for the items after them
+        (None if there are none) and the total number of matching items.
+
+        Items are matched the same way as the search box in the UI does it: items from hidden directories are only
+        found when the search text has 4 or more characters.
+        """
+
+        search = search.lower()
+        directory = directory.replace("\\", "/").strip("/")
+        directory = directory + "/" if directory else ""
+
+        matches = [
+            (key, x) for key, x in self.ordered(sort)
+            if search in x.text and not (x.search_only and len(search) < 4) and x.path.startswith(directory)
+        ]
+        keys = [key for key, _ in matches]
+
+        if descending:
+            end = bisect.bisect_left(keys, decode_catalog_cursor(cursor)) if cursor else len(matches)
+            start = max(0, end - limit)
+            page = matches[start:end][::-1]
+            has_more = start > 0
+        else:
+            start = bisect.bisect_right(keys, decode_catalog_cursor(cursor)) if cursor else 0
+            end = start + limit
+            page = matches[start:end]
+            has_more = end < len(matches)
+
+        next_cursor = encode_catalog_cursor(page[-1][0]) if page and has_more else None
+
+        return [x.name for _, x in page], next_cursor, len(matches)
+
+
 class ExtraNetworksPage:
     def __init__(self, title):
         self.title = title
@@ -193,6 +350,10 @@ class ExtraNetworksPage:
         self.allow_negative_prompt = False
         self.metadata = {}
         self.items = {}
+        self.catalog = None
+        self.item_html_cache = {}
+        """(tabname, item name, kind of HTML) -> (stamp from item_html_stamp, HTML)"""
+
         self.lister = util.MassFileLister()
         # HTML Templates
         self.pane_tpl = shared.html("extra-networks-pane.html")
@@ -220,7 +381,8 @@ class ExtraNetworksPage:
     def link_preview(self, filename):
         quoted_filename = urllib.parse.quote(filename.replace('\\', '/'))
         mtime, _ = self.lister.mctime(filename)
-        return f"./sd_extra_networks/thumb?filename={quoted_filename}&mtime={mtime}"
+        size = ui_extra_networks_thumbnails.card_thumbnail_size()
+        return f"./sd_extra_networks/thumb?filename={quoted_filename}&mtime={mtime}" + (f"&size={size}" if size else "")
 
     def search_terms_from_path(self, filename, possible_directories=None):
         abspath = os.path.abspath(filename)
@@ -286,21 +448,7 @@ class ExtraNetworksPage:
             }
         )
 
-        local_path = ""
-        filename = item.get("filename", "")
-        for reldir in self.allowed_directories_for_previews():
-            absdir = os.path.abspath(reldir)
-
-            if filename.startswith(absdir):
-                local_path = filename[len(absdir):]
-
-        # if this is true, the item must not be shown in the default view, and must instead only be
-        # shown when searching for it
-        if shared.opts.extra_networks_hidden_models == "Always":
-            search_only = False
-        else:
-            search_only = "/." in local_path or "\\." in local_path
-
+        search_only = self.is_search_only(item)
         if search_only and shared.opts.extra_networks_hidden_models == "Never":
             return ""
 
@@ -350,6 +498,86 @@ class ExtraNetworksPage:
         else:
             return args
 
+    def local_path(self, filename: str) -> str:
+        """Returns the part of the filename after the directory for previews it is in, or an empty string."""
+        local_path = ""
+        for reldir in self.allowed_directories_for_previews():
+            absdir = os.path.abspath(reldir)
+
+            if filename.startswith(absdir):
+                local_path = filename[len(absdir):]
+
+        return local_path
+
+    def is_search_only(self, item: dict) -> bool:
+        """If this is true, the item must not be shown in the default view, and must instead only be
+        shown when searching for it."""
+        if shared.opts.extra_networks_hidden_models == "Always":
+            return False
+
+        local_path = self.local_path(item.get("filename", ""))
+        return "/." in local_path or "\\." in local_path
+
+    def item_html_stamp(self, item: dict) -> tuple:
+        """Returns a value that changes whenever the HTML for the item may have changed: modification times of
+        the item's file and of its user metadata, the item's fields used in HTML, and the settings for cards."""
+        filename = item.get("filename") or ""
+        file_times = (self.lister.mctime(filename), self.lister.mctime(os.path.splitext(filename)[0] + ".json")) if filename else None
+
+        return (
+            file_times,
+            item.get("preview"),
+            item.get("description"),
+            item.get("prompt"),
+            item.get("negative_prompt"),
+            item.get("onclick"),
+            item.get("shorthash"),
+            item.get("local_preview"),
+            bool(item.get("metadata")),
+            tuple(item.get("search_terms", [])),
+            tuple(item.get("sort_keys", {}).items()),
+            shared.opts.extra_networks_card_width,
+            shared.opts.extra_networks_card_height,
+            shared.opts.extra_networks_card_text_scale,
+            shared.opts.extra_networks_card_show_desc,
+            shared.opts.extra_networks_card_description_is_html,
+            shared.opts.extra_networks_hidden_models,
+        )
+
+    def cached_item_html(self, tabname: str, item: dict, kind: str, create, *args) -> str:
+        """Returns HTML made by create(*args) for the item, reusing the HTML from the last call with the same tabname
+        and kind if nothing the HTML depends on has changed since then.
+
+        Args:
+            tabname: The name of the active tab.
+            item: Dictionary containing item information.
+            kind: Identifies what the HTML is for, like "card".
+            create: Function that generates the HTML.
+            args: Arguments for create.
+
+        Returns:
+            HTML formatted string.
+        """
+        key = (tabname, item["name"], kind)
+        stamp = self.item_html_stamp(item)
+
+        cached = self.item_html_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        item_html = create(*args)
+        self.item_html_cache[key] = (stamp, item_html)
+        return item_html
+
+    def get_catalog(self) -> ExtraNetworksCatalog:
+        """Returns the index used to search, sort and page through items, building it if it's not built yet."""
+        catalog = self.catalog
+        if catalog is None:
+            catalog = ExtraNetworksCatalog(self)
+            self.catalog = catalog
+
+        return catalog
+
     def create_tree_dir_item_html(
         self,
         tabname: str,
@@ -492,7 +720,7 @@ class ExtraNetworksPage:
 
             for k, v in sorted(data.items(), key=lambda x: shared.natural_sort_key(x[0])):
                 if isinstance(v, (ExtraNetworksItem,)):
-                    _file_li.append(self.create_tree_file_item_html(tabname, k, v.item))
+                    _file_li.append(self.cached_item_html(tabname, v.item, f"tree:{k}", self.create_tree_file_item_html, tabname, k, v.item))
                 else:
                     _dir_li.append(self.create_tree_dir_item_html(tabname, k, _build_tree(v)))
 
@@ -562,9 +790,13 @@ class ExtraNetworksPage:
         Returns:
             HTML formatted string.
         """
+        if shared.opts.extra_networks_virtual_cards and self.items:
+            # cards are requested by javascript from the catalog endpoint when they are scrolled into view
+            return f"<div class='extra-network-cards-virtual' data-page='{html.escape(self.name)}' hidden></div>"
+
         res = []
         for item in self.items.values():
-            res.append(self.create_item_html(tabname, item, self.card_tpl))
+            res.append(self.cached_item_html(tabname, item, "card", self.create_item_html, tabname, item, self.card_tpl))
 
         if not res:
             dirs = "".join([f"<li>{x}</li>" for x in self.allowed_directories_for_previews()])
@@ -589,6 +821,8 @@ class ExtraNetworksPage:
 
         items_list = [] if empty else self.list_items()
         self.items = {x["name"]: x for x in items_list}
+        self.catalog = None
+        self.item_html_cache = {k: v for k, v in self.item_html_cache.items() if k[1] in self.items}
 
         # Populate the instance metadata for each item.
         for item in self.items.values():
@@ -664,7 +898,9 @@ class ExtraNetworksPage:
 
         file = f"{path}.safetensors"
         if self.lister.exists(file) and 'ssmd_cover_images' in metadata and len(list(filter(None, json.loads(metadata['ssmd_cover_images'])))) > 0:
-            return f"./sd_extra_networks/cover-images?page={self.extra_networks_tabname}&item={name}"
+            mtime, _ = self.lister.mctime(file)
+            size = ui_extra_networks_thumbnails.card_thumbnail_size()
+            return f"./sd_extra_networks/cover-images?page={self.extra_networks_tabname}&item={name}&mtime={mtime}" + (f"&size={size}" if size else "")
 
         return None
 
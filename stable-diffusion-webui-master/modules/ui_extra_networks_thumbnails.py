@@ -0,0 +1,124 @@
+import glob
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import errors, images, shared
+from modules.cache import cache_dir
+
+thumbnail_sizes = (256, 512, 1024)
+
+
+def closest_size(size):
+    """Returns the smallest thumbnail size that is at least size, or the largest one"""
+
+    return next((x for x in thumbnail_sizes if x >= size), thumbnail_sizes[-1])
+
+
+def card_thumbnail_size():
+    """Returns the size of thumbnails to use for cards, or 0 if cards should show original previews"""
+
+    size = shared.opts.extra_networks_thumbnail_size
+    return 0 if size == "Original" else closest_size(int(size))
+
+
+def not_modified(request, etag):
+    """Tells if the request has an If-None-Match header that matches etag"""
+
+    header = request.headers.get("if-none-match") if request is not None else None
+    return header is not None and (header.strip() == "*" or etag in [x.strip() for x in header.split(",")])
+
+
+def thumbnail_response(request, path, name):
+    """Serves a thumbnail from the cache; those never change, so browsers can keep them for as long as they want"""
+
+    from starlette.responses import FileResponse, Response
+
+    etag = f'"{name}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+
+class ThumbnailCache:
+    """Makes downscaled WEBP copies of preview images on a thread pool and keeps them in a directory.
+
+    A thumbnail is identified by its source (like the full path of the preview) and the version of the source (like
+    its mtime and size, or a hash of its data); files are named after hashes of both, so a thumbnail for a version
+    never changes and the name works as an ETag. When a thumbnail for a new version is made, thumbnails of older
+    versions of the same source are deleted.
+    """
+
+    def __init__(self, dirname, threads=None):
+        self.dirname = dirname
+        self.threads = threads or max(1, min(4, (os.cpu_count() or 1) // 2))
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def path(self, source, version, size):
+        """Returns the path of the thumbnail and its name without extension"""
+
+        source_hash = hashlib.sha256(source.encode("utf8")).hexdigest()[:16]
+        version_hash = hashlib.sha256(str(version).encode("utf8")).hexdigest()[:16]
+        name = f"{source_hash}-{version_hash}-{size}"
+
+        return os.path.join(self.dirname, source_hash[:2], f"{name}.webp"), name
+
+    def get(self, source, version, size, load):
+        """Returns the path of the thumbnail and its name, making the thumbnail from the image returned by load() if
+        it's not in the cache yet; concurrent requests for the same thumbnail wait for one job."""
+
+        path, name = self.path(source, version, size)
+        if os.path.exists(path):
+            return path, name
+
+        with self.lock:
+            future = self.pending.get(path)
+            if future is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="thumbnail")
+
+                future = self.executor.submit(self.create, path, size, load)
+                self.pending[path] = future
+
+        future.result()
+        return path, name
+
+    def create(self, path, size, load):
+        try:
+            self.make_thumbnail(path, size, load)
+        finally:
+            with self.lock:
+                self.pending.pop(path, None)
+
+    def make_thumbnail(self, path, size, load):
+        image = load()
+        image.load()
+
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        image.thumbnail((size, size), images.LANCZOS)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format="WEBP", quality=80, method=4)
+        os.replace(tmp_path, path)
+
+        source_hash, version_hash, _ = os.path.basename(path).split("-")
+        for old in glob.glob(os.path.join(os.path.dirname(path), f"{source_hash}-*.webp")):
+            if os.path.basename(old).split("-")[1] == version_hash:
+                continue
+
+            try:
+                os.remove(old)
+            except OSError as e:
+                errors.display(e, f"removing old thumbnail {old}")
+
+
+cache = ThumbnailCache(os.path.join(cache_dir, "thumbnails"))
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import logging
 from typing import Callable
 
@@ -6,7 +8,7 @@ import torch
 import tqdm
 from PIL import Image
 
-from modules import devices, images, shared, torch_utils
+from modules import devices, shared, torch_utils
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +50,98 @@ def upscale_pil_patch(model, img: Image.Image) -> Image.Image:
             return torch_bgr_to_pil_image(model(tensor))
 
 
+def tile_starts(size: int, tile_size: int, stride: int) -> list[int]:
+    return list(range(0, size - tile_size, stride)) + [size - tile_size]
+
+
+def feather_weights(tile_size: int, ramp: int) -> torch.Tensor:
+    """1D blending weights for a tile: rising linearly over ramp pixels at both edges, and positive everywhere"""
+
+    pos = torch.arange(tile_size, dtype=torch.float32)
+    return (torch.minimum(pos + 1, tile_size - pos) / (ramp + 1)).clamp_(max=1)
+
+
+def tiled_upscale_batched(
+    img: torch.Tensor,
+    model,
+    *,
+    tile_size: int,
+    tile_overlap: int,
+    device: torch.device,
+    scale: int | None = None,
+    dtype: torch.dtype | None = None,
+    feather: bool = False,
+    result_device: torch.device | None = None,
+    result_dtype: torch.dtype | None = None,
+    desc="Tiled upscale",
+) -> torch.Tensor | None:
+    """
+    Upscales a BCHW tensor with model in overlapping square tiles, running the model on upscaler_tile_batch_size
+    tiles at once. Tiles are gathered from an unfold view of the image, and model outputs are added up with weights
+    into a result tensor, which is normalized at the end. With feather, weights fall off linearly across the overlap,
+    blending seams; otherwise overlapping outputs are averaged.
+
+    If scale is not given, it is found from the first model output. If interrupted, returns what is done so far, or
+    None if nothing is.
+    """
+
+    b, c, h, w = img.shape
+    tile_size = min(tile_size, h, w)
+    stride = max(1, tile_size - tile_overlap)
+    positions = [(y, x) for y in tile_starts(h, tile_size, stride) for x in tile_starts(w, tile_size, stride)]
+
+    # b, c, h - tile_size + 1, w - tile_size + 1, tile_size, tile_size; a view, nothing is copied
+    windows = img.unfold(2, tile_size, 1).unfold(3, tile_size, 1)
+
+    batch_size = max(1, shared.opts.upscaler_tile_batch_size)
+    result = weights = tile_weight = None
+    done = 0
+
+    logger.debug("Upscaling %s with %d tiles in batches of %d", img.shape, len(positions), batch_size)
+    with tqdm.tqdm(total=len(positions), desc=desc, disable=not shared.opts.enable_upscale_progressbar) as pbar:
+        while done < len(positions):
+            if shared.state.interrupted or shared.state.skipped:
+                break
+
+            batch = positions[done:done + batch_size]
+            ys = torch.tensor([y for y, _ in batch])
+            xs = torch.tensor([x for _, x in batch])
+            tiles = windows[:, :, ys, xs].permute(2, 0, 1, 3, 4).reshape(-1, c, tile_size, tile_size)
+
+            try:
+                output = model(tiles.to(device=device, dtype=dtype or img.dtype))
+            except torch.cuda.OutOfMemoryError:
+                if batch_size == 1:
+                    raise
+
+                batch_size //= 2
+                logger.warning("Out of memory when upscaling tiles; retrying with %d tiles at once", batch_size)
+                devices.torch_gc()
+                continue
+
+            if result is None:
+                scale = scale or output.shape[-1] // tile_size
+                result = torch.zeros(b, output.shape[1], h * scale, w * scale, device=result_device or device, dtype=result_dtype or img.dtype)
+                weights = torch.zeros(1, 1, h * scale, w * scale, device=result.device, dtype=result.dtype)
+
+                edge = feather_weights(tile_size * scale, tile_overlap * scale if feather else 0)
+                tile_weight = (edge[:, None] * edge[None, :]).to(result)
+
+            output = output.to(result).reshape(len(batch), b, -1, tile_size * scale, tile_size * scale)
+            for (y, x), out_patch in zip(batch, output):
+                region = (..., slice(y * scale, (y + tile_size) * scale), slice(x * scale, (x + tile_size) * scale))
+                result[region].addcmul_(out_patch, tile_weight)
+                weights[region].add_(tile_weight)
+
+            done += len(batch)
+            pbar.update(len(batch))
+
+    if result is None:
+        return None
+
+    return result.div_(weights.clamp_(min=torch.finfo(weights.dtype).tiny))
+
+
 def upscale_with_model(
     model: Callable[[torch.Tensor], torch.Tensor],
     img: Image.Image,
@@ -62,30 +156,26 @@ def upscale_with_model(
         logger.debug("=> %s", output)
         return output
 
-    grid = images.split_grid(img, tile_size, tile_size, tile_overlap)
-    newtiles = []
-
-    with tqdm.tqdm(total=grid.tile_count, desc=desc, disable=not shared.opts.enable_upscale_progressbar) as p:
-        for y, h, row in grid.tiles:
-            newrow = []
-            for x, w, tile in row:
-                if shared.state.interrupted:
-                    return img
-                output = upscale_pil_patch(model, tile)
-                scale_factor = output.width // tile.width
-                newrow.append([x * scale_factor, w * scale_factor, output])
-                p.update(1)
-            newtiles.append([y * scale_factor, h * scale_factor, newrow])
-
-    newgrid = images.Grid(
-        newtiles,
-        tile_w=grid.tile_w * scale_factor,
-        tile_h=grid.tile_h * scale_factor,
-        image_w=grid.image_w * scale_factor,
-        image_h=grid.image_h * scale_factor,
-        overlap=grid.overlap * scale_factor,
-    )
-    return images.combine_grid(newgrid)
+    param = torch_utils.get_param(model)
+    tensor = pil_image_to_torch_bgr(img).to(dtype=param.dtype).unsqueeze(0)  # add batch dimension
+
+    with torch.inference_mode(), devices.without_autocast():
+        output = tiled_upscale_batched(
+            tensor,
+            model,
+            tile_size=tile_size,
+            tile_overlap=tile_overlap,
+            device=param.device,
+            feather=True,
+            result_device=devices.cpu,
+            result_dtype=torch.float32,
+            desc=desc,
+        )
+
+    if output is None or shared.state.interrupted:
+        return img
+
+    return torch_bgr_to_pil_image(output)
 
 
 def tiled_upscale_2(
@@ -99,9 +189,9 @@ def tiled_upscale_2(
     desc="Tiled upscale",
 ):
     # Alternative implementation of `upscale_with_model` originally used by
-    # SwinIR and ScuNET.  It differs from `upscale_with_model` in that tiling and
-    # weighting is done in PyTorch space, as opposed to `images.Grid` doing it in
-    # Pillow space without weighting.
+    # SwinIR and ScuNET.  It differs from `upscale_with_model` in that overlapping
+    # tile outputs are averaged rather than feathered, and the result is kept on
+    # the upscaling device.
 
     b, c, h, w = img.size()
     tile_size = min(tile_size, h, w)
@@ -110,54 +200,18 @@ def tiled_upscale_2(
         logger.debug("Upscaling %s without tiling", img.shape)
         return model(img)
 
-    stride = tile_size - tile_overlap
-    h_idx_list = list(range(0, h - tile_size, stride)) + [h - tile_size]
-    w_idx_list = list(range(0, w - tile_size, stride)) + [w - tile_size]
-    result = torch.zeros(
-        b,
-        c,
-        h * scale,
-        w * scale,
+    output = tiled_upscale_batched(
+        img,
+        model,
+        tile_size=tile_size,
+        tile_overlap=tile_overlap,
+        scale=scale,
         device=device,
-        dtype=img.dtype,
+        desc=desc,
     )
-    weights = torch.zeros_like(result)
-    logger.debug("Upscaling %s to %s with tiles", img.shape, result.shape)
-    with tqdm.tqdm(total=len(h_idx_list) * len(w_idx_list), desc=desc, disable=not shared.opts.enable_upscale_progressbar) as pbar:
-        for h_idx in h_idx_list:
-            if shared.state.interrupted or shared.state.skipped:
-                break
-
-            for w_idx in w_idx_list:
-                if shared.state.interrupted or shared.state.skipped:
-                    break
-
-                # Only move this patch to the device if it's not already there.
-                in_patch = img[
-                    ...,
-                    h_idx : h_idx + tile_size,
-                    w_idx : w_idx + tile_size,
-                ].to(device=device)
-
-                out_patch = model(in_patch)
-
-                result[
-                    ...,
-                    h_idx * scale : (h_idx + tile_size) * scale,
-                    w_idx * scale : (w_idx + tile_size) * scale,
-                ].add_(out_patch)
-
-                out_patch_mask = torch.ones_like(out_patch)
-
-                weights[
-                    ...,
-                    h_idx * scale : (h_idx + tile_size) * scale,
-                    w_idx * scale : (w_idx + tile_size) * scale,
-                ].add_(out_patch_mask)
-
-                pbar.update(1)
 
-    output = result.div_(weights)
+    if output is None:
+        return torch.zeros(b, c, h * scale, w * scale, device=device, dtype=img.dtype)
 
     return output
 
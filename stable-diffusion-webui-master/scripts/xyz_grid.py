@@ -1,9 +1,10 @@
 from collections import namedtuple
 from copy import copy
-from itertools import permutations, chain
+from itertools import permutations, chain, product
 import random
 import csv
 import os.path
+import time
 from io import StringIO
 from PIL import Image
 import numpy as np
@@ -11,7 +12,7 @@ import numpy as np
 import modules.scripts as scripts
 import gradio as gr
 
-from modules import images, sd_samplers, processing, sd_models, sd_vae, sd_schedulers, errors
+from modules import images, sd_samplers, processing, sd_models, sd_vae, sd_schedulers, errors, extra_networks
 from modules.processing import process_images, Processed, StableDiffusionProcessingTxt2Img
 from modules.shared import opts, state
 import modules.shared as shared
@@ -212,7 +213,7 @@ def csv_string_to_list_strip(data_str):
 
 
 class AxisOption:
-    def __init__(self, label, type, apply, format_value=format_value_add_label, confirm=None, cost=0.0, choices=None, prepare=None):
+    def __init__(self, label, type, apply, format_value=format_value_add_label, confirm=None, cost=0.0, choices=None, prepare=None, batchable=False):
         self.label = label
         self.type = type
         self.apply = apply
@@ -221,6 +222,7 @@ class AxisOption:
         self.cost = cost
         self.prepare = prepare
         self.choices = choices
+        self.batchable = batchable
 
 
 class AxisOptionImg2Img(AxisOption):
@@ -237,14 +239,14 @@ class AxisOptionTxt2Img(AxisOption):
 
 axis_options = [
     AxisOption("Nothing", str, do_nothing, format_value=format_nothing),
-    AxisOption("Seed", int, apply_field("seed")),
-    AxisOption("Var. seed", int, apply_field("subseed")),
+    AxisOption("Seed", int, apply_field("seed"), batchable=True),
+    AxisOption("Var. seed", int, apply_field("subseed"), batchable=True),
     AxisOption("Var. strength", float, apply_field("subseed_strength")),
     AxisOption("Steps", int, apply_field("steps")),
     AxisOptionTxt2Img("Hires steps", int, apply_field("hr_second_pass_steps")),
     AxisOption("CFG Scale", float, apply_field("cfg_scale")),
     AxisOptionImg2Img("Image CFG Scale", float, apply_field("image_cfg_scale")),
-    AxisOption("Prompt S/R", str, apply_prompt, format_value=format_value),
+    AxisOption("Prompt S/R", str, apply_prompt, format_value=format_value, batchable=True),
     AxisOption("Prompt order", str_permutations, apply_order, format_value=format_value_join_list),
     AxisOptionTxt2Img("Sampler", str, apply_field("sampler_name"), format_value=format_value, confirm=confirm_samplers, choices=lambda: [x.name for x in sd_samplers.samplers if x.name not in opts.hide_samplers]),
     AxisOptionTxt2Img("Hires sampler", str, apply_field("hr_sampler_name"), confirm=confirm_samplers, choices=lambda: [x.name for x in sd_samplers.samplers_for_img2img if x.name not in opts.hide_samplers]),
@@ -283,8 +285,180 @@ axis_options = [
     AxisOption("Size", str, apply_size),
 ]
 
+# apply functions of these axes only set fields of the processing object; axes added by extensions may do more
+builtin_axis_options = list(axis_options)
 
-def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend, include_lone_images, include_sub_grids, first_axes_processed, second_axes_processed, margin_size):
+
+GridCell = namedtuple('GridCell', ['x', 'y', 'z', 'ix', 'iy', 'iz'])
+
+
+def serpentine(lengths):
+    """Lists all index tuples for axes of the given lengths, outer axis first, walking the inner axes back and forth
+    so that consecutive tuples only differ in one index"""
+
+    if not lengths:
+        return [()]
+
+    inner = serpentine(lengths[1:])
+    return [(i, *rest) for i in range(lengths[0]) for rest in (inner if i % 2 == 0 else inner[::-1])]
+
+
+def plan_passes(axes, order, cells_per_batch, batch_key=None):
+    """Groups the cells of the grid into sampling passes.
+
+    axes maps 'x', 'y' and 'z' to AxisInfo, and order lists them from the outermost loop to the innermost. Cells that
+    only differ along batchable axes go into the same pass, up to cells_per_batch of them, if batch_key returns the
+    same value for them; other axes are walked in serpentine order, so that the values of slow to change axes
+    (checkpoint, VAE) change as rarely as possible.
+    """
+
+    outer = [a for a in order if not axes[a].axis.batchable]
+    inner = [a for a in order if axes[a].axis.batchable]
+
+    passes = []
+    for outer_indices in serpentine([len(axes[a].values) for a in outer]):
+        groups = {}
+        for inner_indices in product(*[range(len(axes[a].values)) for a in inner]):
+            index = dict(zip(outer, outer_indices)) | dict(zip(inner, inner_indices))
+            c = GridCell(*[axes[a].values[index[a]] for a in 'xyz'], *[index[a] for a in 'xyz'])
+            key = batch_key(c) if batch_key is not None and cells_per_batch > 1 else None
+            groups.setdefault(key, []).append(c)
+
+        for cells in groups.values():
+            passes += [cells[i:i + cells_per_batch] for i in range(0, len(cells), cells_per_batch)]
+
+    return passes
+
+
+def extra_networks_key(pc):
+    """Cells can only be generated in one batch if their prompts use the same extra networks, because extra networks
+    are activated once for the whole batch"""
+
+    return tuple(extra_networks.extra_network_data_key(extra_networks.parse_prompt(prompt)[1]) for prompt in (pc.prompt, pc.negative_prompt))
+
+
+def batch_cells(pcs):
+    """Combines processing objects of cells that only differ along batchable axes into one that generates them as a batch"""
+
+    if len(pcs) == 1:
+        return pcs[0]
+
+    pc = copy(pcs[0])
+    pc.prompt = [x.prompt for x in pcs]
+    pc.negative_prompt = [x.negative_prompt for x in pcs]
+    pc.seed = [processing.get_fixed_seed(x.seed) for x in pcs]
+    pc.subseed = [processing.get_fixed_seed(x.subseed) for x in pcs]
+    pc.batch_size = len(pcs)
+    pc.do_not_save_grid = True
+
+    return pc
+
+
+def split_batch(res, count):
+    """Splits the result of a batch made by batch_cells into one Processed for each cell"""
+
+    if count == 1:
+        return [res]
+
+    results = []
+    for i in range(count):
+        r = copy(res)
+        index = res.index_of_first_image + i
+        r.images = res.images[index:index + 1]
+        r.infotexts = res.infotexts[index:index + 1]
+        r.prompt, r.negative_prompt = res.all_prompts[i], res.all_negative_prompts[i]
+        r.seed, r.subseed = res.all_seeds[i], res.all_subseeds[i]
+        r.all_prompts, r.all_negative_prompts = [r.prompt], [r.negative_prompt]
+        r.all_seeds, r.all_subseeds = [r.seed], [r.subseed]
+        r.batch_size = 1
+        r.index_of_first_image = 0
+        results.append(r)
+
+    return results
+
+
+def cell_steps(pc):
+    steps = pc.steps
+    if isinstance(pc, StableDiffusionProcessingTxt2Img) and pc.enable_hr:
+        steps += pc.hr_second_pass_steps or pc.steps
+
+    return steps * pc.n_iter
+
+
+def pass_work(pcs):
+    """Amount of sampling done by a pass, in steps times megapixels"""
+
+    return cell_steps(pcs[0]) * sum(pc.width * pc.height for pc in pcs) / 1000000
+
+
+def count_model_loads(pcs):
+    """Simulates the checkpoint and VAE loads done by process_images for passes whose processing objects are pcs.
+
+    Returns a list with the number of (checkpoint, VAE) loads for each pass, and the number of checkpoint loads
+    needed to restore the original model afterwards.
+    """
+
+    def checkpoint_name(name):
+        info = sd_models.get_closet_checkpoint_match(name) if name else None
+        return info.name if info else name
+
+    original_checkpoint = checkpoint_name(opts.sd_model_checkpoint)
+    loaded_checkpoint = original_checkpoint
+    loaded_vae = opts.sd_vae
+
+    loads = []
+    for pc in pcs:
+        checkpoint = checkpoint_name(pc.override_settings.get('sd_model_checkpoint', opts.sd_model_checkpoint))
+        vae = pc.override_settings.get('sd_vae', opts.sd_vae)
+
+        checkpoint_loads = int(checkpoint != loaded_checkpoint)
+        vae_loads = int(vae != loaded_vae)
+        loaded_checkpoint = checkpoint
+        loaded_vae = vae
+
+        if pc.refiner_checkpoint not in (None, "", "None", "none"):
+            checkpoint_loads += 1
+            loaded_checkpoint = checkpoint_name(pc.refiner_checkpoint)
+
+        # process_images puts the original VAE back after the pass
+        if pc.override_settings_restore_afterwards and loaded_vae != opts.sd_vae:
+            vae_loads += 1
+            loaded_vae = opts.sd_vae
+
+        loads.append((checkpoint_loads, vae_loads))
+
+    return loads, int(loaded_checkpoint != original_checkpoint)
+
+
+class PlotTimings:
+    """Sampling and checkpoint loading speed measured while generating plots, used to estimate the time of dry runs"""
+
+    def __init__(self):
+        self.seconds_per_work = None
+        self.seconds_per_load = None
+
+    @staticmethod
+    def average(old, new):
+        return new if old is None else old * 0.75 + new * 0.25
+
+    def measure(self, work, checkpoint_loads, seconds):
+        if checkpoint_loads == 0:
+            if work > 0:
+                self.seconds_per_work = self.average(self.seconds_per_work, seconds / work)
+        elif self.seconds_per_work is not None:
+            self.seconds_per_load = self.average(self.seconds_per_load, max(seconds - work * self.seconds_per_work, 0) / checkpoint_loads)
+
+    def estimate(self, work, checkpoint_loads):
+        if self.seconds_per_work is None:
+            return None
+
+        return work * self.seconds_per_work + checkpoint_loads * (self.seconds_per_load or 0)
+
+
+timings = PlotTimings()
+
+
+def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend, include_lone_images, include_sub_grids, passes, margin_size):
     hor_texts = [[images.GridAnnotation(x)] for x in x_labels]
     ver_texts = [[images.GridAnnotation(y)] for y in y_labels]
     title_texts = [[images.GridAnnotation(z)] for z in z_labels]
@@ -293,18 +467,11 @@ def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend
 
     processed_result = None
 
-    state.job_count = list_size * p.n_iter
+    state.job_count = len(passes) * p.n_iter
 
-    def process_cell(x, y, z, ix, iy, iz):
+    def process_cell(c: GridCell, processed: Processed):
         nonlocal processed_result
 
-        def index(ix, iy, iz):
-            return ix + iy * len(xs) + iz * len(xs) * len(ys)
-
-        state.job = f"{index(ix, iy, iz) + 1} out of {list_size}"
-
-        processed: Processed = cell(x, y, z, ix, iy, iz)
-
         if processed_result is None:
             # Use our first processed result object as a template container to hold our full results
             processed_result = copy(processed)
@@ -314,7 +481,7 @@ def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend
             processed_result.infotexts = [None] * list_size
             processed_result.index_of_first_image = 1
 
-        idx = index(ix, iy, iz)
+        idx = c.ix + c.iy * len(xs) + c.iz * len(xs) * len(ys)
         if processed.images:
             # Non-empty list indicates some degree of success.
             processed_result.images[idx] = processed.images[0]
@@ -330,36 +497,11 @@ def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend
                 cell_size = processed_result.images[0].size
             processed_result.images[idx] = Image.new(cell_mode, cell_size)
 
-    if first_axes_processed == 'x':
-        for ix, x in enumerate(xs):
-            if second_axes_processed == 'y':
-                for iy, y in enumerate(ys):
-                    for iz, z in enumerate(zs):
-                        process_cell(x, y, z, ix, iy, iz)
-            else:
-                for iz, z in enumerate(zs):
-                    for iy, y in enumerate(ys):
-                        process_cell(x, y, z, ix, iy, iz)
-    elif first_axes_processed == 'y':
-        for iy, y in enumerate(ys):
-            if second_axes_processed == 'x':
-                for ix, x in enumerate(xs):
-                    for iz, z in enumerate(zs):
-                        process_cell(x, y, z, ix, iy, iz)
-            else:
-                for iz, z in enumerate(zs):
-                    for ix, x in enumerate(xs):
-                        process_cell(x, y, z, ix, iy, iz)
-    elif first_axes_processed == 'z':
-        for iz, z in enumerate(zs):
-            if second_axes_processed == 'x':
-                for ix, x in enumerate(xs):
-                    for iy, y in enumerate(ys):
-                        process_cell(x, y, z, ix, iy, iz)
-            else:
-                for iy, y in enumerate(ys):
-                    for ix, x in enumerate(xs):
-                        process_cell(x, y, z, ix, iy, iz)
+    for n, cells in enumerate(passes):
+        state.job = f"{n + 1} out of {len(passes)}"
+
+        for c, processed in zip(cells, cell(cells)):
+            process_cell(c, processed)
 
     if not processed_result:
         # Should never happen, I've only seen it on one of four open tabs and it needed to refresh.
@@ -453,6 +595,8 @@ class Script(scripts.Script):
                 csv_mode = gr.Checkbox(label='Use text inputs instead of dropdowns', value=False, elem_id=self.elem_id("csv_mode"))
             with gr.Column():
                 margin_size = gr.Slider(label="Grid margins (px)", minimum=0, maximum=500, value=0, step=2, elem_id=self.elem_id("margin_size"))
+                cells_per_batch = gr.Slider(label="Cells per batch", minimum=1, maximum=16, value=1, step=1, elem_id=self.elem_id("cells_per_batch"), tooltip="Generate cells that only differ in seed, variation seed or prompt S/R together, as one batch, if their prompts use the same extra networks. Only used when batch size and batch count are 1.")
+                dry_run = gr.Checkbox(label='Dry run', value=False, elem_id=self.elem_id("dry_run"), tooltip="Only report the number of model loads, sampling passes and estimated time, without generating anything.")
 
         with gr.Row(variant="compact", elem_id="swap_axes"):
             swap_xy_axes_button = gr.Button(value="Swap X/Y axes", elem_id="xy_grid_swap_axes_button")
@@ -533,9 +677,9 @@ class Script(scripts.Script):
             (z_values_dropdown, lambda params: get_dropdown_update_from_params("Z", params)),
         )
 
-        return [x_type, x_values, x_values_dropdown, y_type, y_values, y_values_dropdown, z_type, z_values, z_values_dropdown, draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds, vary_seeds_x, vary_seeds_y, vary_seeds_z, margin_size, csv_mode]
+        return [x_type, x_values, x_values_dropdown, y_type, y_values, y_values_dropdown, z_type, z_values, z_values_dropdown, draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds, vary_seeds_x, vary_seeds_y, vary_seeds_z, margin_size, csv_mode, cells_per_batch, dry_run]
 
-    def run(self, p, x_type, x_values, x_values_dropdown, y_type, y_values, y_values_dropdown, z_type, z_values, z_values_dropdown, draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds, vary_seeds_x, vary_seeds_y, vary_seeds_z, margin_size, csv_mode):
+    def run(self, p, x_type, x_values, x_values_dropdown, y_type, y_values, y_values_dropdown, z_type, z_values, z_values_dropdown, draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds, vary_seeds_x, vary_seeds_y, vary_seeds_z, margin_size, csv_mode, cells_per_batch=1, dry_run=False):
         x_type, y_type, z_type = x_type or 0, y_type or 0, z_type or 0  # if axle type is None set to 0
 
         if not no_fixed_seeds:
@@ -645,35 +789,6 @@ class Script(scripts.Script):
             ys = fix_axis_seeds(y_opt, ys)
             zs = fix_axis_seeds(z_opt, zs)
 
-        if x_opt.label == 'Steps':
-            total_steps = sum(xs) * len(ys) * len(zs)
-        elif y_opt.label == 'Steps':
-            total_steps = sum(ys) * len(xs) * len(zs)
-        elif z_opt.label == 'Steps':
-            total_steps = sum(zs) * len(xs) * len(ys)
-        else:
-            total_steps = p.steps * len(xs) * len(ys) * len(zs)
-
-        if isinstance(p, StableDiffusionProcessingTxt2Img) and p.enable_hr:
-            if x_opt.label == "Hires steps":
-                total_steps += sum(xs) * len(ys) * len(zs)
-            elif y_opt.label == "Hires steps":
-                total_steps += sum(ys) * len(xs) * len(zs)
-            elif z_opt.label == "Hires steps":
-                total_steps += sum(zs) * len(xs) * len(ys)
-            elif p.hr_second_pass_steps:
-                total_steps += p.hr_second_pass_steps * len(xs) * len(ys) * len(zs)
-            else:
-                total_steps *= 2
-
-        total_steps *= p.n_iter
-
-        image_cell_count = p.n_iter * p.batch_size
-        cell_console_text = f"; {image_cell_count} images per cell" if image_cell_count > 1 else ""
-        plural_s = 's' if len(zs) > 1 else ''
-        print(f"X/Y/Z plot will create {len(xs) * len(ys) * len(zs) * image_cell_count} images on {len(zs)} {len(xs)}x{len(ys)} grid{plural_s}{cell_console_text}. (Total steps to process: {total_steps})")
-        shared.total_tqdm.updateTotal(total_steps)
-
         state.xyz_plot_x = AxisInfo(x_opt, xs)
         state.xyz_plot_y = AxisInfo(y_opt, ys)
         state.xyz_plot_z = AxisInfo(z_opt, zs)
@@ -702,38 +817,73 @@ class Script(scripts.Script):
             else:
                 second_axes_processed = 'y'
 
-        grid_infotext = [None] * (1 + len(zs))
+        axes_order = [first_axes_processed, second_axes_processed, next(a for a in 'xyz' if a not in (first_axes_processed, second_axes_processed))]
+        axes = {'x': state.xyz_plot_x, 'y': state.xyz_plot_y, 'z': state.xyz_plot_z}
 
-        def cell(x, y, z, ix, iy, iz):
-            if shared.state.interrupted or state.stopping_generation:
-                return Processed(p, [], p.seed, "")
+        # cells are batched using the prompt and seed lists of the processing object, so they must hold exactly one image each
+        cells_per_batch = int(cells_per_batch) if p.n_iter == 1 and p.batch_size == 1 else 1
+
+        def prepare_cell(c: GridCell, planning=False):
+            """Makes the processing object for a cell. Axes are applied right before the cell is generated; for planning,
+            only the axes of this script are applied, because axes of extensions may change more than the copy."""
 
             pc = copy(p)
             pc.styles = pc.styles[:]
-            x_opt.apply(pc, x, xs)
-            y_opt.apply(pc, y, ys)
-            z_opt.apply(pc, z, zs)
+            pc.override_settings = copy(pc.override_settings)
+            for opt, value, values in ((x_opt, c.x, xs), (y_opt, c.y, ys), (z_opt, c.z, zs)):
+                if not planning or opt in builtin_axis_options:
+                    opt.apply(pc, value, values)
 
             xdim = len(xs) if vary_seeds_x else 1
             ydim = len(ys) if vary_seeds_y else 1
 
             if vary_seeds_x:
-                pc.seed += ix
+                pc.seed += c.ix
             if vary_seeds_y:
-                pc.seed += iy * xdim
+                pc.seed += c.iy * xdim
             if vary_seeds_z:
-                pc.seed += iz * xdim * ydim
+                pc.seed += c.iz * xdim * ydim
 
-            try:
-                res = process_images(pc)
-            except Exception as e:
-                errors.display(e, "generating image for xyz plot")
+            return pc
+
+        cell_params = {}
+
+        def plan_cell(c: GridCell):
+            if (c.ix, c.iy, c.iz) not in cell_params:
+                cell_params[c.ix, c.iy, c.iz] = prepare_cell(c, planning=True)
+
+            return cell_params[c.ix, c.iy, c.iz]
 
-                res = Processed(p, [], p.seed, "")
+        passes = plan_passes(axes, axes_order, max(cells_per_batch, 1), batch_key=lambda c: extra_networks_key(plan_cell(c)))
+        pass_params = [[plan_cell(c) for c in cells] for cells in passes]
+
+        total_steps = sum(cell_steps(pcs[0]) for pcs in pass_params)
+        model_loads, restore_loads = count_model_loads([pcs[0] for pcs in pass_params])
+
+        image_cell_count = p.n_iter * p.batch_size
+        cell_console_text = f"; {image_cell_count} images per cell" if image_cell_count > 1 else ""
+        plural_s = 's' if len(zs) > 1 else ''
+        print(f"X/Y/Z plot will create {len(xs) * len(ys) * len(zs) * image_cell_count} images on {len(zs)} {len(xs)}x{len(ys)} grid{plural_s}{cell_console_text}. (Total steps to process: {total_steps}; sampling passes: {len(passes)})")
+
+        if dry_run:
+            checkpoint_loads = sum(x for x, _ in model_loads) + restore_loads
+            vae_loads = sum(x for _, x in model_loads)
+            seconds = timings.estimate(sum(pass_work(pcs) for pcs in pass_params), checkpoint_loads)
+            estimated_time = f"{seconds:.0f} s" if seconds is not None else "unknown until a plot has been generated"
+
+            report = f"X/Y/Z plot dry run: {len(passes)} sampling passes for {len(cell_params)} cells, {total_steps} steps, {checkpoint_loads} checkpoint loads, {vae_loads} VAE loads; estimated time: {estimated_time}."
+            print(report)
+            return Processed(p, [], p.seed, report)
+
+        shared.total_tqdm.updateTotal(total_steps)
 
+        pass_loads = {(cells[0].ix, cells[0].iy, cells[0].iz): loads for cells, loads in zip(passes, model_loads)}
+        grid_infotext = [None] * (1 + len(zs))
+
+        def set_grid_infotexts(pc, c: GridCell, position_in_batch):
             # Sets subgrid infotexts
-            subgrid_index = 1 + iz
-            if grid_infotext[subgrid_index] is None and ix == 0 and iy == 0:
+            subgrid_index = 1 + c.iz
+            if grid_infotext[subgrid_index] is None and c.ix == 0 and c.iy == 0:
                 pc.extra_generation_params = copy(pc.extra_generation_params)
                 pc.extra_generation_params['Script'] = self.title()
 
@@ -749,10 +899,10 @@ class Script(scripts.Script):
                     if y_opt.label in ["Seed", "Var. seed"] and not no_fixed_seeds:
                         pc.extra_generation_params["Fixed Y Values"] = ", ".join([str(y) for y in ys])
 
-                grid_infotext[subgrid_index] = processing.create_infotext(pc, pc.all_prompts, pc.all_seeds, pc.all_subseeds)
+                grid_infotext[subgrid_index] = processing.create_infotext(pc, pc.all_prompts, pc.all_seeds, pc.all_subseeds, position_in_batch=position_in_batch)
 
             # Sets main grid infotext
-            if grid_infotext[0] is None and ix == 0 and iy == 0 and iz == 0:
+            if grid_infotext[0] is None and c.ix == 0 and c.iy == 0 and c.iz == 0:
                 pc.extra_generation_params = copy(pc.extra_generation_params)
 
                 if z_opt.label != 'Nothing':
@@ -761,9 +911,29 @@ class Script(scripts.Script):
                     if z_opt.label in ["Seed", "Var. seed"] and not no_fixed_seeds:
                         pc.extra_generation_params["Fixed Z Values"] = ", ".join([str(z) for z in zs])
 
-                grid_infotext[0] = processing.create_infotext(pc, pc.all_prompts, pc.all_seeds, pc.all_subseeds)
+                grid_infotext[0] = processing.create_infotext(pc, pc.all_prompts, pc.all_seeds, pc.all_subseeds, position_in_batch=position_in_batch)
+
+        def cell(cells):
+            if shared.state.interrupted or state.stopping_generation:
+                return [Processed(p, [], p.seed, "") for _ in cells]
+
+            pcs = [prepare_cell(c) for c in cells]
+            pc = batch_cells(pcs)
+
+            try:
+                start = time.perf_counter()
+                res = process_images(pc)
+                if not state.interrupted:
+                    timings.measure(pass_work(pcs), pass_loads[cells[0].ix, cells[0].iy, cells[0].iz][0], time.perf_counter() - start)
+            except Exception as e:
+                errors.display(e, "generating image for xyz plot")
+
+                return [Processed(p, [], p.seed, "") for _ in cells]
+
+            for i, c in enumerate(cells):
+                set_grid_infotexts(pc, c, i)
 
-            return res
+            return split_batch(res, len(cells))
 
         with SharedSettingsStackHelper():
             processed = draw_xyz_grid(
@@ -778,8 +948,7 @@ class Script(scripts.Script):
                 draw_legend=draw_legend,
                 include_lone_images=include_lone_images,
                 include_sub_grids=include_sub_grids,
-                first_axes_processed=first_axes_processed,
-                second_axes_processed=second_axes_processed,
+                passes=passes,
                 margin_size=margin_size
             )
 
@@ -0,0 +1,97 @@
+"""
+Preparation-time benchmark for textual_inversion.dataset.PersonalizedBase.
+
+Run from the webui directory: python -m test.benchmark_dataset_preparation
+
+Writes a folder of random JPEG images and prepares a dataset from it on CPU with a tiny convolutional VAE stub:
+one image at a time without the latent cache (as before), with decoding on a thread pool and batched encoding,
+and again with the latent cache filled by the previous run, as when training is restarted on the same images.
+"""
+
+import os
+import tempfile
+import time
+
+os.environ.setdefault("IGNORE_CMD_ARGS_ERRORS", "1")
+
+from modules import shared_init  # noqa: E402
+shared_init.initialize()
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from ldm.modules.distributions.distributions import DiagonalGaussianDistribution  # noqa: E402
+from modules import cache, devices, shared  # noqa: E402
+from modules.textual_inversion import dataset  # noqa: E402
+
+size = 512
+count = 64
+
+
+class TinyVAE(torch.nn.Module):
+    """stands in for the first stage model: 8x downscale to a 4-channel latent distribution"""
+
+    sd_model_hash = "benchmark"
+
+    def __init__(self):
+        super().__init__()
+        self.encoder = torch.nn.Conv2d(3, 8, kernel_size=8, stride=8)
+
+    @torch.no_grad()
+    def encode_first_stage(self, x):
+        return DiagonalGaussianDistribution(self.encoder(x))
+
+    def get_first_stage_encoding(self, latent_dist):
+        return 0.18215 * latent_dist.sample()
+
+
+def write_images(path):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        pixels = rng.integers(0, 256, (size + i % 4 * 64, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(path, f"{i:03}-image.jpg"), quality=95)
+
+
+def prepare(data_root, template_file, model, threads, batch_size, use_cache):
+    shared.opts.training_dataset_threads = threads
+    shared.opts.training_vae_encode_batch_size = batch_size
+    shared.opts.training_cache_latents = use_cache
+
+    start = time.perf_counter()
+    ds = dataset.PersonalizedBase(data_root=data_root, width=size, height=size, repeats=1, model=model, cond_model=None, device=devices.cpu, template_file=template_file)
+    elapsed = time.perf_counter() - start
+
+    assert len(ds) == count
+    return elapsed
+
+
+def main():
+    model = TinyVAE()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root = os.path.join(tmp, "images")
+        os.makedirs(data_root)
+        write_images(data_root)
+
+        template_file = os.path.join(tmp, "template.txt")
+        with open(template_file, "w", encoding="utf8") as file:
+            file.write("a photo of [name], [filewords]\n")
+
+        cache.cache_dir = os.path.join(tmp, "cache")
+        cache.caches.clear()
+
+        serial = prepare(data_root, template_file, model, threads=1, batch_size=1, use_cache=False)
+        cold = prepare(data_root, template_file, model, threads=os.cpu_count() or 4, batch_size=8, use_cache=True)
+        warm = prepare(data_root, template_file, model, threads=os.cpu_count() or 4, batch_size=8, use_cache=True)
+
+        print(f"{count} images, {size}x{size}")
+        print(f"serial, no cache      {serial:8.3f} s")
+        print(f"parallel, cold cache  {cold:8.3f} s")
+        print(f"parallel, warm cache  {warm:8.3f} s")
+
+        cache.caches.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark for sequence numbers in images.save_image.
+
+Run from the webui directory: python -m test.benchmark_image_sequence_numbers
+
+Fills a directory with 100k files named like saved images, then saves 10k small images into it with save_image,
+and compares the time per save with listing the directory for every save (as before).
+"""
+
+import os
+import tempfile
+import time
+
+os.environ.setdefault("IGNORE_CMD_ARGS_ERRORS", "1")
+
+from modules import shared_init  # noqa: E402
+shared_init.initialize()
+
+from PIL import Image  # noqa: E402
+
+from modules import images  # noqa: E402
+
+existing = 100_000
+saves = 10_000
+
+
+def main():
+    image = Image.new("RGB", (64, 64))
+
+    with tempfile.TemporaryDirectory() as path:
+        for i in range(existing):
+            open(os.path.join(path, f"{i:05}-1234.png"), "w").close()
+
+        start = time.perf_counter()
+        for _ in range(100):
+            images.get_next_sequence_number(path, "")
+        listing = (time.perf_counter() - start) / 100
+
+        images.sequence_numbers.clear()
+        start = time.perf_counter()
+        for _ in range(saves):
+            fullfn, _ = images.save_image(image, path, "", extension="png", short_filename=True)
+        elapsed = (time.perf_counter() - start) / saves
+
+        assert os.path.basename(fullfn) == f"{existing + saves - 1:05}.png"
+
+        print(f"{existing} files in directory, {saves} saves")
+        print(f"listing the directory      {listing * 1000:8.3f} ms per save (not counting encoding)")
+        print(f"save_image with allocator  {elapsed * 1000:8.3f} ms per save (including encoding)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark for the cost of live previews to sampling.
+
+Run from the webui directory: python -m test.benchmark_live_previews
+
+Runs a sampling-like loop on CPU that calls sd_samplers_common.store_latent after every step, with live previews
+disabled, with previews decoded in the sampler callback (as before), and with previews decoded by the live preview
+worker, both with no client asking for progress and with one asking after every step. A small VAE-like decoder is
+used as the Full preview method. Reports steps per second and previews made.
+"""
+
+import os
+import time
+
+os.environ.setdefault("IGNORE_CMD_ARGS_ERRORS", "1")
+
+from modules import shared_init  # noqa: E402
+shared_init.initialize()
+
+import torch  # noqa: E402
+
+from modules import processing  # noqa: E402, F401 (sd_samplers_common can't be the first of its circular imports)
+from modules import devices, live_previews, sd_samplers_common, shared  # noqa: E402
+
+steps = 40
+latent_size = 64
+
+
+class TinyDecoder(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+
+        layers = [torch.nn.Conv2d(4, 64, 3, padding=1)]
+        for _ in range(3):
+            layers += [torch.nn.SiLU(), torch.nn.Upsample(scale_factor=2, mode="nearest"), torch.nn.Conv2d(64, 64, 3, padding=1)]
+        layers += [torch.nn.SiLU(), torch.nn.Conv2d(64, 3, 3, padding=1)]
+
+        self.body = torch.nn.Sequential(*layers)
+
+    @property
+    def dtype(self):
+        return next(self.parameters()).dtype
+
+    def forward(self, x):
+        return self.body(x)
+
+
+class TinyModel:
+    lowvram = False
+
+    def __init__(self):
+        self.first_stage_model = TinyDecoder().eval()
+
+    def decode_first_stage(self, x):
+        return self.first_stage_model(x)
+
+
+def sample(unet, inline, polled):
+    shared.state.begin(job="benchmark")
+    x = torch.randn(1, 4, latent_size, latent_size, generator=torch.Generator().manual_seed(0))
+
+    start = time.perf_counter()
+    with torch.inference_mode():
+        for step in range(steps):
+            shared.state.sampling_step = step
+            x = x + 0.01 * unet(x)
+
+            if inline:
+                shared.state.assign_current_image(sd_samplers_common.sample_to_image(x))
+            else:
+                sd_samplers_common.store_latent(x)
+
+            if polled:
+                shared.state.set_current_image()  # what the progress API does for every request
+    elapsed = time.perf_counter() - start
+
+    live_previews.worker.wait()
+    previews = shared.state.id_live_preview
+    shared.state.end()
+
+    return steps / elapsed, previews
+
+
+def main():
+    shared.sd_model = TinyModel()
+    shared.opts.show_progress_type = "Full"
+    shared.opts.show_progress_grid = False
+    shared.opts.show_progress_every_n_steps = 1
+    shared.opts.live_previews_image_format = "jpeg"
+    devices.dtype = devices.dtype_vae = torch.float32
+
+    unet = torch.nn.Sequential(*[torch.nn.Conv2d(4 if i == 0 else 128, 4 if i == 7 else 128, 3, padding=1) for i in range(8)]).eval()
+
+    runs = [
+        ("previews off", False, False, False),
+        ("previews inline", True, True, False),
+        ("worker, no client", True, False, False),
+        ("worker, polled", True, False, True),
+    ]
+
+    sample(unet, False, False)  # warm up
+
+    for name, enabled, inline, polled in runs:
+        shared.opts.live_previews_enable = enabled
+        speed, previews = sample(unet, inline, polled)
+        print(f"{name:<18} {speed:8.2f} steps/s   previews: {previews}")
+
+
+if __name__ == "__main__":
+    main()
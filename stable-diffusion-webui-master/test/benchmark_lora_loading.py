@@ -0,0 +1,138 @@
+"""
+Load-time benchmark for networks.load_network.
+
+Run from the webui directory: python -m test.benchmark_lora_loading
+
+Writes a corpus of synthetic kohya LoRA, LyCORIS LoHa and lora_A/lora_B (diffusers/PEFT naming) networks for an
+SD1-shaped layer layout, then times loading each of them with eager reads and cold key mapping (as before),
+with lazy reads and cold key mapping, and with lazy reads after the key mapping for that key set is cached.
+Each network also has text encoder 2 keys that an SD1 model doesn't have, which lazy loading never reads.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import types
+
+os.environ.setdefault("IGNORE_CMD_ARGS_ERRORS", "1")
+
+from modules import shared_init  # noqa: E402
+shared_init.initialize()
+
+import torch  # noqa: E402
+import safetensors.torch  # noqa: E402
+
+from modules import shared  # noqa: E402
+from modules.paths_internal import extensions_builtin_dir  # noqa: E402
+
+sys.path.insert(0, os.path.join(extensions_builtin_dir, "Lora"))
+
+import network  # noqa: E402
+import networks  # noqa: E402
+
+dim = 320
+rank = 16
+
+
+def unet_layers():
+    """(kohya name, compvis name) for attention projections of an SD1 UNet"""
+
+    layers = []
+    for block in range(3):
+        for attention in range(2):
+            for attn in ("attn1", "attn2"):
+                for proj in ("to_q", "to_k", "to_v", "to_out_0"):
+                    suffix = f"transformer_blocks_0_{attn}_{proj}"
+                    layers.append((f"lora_unet_down_blocks_{block}_attentions_{attention}_{suffix}", f"diffusion_model_input_blocks_{1 + block * 3 + attention}_1_{suffix}"))
+                    layers.append((f"lora_unet_up_blocks_{block + 1}_attentions_{attention}_{suffix}", f"diffusion_model_output_blocks_{(block + 1) * 3 + attention}_1_{suffix}"))
+
+    for layer in range(12):
+        for proj in ("q_proj", "k_proj", "v_proj", "out_proj"):
+            layers.append((f"lora_te_text_model_encoder_layers_{layer}_self_attn_{proj}", f"transformer_text_model_encoder_layers_{layer}_self_attn_{proj}"))
+
+    return layers
+
+
+def unmatched_layers():
+    return [f"lora_te2_text_model_encoder_layers_{layer}_self_attn_{proj}" for layer in range(32) for proj in ("q_proj", "k_proj", "v_proj", "out_proj")]
+
+
+def make_network(kind, seed):
+    generator = torch.Generator().manual_seed(seed)
+
+    def rand(*shape):
+        return torch.randn(shape, generator=generator, dtype=torch.float16)
+
+    sd = {}
+    for name in [x[0] for x in unet_layers()] + unmatched_layers():
+        if kind == "kohya":
+            sd[f"{name}.lora_down.weight"] = rand(rank, dim)
+            sd[f"{name}.lora_up.weight"] = rand(dim, rank)
+        elif kind == "lycoris":
+            sd[f"{name}.hada_w1_a"] = rand(dim, rank)
+            sd[f"{name}.hada_w1_b"] = rand(rank, dim)
+            sd[f"{name}.hada_w2_a"] = rand(dim, rank)
+            sd[f"{name}.hada_w2_b"] = rand(rank, dim)
+        else:
+            sd[f"{name}.lora_A.weight"] = rand(rank, dim)
+            sd[f"{name}.lora_B.weight"] = rand(dim, rank)
+
+        sd[f"{name}.alpha"] = torch.tensor(float(rank))
+
+    return sd
+
+
+def fake_sd1_model():
+    model = types.SimpleNamespace(is_sdxl=False)
+    model.network_layer_mapping = {compvis: torch.nn.Linear(dim, dim, bias=False) for _, compvis in unet_layers()}
+    model.network_layer_mapping_fingerprint = networks.fingerprint_keys(model.network_layer_mapping)
+    return model
+
+
+def time_loads(files, lazy, cached):
+    shared.opts.disable_mmap_load_safetensors = not lazy
+
+    total = 0
+    for filename in files:
+        if not cached:
+            networks.key_mapping_cache.clear()
+
+        network_on_disk = network.NetworkOnDisk(os.path.basename(filename), filename, metadata={}, sha256="0" * 64)
+
+        start = time.perf_counter()
+        net = networks.load_network(network_on_disk.name, network_on_disk)
+        total += time.perf_counter() - start
+
+        assert len(net.modules) == len(unet_layers())
+
+    return total / len(files)
+
+
+def main():
+    shared.sd_model = fake_sd1_model()
+    shared.weight_load_location = "cpu"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = {}
+        for kind in ("kohya", "lycoris", "diffusers"):
+            corpus[kind] = []
+            for i in range(5):
+                filename = os.path.join(tmp, f"{kind}_{i}.safetensors")
+                safetensors.torch.save_file(make_network(kind, i), filename)
+                corpus[kind].append(filename)
+
+        print(f"{'format':<10} {'eager, cold':>14} {'lazy, cold':>14} {'lazy, cached':>14}")
+        for kind, files in corpus.items():
+            time_loads(files, lazy=True, cached=False)  # warm up the page cache
+
+            eager = time_loads(files, lazy=False, cached=False)
+            lazy = time_loads(files, lazy=True, cached=False)
+            time_loads(files[:1], lazy=True, cached=True)
+            cached = time_loads(files, lazy=True, cached=True)
+
+            print(f"{kind:<10} {eager * 1000:11.2f} ms {lazy * 1000:11.2f} ms {cached * 1000:11.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
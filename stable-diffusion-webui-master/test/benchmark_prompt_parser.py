@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for prompt schedule parsing.
+
+Run from the webui directory: python -m test.benchmark_prompt_parser
+
+Times get_learned_conditioning_prompt_schedules over the prompts from its doctests and over long style-expanded
+prompts, with cold caches (every call parses and compiles) and warm caches (repeat requests, hires pass).
+"""
+
+import ast
+import doctest
+import timeit
+
+from modules import prompt_parser
+
+
+def doctest_prompts():
+    prompts = []
+    for example in doctest.DocTestParser().get_examples(prompt_parser.get_learned_conditioning_prompt_schedules.__doc__):
+        node = ast.parse(example.source).body[0]
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and getattr(node.value.func, 'id', None) == 'g':
+            prompts.append(node.value.args[0].value)
+
+    return prompts
+
+
+def style_expanded_prompts():
+    style = "masterpiece, best quality, (ultra detailed:1.2), [sharp focus:soft focus:0.6], cinematic lighting, film grain, [oil painting|watercolor], "
+    subjects = ["a castle on a hill", "portrait of an old sailor", "[a red fox|a white wolf] in the snow", "a city at night, [rain:fog:12]"]
+
+    return [f"{subject}, {style * 6}BREAK {subject}, [detailed background::0.8]" for subject in subjects]
+
+
+def clear_caches():
+    prompt_parser.compile_prompt.cache_clear()
+    prompt_parser.get_prompt_schedule.cache_clear()
+
+
+def run(name, prompts, steps, hires_steps, number):
+    def cold():
+        clear_caches()
+        prompt_parser.get_learned_conditioning_prompt_schedules(prompts, steps)
+        prompt_parser.get_learned_conditioning_prompt_schedules(prompts, steps, hires_steps)
+
+    def warm():
+        prompt_parser.get_learned_conditioning_prompt_schedules(prompts, steps)
+        prompt_parser.get_learned_conditioning_prompt_schedules(prompts, steps, hires_steps)
+
+    cold_time = min(timeit.repeat(cold, number=1, repeat=3))
+    warm()
+    warm_time = min(timeit.repeat(warm, number=number, repeat=3)) / number
+
+    print(f"{name:<24} {len(prompts):>3} prompts  cold {cold_time * 1000:8.3f} ms  warm {warm_time * 1000:8.3f} ms")
+
+
+def main():
+    run("doctest corpus", doctest_prompts(), 20, 10, number=100)
+    run("style-expanded, 30 steps", style_expanded_prompts(), 30, 15, number=100)
+    run("style-expanded, 150 steps", style_expanded_prompts(), 150, 50, number=100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark for tiled upscaling in upscaler_utils.
+
+Run from the webui directory: python -m test.benchmark_upscaler_tiling
+
+Upscales an image on CPU with a small convolutional 4x upscaler, with ESRGAN's default tile size and overlap,
+using tiles cropped, converted and pasted one at a time with PIL (as before), and with the tensor tiling engine
+at several tile batch sizes. Reports tiles per second and the largest difference from the PIL path.
+"""
+
+import os
+import time
+
+os.environ.setdefault("IGNORE_CMD_ARGS_ERRORS", "1")
+
+from modules import shared_init  # noqa: E402
+shared_init.initialize()
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+import tqdm  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from modules import images, shared, upscaler_utils  # noqa: E402
+
+tile_size = 192
+tile_overlap = 8
+
+
+class TinyUpscaler(torch.nn.Module):
+    def __init__(self, scale=4):
+        super().__init__()
+        torch.manual_seed(0)
+        self.body = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 16, 3, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.Conv2d(16, 3 * scale * scale, 3, padding=1),
+            torch.nn.PixelShuffle(scale),
+            torch.nn.Sigmoid(),
+        )
+
+    def forward(self, x):
+        return self.body(x)
+
+
+def upscale_with_model_pil(model, img):
+    """upscale_with_model as it was: one tile at a time, cropped and pasted with PIL"""
+
+    grid = images.split_grid(img, tile_size, tile_size, tile_overlap)
+    newtiles = []
+
+    with tqdm.tqdm(total=grid.tile_count, desc="PIL tiles", disable=not shared.opts.enable_upscale_progressbar):
+        for y, h, row in grid.tiles:
+            newrow = []
+            for x, w, tile in row:
+                output = upscaler_utils.upscale_pil_patch(model, tile)
+                scale_factor = output.width // tile.width
+                newrow.append([x * scale_factor, w * scale_factor, output])
+            newtiles.append([y * scale_factor, h * scale_factor, newrow])
+
+    newgrid = images.Grid(newtiles, tile_w=grid.tile_w * scale_factor, tile_h=grid.tile_h * scale_factor, image_w=grid.image_w * scale_factor, image_h=grid.image_h * scale_factor, overlap=grid.overlap * scale_factor)
+    return images.combine_grid(newgrid), grid.tile_count
+
+
+def main():
+    shared.opts.enable_upscale_progressbar = False
+
+    model = TinyUpscaler().eval()
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 256, (768, 1024, 3), dtype=np.uint8))
+
+    start = time.perf_counter()
+    reference, tile_count = upscale_with_model_pil(model, img)
+    elapsed = time.perf_counter() - start
+    print(f"{'PIL, one tile at a time':<28} {tile_count / elapsed:8.2f} tiles/s")
+
+    stride = tile_size - tile_overlap
+    engine_tile_count = len(upscaler_utils.tile_starts(img.height, tile_size, stride)) * len(upscaler_utils.tile_starts(img.width, tile_size, stride))
+
+    for batch_size in (1, 4, 8):
+        shared.opts.upscaler_tile_batch_size = batch_size
+
+        start = time.perf_counter()
+        output = upscaler_utils.upscale_with_model(model, img, tile_size=tile_size, tile_overlap=tile_overlap)
+        elapsed = time.perf_counter() - start
+
+        diff = np.abs(np.asarray(output, dtype=np.int16) - np.asarray(reference, dtype=np.int16)).max()
+        print(f"{f'tensor, batches of {batch_size}':<28} {engine_tile_count / elapsed:8.2f} tiles/s   max difference {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark for decoding latents in processing.decode_latent_batch.
+
+Run from the webui directory: python -m test.benchmark_vae_decode
+
+Decodes a batch of 8 latents on CPU with a small VAE-like decoder, one latent per decoder call (as before) and
+several per call. Reports decoder calls, wall time and the largest difference from decoding one at a time.
+"""
+
+import os
+import time
+
+os.environ.setdefault("IGNORE_CMD_ARGS_ERRORS", "1")
+
+from modules import shared_init  # noqa: E402
+shared_init.initialize()
+
+import torch  # noqa: E402
+
+from modules import devices, processing, shared  # noqa: E402
+
+batch_size = 8
+latent_size = 32
+
+
+class TinyDecoder(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+
+        layers = [torch.nn.Conv2d(4, 64, 3, padding=1)]
+        for _ in range(3):
+            layers += [
+                torch.nn.GroupNorm(32, 64),
+                torch.nn.SiLU(),
+                torch.nn.Upsample(scale_factor=2, mode="nearest"),
+                torch.nn.Conv2d(64, 64, 3, padding=1),
+            ]
+        layers += [torch.nn.GroupNorm(32, 64), torch.nn.SiLU(), torch.nn.Conv2d(64, 3, 3, padding=1)]
+
+        self.body = torch.nn.Sequential(*layers)
+
+    @property
+    def dtype(self):
+        return next(self.parameters()).dtype
+
+    def forward(self, x):
+        return self.body(x)
+
+
+class TinyModel:
+    def __init__(self):
+        self.first_stage_model = TinyDecoder().eval()
+        self.calls = 0
+
+    def decode_first_stage(self, x):
+        self.calls += 1
+        return self.first_stage_model(x)
+
+
+def decode(model, latents, decode_batch_size):
+    shared.opts.sd_vae_decode_batch_size = decode_batch_size
+    model.calls = 0
+
+    start = time.perf_counter()
+    with torch.inference_mode():
+        samples = processing.decode_latent_batch(model, latents, target_device=devices.cpu, check_for_nans=True)
+    elapsed = time.perf_counter() - start
+
+    return torch.stack(samples), model.calls, elapsed
+
+
+def main():
+    shared.opts.sd_vae_decode_method = "Full"
+    devices.dtype_vae = torch.float32
+
+    model = TinyModel()
+    latents = torch.randn(batch_size, 4, latent_size, latent_size, generator=torch.Generator().manual_seed(0))
+
+    decode(model, latents, 1)  # warm up
+
+    reference, calls, elapsed = decode(model, latents, 1)
+    print(f"{'one at a time':<16} {calls:3} decoder calls {elapsed:8.3f} s")
+
+    for decode_batch_size in (2, 4, 8):
+        output, calls, elapsed = decode(model, latents, decode_batch_size)
+        diff = (output - reference).abs().max().item()
+        print(f"{f'{decode_batch_size} at once':<16} {calls:3} decoder calls {elapsed:8.3f} s   max difference {diff}")
+
+
+if __name__ == "__main__":
+    main()
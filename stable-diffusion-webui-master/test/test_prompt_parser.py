@@ -0,0 +1,125 @@
+import random
+
+import lark
+import pytest
+
+from modules import prompt_parser
+
+
+def reference_schedules(prompts, base_steps, hires_steps=None, use_old_scheduling=False):
+    """The tree-walking implementation get_learned_conditioning_prompt_schedules had before prompts were compiled"""
+
+    if hires_steps is None or use_old_scheduling:
+        int_offset = 0
+        flt_offset = 0
+        steps = base_steps
+    else:
+        int_offset = base_steps
+        flt_offset = 1.0
+        steps = hires_steps
+
+    def collect_steps(steps, tree):
+        res = [steps]
+
+        class CollectSteps(lark.Visitor):
+            def scheduled(self, tree):
+                s = tree.children[-2]
+                v = float(s)
+                if use_old_scheduling:
+                    v = v*steps if v<1 else v
+                else:
+                    if "." in s:
+                        v = (v - flt_offset) * steps
+                    else:
+                        v = (v - int_offset)
+                tree.children[-2] = min(steps, int(v))
+                if tree.children[-2] >= 1:
+                    res.append(tree.children[-2])
+
+            def alternate(self, tree):
+                res.extend(range(1, steps+1))
+
+        CollectSteps().visit(tree)
+        return sorted(set(res))
+
+    def at_step(step, tree):
+        class AtStep(lark.Transformer):
+            def scheduled(self, args):
+                before, after, _, when, _ = args
+                yield before or () if step <= when else after
+            def alternate(self, args):
+                args = ["" if not arg else arg for arg in args]
+                yield args[(step - 1) % len(args)]
+            def start(self, args):
+                def flatten(x):
+                    if isinstance(x, str):
+                        yield x
+                    else:
+                        for gen in x:
+                            yield from flatten(gen)
+                return ''.join(flatten(args))
+            def plain(self, args):
+                yield args[0].value
+            def __default__(self, data, children, meta):
+                for child in children:
+                    yield child
+        return AtStep().transform(tree)
+
+    def get_schedule(prompt):
+        try:
+            tree = prompt_parser.schedule_parser.parse(prompt)
+        except lark.exceptions.LarkError:
+            return [[steps, prompt]]
+        return [[t, at_step(t, tree)] for t in collect_steps(steps, tree)]
+
+    promptdict = {prompt: get_schedule(prompt) for prompt in set(prompts)}
+    return [promptdict[prompt] for prompt in prompts]
+
+
+prompts = [
+    "a castle on a hill",
+    "fantasy landscape with a [mountain:lake:0.25] and [an oak:a christmas tree:0.75][ in foreground::0.6][: in background:0.25] [shoddy:masterful:0.5]",
+    "a[b:[c:d:2]:1]e",
+    "[[a:b:0.3]:[c|d|[e:f:4]]:0.6] g",
+    "[a|[b|c]|] d [e:f:1.5]",
+    "(a [b:(c:1.2):3]:1.1) [d::0.9] [:e:12]",
+    "[fe|||]male, [red|green] [dress:suit:7]",
+    "a [unbalanced [b:2]",
+    "((a][:b:c [d:3]",
+    "masterpiece, [sharp focus:soft focus:0.6], [oil painting|watercolor] BREAK [detailed background::0.8]",
+]
+
+
+def random_prompt(rng, depth=0):
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        kind = rng.choice(["plain", "plain", "emphasis", "scheduled", "alternate"] if depth < 3 else ["plain"])
+        if kind == "plain":
+            parts.append(rng.choice(["a", "b c", " ", "red fox", "d, e", "1"]))
+        elif kind == "emphasis":
+            parts.append(f"({random_prompt(rng, depth + 1)}:{rng.choice(['1.1', '0.9'])})")
+        elif kind == "scheduled":
+            number = rng.choice(["1", "3", "7", "12", "25", "0.2", ".5", "0.75", "1.3", "1.8"])
+            before = random_prompt(rng, depth + 1) + ":" if rng.random() < 0.7 else ""
+            parts.append(f"[{before}{random_prompt(rng, depth + 1)}:{number}]")
+        else:
+            options = [random_prompt(rng, depth + 1) if rng.random() < 0.8 else "" for _ in range(rng.randint(2, 3))]
+            parts.append("[" + "|".join(options) + "]")
+
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("base_steps,hires_steps,use_old_scheduling", [(20, None, False), (20, 10, False), (30, 15, True), (7, None, True)])
+def test_schedules_match_reference(base_steps, hires_steps, use_old_scheduling):
+    rng = random.Random(1234)
+    corpus = prompts + [random_prompt(rng) for _ in range(60)]
+
+    expected = reference_schedules(corpus, base_steps, hires_steps, use_old_scheduling)
+
+    prompt_parser.get_prompt_schedule.cache_clear()
+    assert prompt_parser.get_learned_conditioning_prompt_schedules(corpus, base_steps, hires_steps, use_old_scheduling) == expected
+
+    # cached results must not be affected by what callers did with earlier ones
+    for schedule in prompt_parser.get_learned_conditioning_prompt_schedules(corpus, base_steps, hires_steps, use_old_scheduling):
+        schedule.clear()
+    assert prompt_parser.get_learned_conditioning_prompt_schedules(corpus, base_steps, hires_steps, use_old_scheduling) == expected
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from modules import rng_philox
+
+
+def reference_randn(seed, offset, shape):
+    """Generator.randn as it was before numbers for many seeds were generated at once"""
+
+    n = 1
+    for x in shape:
+        n *= x
+
+    counter = np.zeros((4, n), dtype=np.uint32)
+    counter[0] = offset
+    counter[2] = np.arange(n, dtype=np.uint32)
+
+    key = np.empty(n, dtype=np.uint64)
+    key.fill(seed)
+    key = rng_philox.uint32(key)
+
+    g = rng_philox.philox4_32(counter, key)
+
+    return rng_philox.box_muller(g[0], g[1]).reshape(shape)
+
+
+seeds = [0, 1, 12345, 2**32 - 1, 2**32, 2**32 + 7, 2**40 + 123456789, 2**64 - 1]
+offsets = [0, 3, 1, 0, 5, 2**31, 2**32 - 1, 17]
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+@pytest.mark.parametrize("shape", [(3, 4), (4, 9, 11)])
+def test_randn_many_matches_generator(monkeypatch, threads, shape):
+    # small blocks, so that several of them go to threads
+    monkeypatch.setattr(rng_philox, "threads", threads)
+    monkeypatch.setattr(rng_philox, "block_size", 64)
+    monkeypatch.setattr(rng_philox, "executor", None)
+
+    expected = np.stack([reference_randn(seed, offset, shape) for seed, offset in zip(seeds, offsets)])
+    res = rng_philox.randn_many(seeds, offsets, shape)
+
+    assert res.dtype == np.float32
+    assert res.shape == expected.shape
+    assert res.tobytes() == expected.tobytes()
+
+
+def test_generator_offsets():
+    g = rng_philox.Generator(2**33 + 5)
+    first = g.randn((2, 8))
+    second = g.randn((2, 8))
+
+    assert first.tobytes() == reference_randn(2**33 + 5, 0, (2, 8)).tobytes()
+    assert second.tobytes() == reference_randn(2**33 + 5, 1, (2, 8)).tobytes()
+
+
+def test_randn_many_matches_documented_output():
+    expected = [
+        [-0.92466259, -0.42534415, -2.6438457, 0.14518388],
+        [-0.12086647, -0.57972564, -0.62285122, -0.32838709],
+        [-1.07454231, -0.36314407, -1.67105067, 2.26550497],
+    ]
+
+    assert np.allclose(rng_philox.randn_many([0], [0], (3, 4))[0], expected)